@@ -1,29 +1,28 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from downloader import DownloadManager
 from username_checker import UsernameChecker
 from auto_proxy_updater import start_auto_updater
 from video_tools import VideoTools
+from job_scheduler import JobScheduler, QueueFull
+from job_store import JobStore
+from batch_runner import BatchRunner
+from zip_stream import ZipStream, CrcCache
+from workspace import Workspace
+from janitor import Janitor
+import metrics
 import config
 import os
-import threading
 import time
 import re
+import json
+import hmac
 import logging
+import threading
 from functools import wraps
 from collections import defaultdict
 from logging.handlers import RotatingFileHandler
 from werkzeug.utils import secure_filename
 
-# FFmpeg setup
-try:
-    from static_ffmpeg import run
-    ffmpeg_path, ffprobe_path = run.get_or_download_version('latest')
-    os.environ['FFMPEG_BINARY'] = ffmpeg_path
-    os.environ['FFPROBE_BINARY'] = ffprobe_path
-except:
-    # Use system FFmpeg
-    pass
-
 app = Flask(__name__)
 app.config['DOWNLOAD_FOLDER'] = 'downloads'
 app.config['UPLOAD_FOLDER'] = 'uploads'
@@ -46,7 +45,30 @@ if not config.DEBUG:
 download_manager = DownloadManager(app.config['DOWNLOAD_FOLDER'])
 username_checker = UsernameChecker()
 video_tools = VideoTools(app.config['DOWNLOAD_FOLDER'])
-download_status = {}
+job_store = JobStore()
+scheduler = JobScheduler()
+# /events and /stream each hold a request thread for minutes; one budget for both
+long_requests = threading.BoundedSemaphore(config.MAX_LONG_REQUESTS)
+batch_slots = threading.BoundedSemaphore(config.MAX_ACTIVE_BATCHES)
+bundle_crcs = CrcCache()
+# Expires uploads, partials and orphaned workspaces and keeps downloads/ under budget, off the request path
+janitor = Janitor(app.config['DOWNLOAD_FOLDER'], app.config['UPLOAD_FOLDER'], download_manager.cache)
+download_manager.on_scratch = janitor.watch
+janitor.start()
+
+# Read when /metrics is scraped; the job-side metrics are recorded in downloader.py, video_tools.py and username_checker.py
+metrics.REGISTRY.gauge('scheduler_queued_jobs', 'Downloads waiting for a worker', lambda: scheduler.stats()['queued'])
+metrics.REGISTRY.gauge('scheduler_running_jobs', 'Downloads running, by concurrency pool',
+                       lambda: {(pool,): n for pool, n in scheduler.stats()['running_by_pool'].items()}, ('pool',))
+metrics.REGISTRY.gauge('download_jobs', 'Jobs in the job store (all workers)',
+                       lambda: {(status,): job_store.count(status) for status in ('queued', 'processing')}, ('status',))
+
+def proxy_states():
+    stats = download_manager.proxy_pool.stats()
+    return {(state,): stats[state] for state in ('closed', 'open', 'probing')}
+
+metrics.REGISTRY.gauge('proxies', 'Proxies by circuit state', proxy_states, ('state',))
+metrics.REGISTRY.gauge('download_folder_bytes', 'Size of the finished downloads', lambda: janitor.stats()['bytes'])
 
 # Rate limiting
 request_counts = defaultdict(list)
@@ -66,6 +88,19 @@ def rate_limit(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    """Only for requests carrying ADMIN_TOKEN (Authorization: Bearer ... or X-Admin-Token); 404 when no token is configured"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not config.ADMIN_TOKEN:
+            return jsonify({'error': 'Not found'}), 404
+        auth = request.headers.get('Authorization', '')
+        token = auth[7:] if auth.startswith('Bearer ') else request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 def validate_url(url):
     """Validate URL format"""
     if not url or not isinstance(url, str):
@@ -87,31 +122,29 @@ def health():
     return jsonify({
         'status': 'healthy',
         'timestamp': time.time(),
-        'active_downloads': len([s for s in download_status.values() if s.get('status') == 'processing'])
+        'active_downloads': job_store.count('processing'),
+        'queued_downloads': job_store.count('queued'),
+        'scheduler': scheduler.stats(),
+        'cache': download_manager.cache.stats(),
+        'janitor': janitor.stats(),
+        'ytdl_pool': download_manager.ytdl_pool.stats(),
+        'http_sessions': download_manager.sessions.stats()
     })
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text format; counters and histograms are per gunicorn worker"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/proxies')
+@admin_required
+def admin_proxies():
+    """Per-proxy health as seen by this worker (each gunicorn worker keeps its own)"""
+    return jsonify(dict(download_manager.proxy_pool.stats(), worker_pid=os.getpid()))
+
 @app.route('/ping')
 def ping():
-    """Simple ping endpoint with cleanup"""
-    # Cleanup old files on every ping
-    try:
-        import gc
-        gc.collect()  # Force garbage collection
-        
-        # Delete old files
-        cleanup_age = 3600  # 1 hour
-        for folder in [app.config['DOWNLOAD_FOLDER'], app.config['UPLOAD_FOLDER']]:
-            for f in os.listdir(folder):
-                filepath = os.path.join(folder, f)
-                if os.path.isfile(filepath):
-                    if time.time() - os.path.getmtime(filepath) > cleanup_age:
-                        try:
-                            os.remove(filepath)
-                        except:
-                            pass
-    except:
-        pass
-    
+    """Simple ping endpoint"""
     return jsonify({'status': 'ok', 'message': 'pong'})
 
 @app.route('/username-finder')
@@ -174,6 +207,51 @@ def sitemap():
 def exoclick_verify():
     return send_file('c00cb86409851d1f20a150b191db34f4.html', mimetype='text/html')
 
+# Qualities the handlers understand; anything else means best
+VALID_QUALITIES = ['best', '2160', '1440', '1080', '720', '480', '360']
+
+def start_download(url, quality, audio_only):
+    """Create a download job and queue it, or attach it to the same download in flight; returns its id.
+    
+    Raises QueueFull (after recording the job as failed) when the scheduler has no room.
+    """
+    download_id = job_store.new_id()
+    priority = scheduler.priority_for(url, audio_only)
+    
+    # Same URL already downloading (in any worker) - share that job instead of racing it for the same file
+    flight_key = download_manager.cache.make_key(url, quality, audio_only)
+    leader_id = job_store.join_flight(flight_key, download_id, priority)
+    if leader_id:
+        app.logger.info(f"Attached {download_id} to in-flight download {leader_id}: {url[:100]}")
+        return download_id
+    
+    def download_task():
+        try:
+            job_store.update(download_id, 'processing', stage='starting')
+            app.logger.info(f"Starting download: {url[:100]} (audio_only={audio_only})")
+            files = download_manager.download_files(url, quality, audio_only=audio_only,
+                                                    on_progress=lambda fields: job_store.update(download_id, **fields))
+            if files:
+                janitor.track(files)
+                # Also hands the result to every request that attached meanwhile; all of a multi-file result via /bundle
+                extra = {'files': files} if len(files) > 1 else {}
+                job_store.finish(download_id, 'completed', file=files[0], timestamp=time.time(), **extra)
+                app.logger.info(f"Download completed: {files[0]}" + (f" (+{len(files) - 1} files)" if extra else ''))
+            else:
+                job_store.finish(download_id, 'error', message='Download failed - no file returned', timestamp=time.time())
+                app.logger.error(f"Download failed: no file returned for {url[:100]}")
+        except Exception as e:
+            error_msg = str(e)[:500]
+            job_store.finish(download_id, 'error', message=error_msg, timestamp=time.time())
+            app.logger.error(f"Download error: {error_msg} for {url[:100]}")
+    
+    try:
+        scheduler.submit(download_id, download_task, url, priority)
+    except QueueFull:
+        job_store.finish(download_id, 'error', message='Server is busy. Try again shortly.', timestamp=time.time())
+        raise
+    return download_id
+
 @app.route('/download', methods=['POST'])
 @rate_limit
 def download():
@@ -186,32 +264,92 @@ def download():
         return jsonify({'error': 'Invalid URL format'}), 400
     
     # Validate quality
-    valid_qualities = ['best', '2160', '1440', '1080', '720', '480', '360']
-    if quality not in valid_qualities:
+    if quality not in VALID_QUALITIES:
         quality = 'best'
     
-    download_id = str(hash(url + str(time.time())))
-    download_status[download_id] = {'status': 'processing', 'progress': 0}
+    try:
+        download_id = start_download(url, quality, audio_only)
+    except QueueFull:
+        app.logger.warning(f"Download queue full, rejected {url[:100]}")
+        response = jsonify({'error': 'Server is busy. Try again shortly.'})
+        response.headers['Retry-After'] = str(scheduler.retry_after())
+        return response, 503
     
-    def download_task():
-        try:
-            app.logger.info(f"Starting download: {url[:100]} (audio_only={audio_only})")
-            result = download_manager.download(url, quality, audio_only=audio_only)
-            if result:
-                download_status[download_id] = {'status': 'completed', 'file': result, 'timestamp': time.time()}
-                app.logger.info(f"Download completed: {result}")
-            else:
-                download_status[download_id] = {'status': 'error', 'message': 'Download failed - no file returned', 'timestamp': time.time()}
-                app.logger.error(f"Download failed: no file returned for {url[:100]}")
-        except Exception as e:
-            error_msg = str(e)[:500]
-            download_status[download_id] = {'status': 'error', 'message': error_msg, 'timestamp': time.time()}
-            app.logger.error(f"Download error: {error_msg} for {url[:100]}")
+    return jsonify({'download_id': download_id})
+
+@app.route('/batch', methods=['POST'])
+@rate_limit
+def batch():
+    """Download a list of URLs ({"urls": [...]}) or every entry of a playlist/channel ({"url": ...}).
     
-    thread = threading.Thread(target=download_task, daemon=True)
-    thread.start()
+    Items are queued BATCH_CONCURRENCY at a time as regular download jobs;
+    GET /batch/<id> reports each item's status and the overall progress.
+    """
+    data = request.json or {}
+    quality = data.get('quality', 'best')
+    audio_only = data.get('audio_only', False)
+    if quality not in VALID_QUALITIES:
+        quality = 'best'
     
-    return jsonify({'download_id': download_id})
+    urls = data.get('urls')
+    if urls is not None:
+        if not isinstance(urls, list) or not urls or not all(validate_url(u) for u in urls):
+            return jsonify({'error': 'urls must be a list of valid http(s) URLs'}), 400
+        if len(urls) > config.BATCH_MAX_ITEMS:
+            return jsonify({'error': f'At most {config.BATCH_MAX_ITEMS} URLs per batch'}), 400
+        source = None
+        entries = ((u.strip(), None) for u in urls)
+    else:
+        source = (data.get('url') or '').strip()
+        if not validate_url(source):
+            return jsonify({'error': 'Invalid URL format'}), 400
+        entries = download_manager.iter_playlist(source)
+    
+    # Each running batch holds a thread until its last item finishes
+    if not batch_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many batches running. Try again shortly.'})
+        response.headers['Retry-After'] = str(scheduler.retry_after())
+        return response, 503
+    
+    batch_id = job_store.new_id()
+    job_store.create(batch_id, 'processing', kind='batch', source=source, quality=quality, audio_only=audio_only,
+                     expanding=True, total=None, items=[], submitted=0, running=0, completed=0, failed=0, progress=0)
+    runner = BatchRunner(job_store, batch_id, entries, lambda url: start_download(url, quality, audio_only),
+                         scheduler.retry_after)
+    
+    def run_batch():
+        try:
+            runner.run()
+        except Exception as e:
+            job_store.update(batch_id, 'error', message=str(e)[:500], timestamp=time.time())
+            app.logger.error(f"Batch {batch_id} failed: {e}")
+        finally:
+            batch_slots.release()
+    
+    threading.Thread(target=run_batch, name=f'batch-{batch_id[:8]}', daemon=True).start()
+    app.logger.info(f"Started batch {batch_id}: {source[:100] if source else f'{len(urls)} URLs'}")
+    return jsonify({'batch_id': batch_id})
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    """Aggregate counters plus the status of every item submitted so far"""
+    batch_data = job_store.get(batch_id)
+    if not batch_data or batch_data.get('kind') != 'batch':
+        return jsonify({'status': 'not_found'}), 404
+    
+    items = []
+    for item in batch_data.pop('items', []):
+        item_status = job_status(item['id'])
+        items.append({
+            'download_id': item['id'],
+            'url': item['url'],
+            'title': item.get('title'),
+            'status': item_status['status'],
+            'progress': item_status.get('progress'),
+            'file': item_status.get('file'),
+            'message': item_status.get('message'),
+        })
+    return jsonify(dict(batch_data, batch_id=batch_id, items=items))
 
 @app.route('/get-video-info', methods=['POST'])
 @rate_limit
@@ -225,7 +363,6 @@ def get_video_info():
         return jsonify({'error': 'Invalid URL format'}), 400
     
     try:
-        import yt_dlp
         ydl_opts = {
             'format': f'bestvideo[height<={quality}]+bestaudio/best' if quality != 'best' else 'best',
             'quiet': True,
@@ -233,7 +370,7 @@ def get_video_info():
             'extract_flat': False,
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with download_manager.ytdl_pool.checkout(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=False)
             if info and 'url' in info:
                 return jsonify({'direct_url': info['url'], 'title': info.get('title', 'Video')})
@@ -247,18 +384,166 @@ def get_video_info():
         app.logger.error(f"Get video info error: {str(e)}")
         return jsonify({'direct_url': None})
 
+def job_status(download_id):
+    """Status dict for /status and /events, resolved through a shared job if attached to one"""
+    status_data = job_store.get(download_id) or {'status': 'not_found'}
+    
+    # Attached to another request's download - report the shared job's state
+    if status_data.get('follows') and status_data['status'] in ['queued', 'processing']:
+        leader = job_store.get(status_data['follows'])
+        if leader:
+            status_data = dict(leader, follows=status_data['follows'])
+    
+    if status_data['status'] == 'queued':
+        status_data['queue_position'] = job_store.queue_position(status_data.get('follows') or download_id)
+    elif status_data['status'] == 'processing' and status_data.get('partial_file'):
+        status_data['stream_url'] = f'/stream/{download_id}'
+    elif status_data['status'] == 'completed' and status_data.get('files'):
+        status_data['bundle_url'] = f'/bundle/{download_id}'
+    
+    return status_data
+
 @app.route('/status/<download_id>')
 def status(download_id):
-    status_data = download_status.get(download_id, {'status': 'not_found'})
+    return jsonify(job_status(download_id))
+
+@app.route('/events/<download_id>')
+def events(download_id):
+    """Server-Sent Events stream of status changes; ends once the job finishes"""
+    if not long_requests.acquire(blocking=False):
+        # Every stream slot holds a worker thread - let this client poll /status instead
+        return jsonify({'error': 'Too many open event streams, poll /status instead'}), 503
+    
+    release_once = threading.Lock()
     
-    # Clean up completed/error downloads after 1 hour
-    if status_data.get('status') in ['completed', 'error']:
-        if 'timestamp' not in status_data:
-            status_data['timestamp'] = time.time()
-        elif time.time() - status_data['timestamp'] > 3600:
-            download_status.pop(download_id, None)
+    def release():
+        if release_once.acquire(blocking=False):
+            long_requests.release()
     
-    return jsonify(status_data)
+    def generate():
+        try:
+            last_sent = None
+            last_write = time.time()
+            deadline = time.time() + config.EVENT_STREAM_TIMEOUT
+            while time.time() < deadline:
+                status_data = job_status(download_id)
+                payload = json.dumps(status_data, sort_keys=True)
+                if payload != last_sent:
+                    yield f"data: {payload}\n\n"
+                    last_sent = payload
+                    last_write = time.time()
+                    if status_data['status'] in ['completed', 'error', 'not_found']:
+                        return
+                elif time.time() - last_write > 15:
+                    yield ": keep-alive\n\n"
+                    last_write = time.time()
+                # Woken early by writes from this worker; other workers' writes are picked up on timeout
+                job_store.wait_for_change(1)
+            yield "event: timeout\ndata: {}\n\n"
+        finally:
+            release()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/stream/<download_id>')
+def stream(download_id):
+    """Send the file while it is still downloading, for the handlers that write it front to back"""
+    if not long_requests.acquire(blocking=False):
+        return jsonify({'error': 'Too many streams open, wait for the download to finish'}), 503
+    
+    opened = []
+    release_once = threading.Lock()
+    
+    def release():
+        if release_once.acquire(blocking=False):
+            for f in opened:
+                f.close()
+            long_requests.release()
+    
+    try:
+        response = app.make_response(stream_response(download_id, opened, release))
+    except Exception:
+        release()
+        raise
+    # Frees the slot once the response is sent, whether it streamed the .part file or not
+    response.call_on_close(release)
+    return response
+
+def stream_response(download_id, opened, release):
+    status_data = job_status(download_id)
+    deadline = time.time() + config.STREAM_START_TIMEOUT
+    # Wait for the job to start writing (or finish)
+    while status_data['status'] in ['queued', 'processing'] and not status_data.get('partial_file') \
+            and time.time() < deadline:
+        job_store.wait_for_change(1)
+        status_data = job_status(download_id)
+    
+    if status_data['status'] == 'completed':
+        return download_file(status_data['file'])
+    if status_data['status'] == 'not_found':
+        return jsonify({'error': 'Download not found'}), 404
+    if status_data['status'] == 'error':
+        return jsonify({'error': status_data.get('message', 'Download failed')}), 410
+    if not status_data.get('partial_file'):
+        return jsonify({'error': 'This download can\'t be streamed yet, wait for it to finish',
+                        'status': status_data['status']}), 409
+    
+    part_path = status_data['partial_file']
+    try:
+        # Held open for the whole stream: when the download finishes and the
+        # .part file is renamed, this handle still points at the same data
+        part_file = open(part_path, 'rb')
+    except OSError:
+        # Finished and renamed between the status check and here
+        status_data = job_status(download_id)
+        if status_data['status'] == 'completed':
+            return download_file(status_data['file'])
+        return jsonify({'error': 'Download is no longer available'}), 410
+    opened.append(part_file)
+    
+    engine = download_manager.engine
+    job_id = status_data.get('follows') or download_id
+    
+    def generate():
+        try:
+            sent = 0
+            while True:
+                available = engine.readable_bytes(part_path, part_file)
+                if available > sent:
+                    part_file.seek(sent)
+                    while sent < available:
+                        chunk = part_file.read(min(256 * 1024, available - sent))
+                        if not chunk:
+                            break
+                        sent += len(chunk)
+                        yield chunk
+                    continue
+                
+                job = job_store.get(job_id) or {'status': 'not_found'}
+                if job['status'] == 'completed' and sent >= os.fstat(part_file.fileno()).st_size:
+                    return
+                if job['status'] not in ['queued', 'processing', 'completed']:
+                    # Failed mid-way - end the response short so the client sees it as incomplete
+                    app.logger.warning(f"Stream of {job_id} ended early after {sent} bytes")
+                    return
+                job_store.wait_for_change(0.5)
+        finally:
+            release()
+    
+    import mimetypes
+    filename = status_data.get('partial_name') or 'download'
+    response = Response(stream_with_context(generate()),
+                        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if status_data.get('total_bytes'):
+        response.headers['Content-Length'] = str(status_data['total_bytes'])
+    response.headers['Content-Disposition'] = f'inline; filename="{secure_filename(filename) or "download"}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/search-username', methods=['POST'])
 @rate_limit
@@ -297,6 +582,71 @@ def download_file(filename):
     else:
         return send_file(filepath, as_attachment=True)
 
+def bundle_files(job_id):
+    """(path, name in the ZIP) of every finished file of a download or batch, or None if it isn't finished"""
+    status_data = job_status(job_id)
+    if status_data['status'] != 'completed':
+        return None
+    if status_data.get('kind') == 'batch':
+        names = []
+        for item in status_data.get('items', []):
+            item_status = job_status(item['id'])
+            if item_status['status'] == 'completed':
+                names.extend(item_status.get('files') or [item_status['file']])
+    else:
+        names = status_data.get('files') or [status_data['file']]
+    
+    folder = app.config['DOWNLOAD_FOLDER']
+    files, seen = [], set()
+    for name in names:
+        path = os.path.join(folder, os.path.basename(name))
+        if os.path.isfile(path) and name not in seen:
+            seen.add(name)
+            files.append((path, name))
+    return files
+
+@app.route('/bundle/<job_id>')
+def bundle(job_id):
+    """Every file of a finished multi-file download or batch as one ZIP, generated while it is sent.
+    
+    All-stored bundles (?compress=0, or nothing worth deflating) have a
+    fixed layout, so they get a Content-Length and support Range/If-Range.
+    """
+    files = bundle_files(job_id)
+    if files is None:
+        return jsonify({'error': 'Not found or not finished yet'}), 404
+    if not files:
+        return jsonify({'error': 'The files of this download are no longer available'}), 410
+    
+    try:
+        archive = ZipStream(files, compress=request.args.get('compress', '1') != '0', crc_cache=bundle_crcs)
+    except OSError:
+        # A file was evicted between the listing and here
+        return jsonify({'error': 'The files of this download are no longer available'}), 410
+    
+    headers = {'Content-Disposition': f'attachment; filename="bundle_{secure_filename(job_id)}.zip"'}
+    if archive.size is None:
+        headers['Accept-Ranges'] = 'none'
+        return Response(archive.iter_bytes(), mimetype='application/zip', headers=headers)
+    
+    etag = archive.etag
+    headers.update({'Accept-Ranges': 'bytes', 'ETag': f'"{etag}"'})
+    byte_range = request.range
+    if_range = request.headers.get('If-Range')
+    if byte_range and (not if_range or if_range.strip('"') == etag):
+        span = byte_range.range_for_length(archive.size)
+        if span is None:
+            headers['Content-Range'] = f'bytes */{archive.size}'
+            return Response(status=416, headers=headers)
+        start, stop = span
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{archive.size}'
+        headers['Content-Length'] = str(stop - start)
+        return Response(archive.iter_bytes(start, stop), status=206,
+                        mimetype='application/zip', headers=headers)
+    
+    headers['Content-Length'] = str(archive.size)
+    return Response(archive.iter_bytes(), mimetype='application/zip', headers=headers)
+
 @app.route('/download-file/<path:filename>')
 def download_file_attachment(filename):
     filename = os.path.basename(filename)
@@ -322,15 +672,16 @@ def remove_watermark():
     
     watermark_type = request.form.get('type', 'tiktok')
     
+    # Each upload gets its own folder, so two uploads with the same name don't collide
+    upload = Workspace(app.config['UPLOAD_FOLDER'])
     try:
-        filename = secure_filename(video.filename)
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filename = secure_filename(video.filename) or 'video'
+        upload_path = upload.file(filename)
         video.save(upload_path)
         
         # Check file size (max 50MB for free tier)
         file_size = os.path.getsize(upload_path)
         if file_size > 50 * 1024 * 1024:
-            os.remove(upload_path)
             return jsonify({'success': False, 'error': 'Video too large (max 50MB on free tier)'}), 400
         
         if watermark_type == 'tiktok':
@@ -344,13 +695,13 @@ def remove_watermark():
             height = int(request.form.get('height', 100))
             result = video_tools.remove_watermark(upload_path, x, y, width, height)
         
-        os.remove(upload_path)
+        janitor.track([result])
         return jsonify({'success': True, 'filename': result})
     except Exception as e:
-        if os.path.exists(upload_path):
-            os.remove(upload_path)
         app.logger.error(f"Watermark removal error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        upload.close()
 
 @app.route('/video-to-gif', methods=['POST'])
 @rate_limit
@@ -362,9 +713,10 @@ def video_to_gif():
     if video.filename == '':
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
+    upload = Workspace(app.config['UPLOAD_FOLDER'])
     try:
-        filename = secure_filename(video.filename)
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filename = secure_filename(video.filename) or 'video'
+        upload_path = upload.file(filename)
         video.save(upload_path)
         
         start = float(request.form.get('start', 0))
@@ -373,11 +725,13 @@ def video_to_gif():
         
         result = video_tools.video_to_gif(upload_path, start, duration, fps)
         
-        os.remove(upload_path)
+        janitor.track([result])
         return jsonify({'success': True, 'filename': result})
     except Exception as e:
         app.logger.error(f"GIF conversion error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        upload.close()
 
 @app.route('/compress-video', methods=['POST'])
 @rate_limit
@@ -389,9 +743,10 @@ def compress_video():
     if video.filename == '':
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
+    upload = Workspace(app.config['UPLOAD_FOLDER'])
     try:
-        filename = secure_filename(video.filename)
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filename = secure_filename(video.filename) or 'video'
+        upload_path = upload.file(filename)
         video.save(upload_path)
         
         original_size = os.path.getsize(upload_path)
@@ -400,8 +755,7 @@ def compress_video():
         result = video_tools.compress_video(upload_path, quality)
         
         compressed_size = os.path.getsize(os.path.join(app.config['DOWNLOAD_FOLDER'], result))
-        
-        os.remove(upload_path)
+        janitor.track([result])
         
         def format_size(size):
             for unit in ['B', 'KB', 'MB', 'GB']:
@@ -419,6 +773,8 @@ def compress_video():
     except Exception as e:
         app.logger.error(f"Compression error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        upload.close()
 
 @app.route('/convert-format', methods=['POST'])
 @rate_limit
@@ -430,19 +786,22 @@ def convert_format():
     if video.filename == '':
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
+    upload = Workspace(app.config['UPLOAD_FOLDER'])
     try:
-        filename = secure_filename(video.filename)
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filename = secure_filename(video.filename) or 'video'
+        upload_path = upload.file(filename)
         video.save(upload_path)
         
         output_format = request.form.get('format', 'mp4')
         result = video_tools.convert_format(upload_path, output_format)
         
-        os.remove(upload_path)
+        janitor.track([result])
         return jsonify({'success': True, 'filename': result})
     except Exception as e:
         app.logger.error(f"Format conversion error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        upload.close()
 
 @app.route('/rotate-video', methods=['POST'])
 @rate_limit
@@ -454,19 +813,22 @@ def rotate_video():
     if video.filename == '':
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
+    upload = Workspace(app.config['UPLOAD_FOLDER'])
     try:
-        filename = secure_filename(video.filename)
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filename = secure_filename(video.filename) or 'video'
+        upload_path = upload.file(filename)
         video.save(upload_path)
         
         rotation = request.form.get('rotation', '90')
         result = video_tools.rotate_video(upload_path, rotation)
         
-        os.remove(upload_path)
+        janitor.track([result])
         return jsonify({'success': True, 'filename': result})
     except Exception as e:
         app.logger.error(f"Rotation error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        upload.close()
 
 @app.route('/download-subtitle', methods=['POST'])
 @rate_limit
@@ -506,18 +868,5 @@ def not_found(error):
     return jsonify({'error': 'Not found'}), 404
 
 if __name__ == '__main__':
-    # Clean old downloads on startup
-    try:
-        cleanup_age = config.CLEANUP_AGE_HOURS * 3600
-        for f in os.listdir(app.config['DOWNLOAD_FOLDER']):
-            filepath = os.path.join(app.config['DOWNLOAD_FOLDER'], f)
-            if os.path.isfile(filepath):
-                file_age = time.time() - os.path.getmtime(filepath)
-                if file_age > cleanup_age:
-                    os.remove(filepath)
-                    print(f"Cleaned old file: {f}")
-    except Exception as e:
-        print(f"Cleanup error: {e}")
-    
     print(f"Starting server on {config.HOST}:{config.PORT}")
     app.run(debug=config.DEBUG, host=config.HOST, port=config.PORT, threaded=config.THREADED)
@@ -1,6 +1,7 @@
 import schedule
 import time
 from proxy_scraper import ProxyScraper
+from proxy_db import ProxyDB
 import threading
 
 def update_proxies():
@@ -9,9 +10,9 @@ def update_proxies():
     print("="*50)
     
     scraper = ProxyScraper()
-    proxies = scraper.scrape_proxies(test=True, max_test=100)
+    proxies = scraper.refresh(ProxyDB())
     
-    if proxies:
+    if proxies and proxies != [None]:
         scraper.save_proxies(proxies)
         print("✅ Proxy list updated!")
     else:
@@ -19,15 +20,22 @@ def update_proxies():
     
     print("="*50 + "\n")
 
+def publish_known_proxies():
+    """Write the proxies that worked at the last refresh, so they are usable before the first new one finishes"""
+    known = ProxyDB().working()
+    if known:
+        ProxyScraper().save_proxies(known)
+
 def start_auto_updater(interval_hours=6):
     """Start background proxy updater"""
-    # Update immediately on start
-    update_proxies()
+    publish_known_proxies()
     
     # Schedule periodic updates
     schedule.every(interval_hours).hours.do(update_proxies)
     
     def run_scheduler():
+        # First refresh right away, but on this thread - the caller doesn't wait for it
+        update_proxies()
         while True:
             schedule.run_pending()
             time.sleep(60)
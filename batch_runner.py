@@ -0,0 +1,102 @@
+import time
+import itertools
+import config
+from job_scheduler import QueueFull
+from job_store import FINISHED_STATUSES
+
+class BatchRunner:
+    """Feeds the items of one batch to the download workers, at most concurrency at a time.
+    
+    entries is an iterable of (url, title), consumed as the batch gets
+    room for more items; a playlist is expanded when the first one is taken.
+    start(url) queues one download and returns its job id, raising
+    QueueFull when the scheduler has no room. Items report back through
+    the job store, so an item attached to the same download in another
+    worker is followed just as well as one running here.
+    
+    The batch's own job record holds the item list and the aggregate
+    counters (submitted, completed, failed, progress); total stays None
+    until the source is fully expanded.
+    """
+    
+    def __init__(self, store, batch_id, entries, start, retry_after, concurrency=None, max_items=None):
+        self.store = store
+        self.batch_id = batch_id
+        self.entries = entries
+        self.start = start
+        self.retry_after = retry_after
+        self.concurrency = concurrency or config.BATCH_CONCURRENCY
+        self.max_items = max_items or config.BATCH_MAX_ITEMS
+        self.items = []  # [{'id', 'url', 'title'}] in playlist order
+        self.active = set()  # item ids not finished yet
+        self.completed = 0
+        self.failed = 0
+    
+    def run(self):
+        message = None
+        try:
+            for url, title in itertools.islice(self.entries, self.max_items):
+                self.wait_for_room()
+                self.submit(url, title)
+        except Exception as e:
+            # A playlist that breaks half-way still runs the entries found so far
+            message = f"Stopped expanding after {len(self.items)} items: {str(e)[:200]}"
+            print(f"Batch {self.batch_id}: {message}")
+        
+        self.save(total=len(self.items), expanding=False, **({'message': message} if message else {}))
+        while self.active:
+            self.store.wait_for_change(1)
+            self.poll()
+        
+        status = 'error' if self.items and self.failed == len(self.items) else 'completed'
+        if not self.items:
+            status, message = 'error', message or 'No downloadable entries found'
+        self.store.update(self.batch_id, status, **self.counters(), total=len(self.items), expanding=False,
+                          timestamp=time.time(), **({'message': message} if message else {}))
+    
+    def wait_for_room(self):
+        """Block until fewer than concurrency items are unfinished"""
+        self.poll()
+        while len(self.active) >= self.concurrency:
+            self.store.wait_for_change(1)
+            self.poll()
+    
+    def submit(self, url, title):
+        while True:
+            try:
+                item_id = self.start(url)
+                break
+            except QueueFull:
+                # The whole scheduler is busy, not just this batch - back off and try the same entry again
+                time.sleep(self.retry_after())
+        self.items.append({'id': item_id, 'url': url, 'title': title})
+        self.active.add(item_id)
+        self.save()
+    
+    def poll(self):
+        """Count items that finished since the last look"""
+        changed = False
+        for item_id in list(self.active):
+            item = self.store.get(item_id) or {'status': 'error'}
+            if item['status'] in FINISHED_STATUSES:
+                self.active.discard(item_id)
+                if item['status'] == 'completed':
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                changed = True
+        if changed:
+            self.save()
+    
+    def counters(self):
+        finished = self.completed + self.failed
+        return {
+            'submitted': len(self.items),
+            'running': len(self.active),
+            'completed': self.completed,
+            'failed': self.failed,
+            'progress': round(100.0 * finished / len(self.items), 1) if self.items else 0,
+        }
+    
+    def save(self, **fields):
+        self.store.update(self.batch_id, items=self.items, **self.counters(), **fields)
@@ -0,0 +1,139 @@
+"""Native DASH engine against a locally served synthetic MPD.
+
+The MPD has two video representations (SegmentTemplate with $Number$)
+and one audio representation (SegmentTemplate with a SegmentTimeline),
+served with a fixed delay per request. A second MPD describes the same
+media with SegmentList and SegmentBase. Checks that representation choice
+and segment order give back exactly the generated bytes (exit 1 if not),
+then times fetching video + audio with one worker (one segment after the
+other, as yt-dlp does) against the shared parallel window.
+
+    python benchmarks/bench_dash.py [--segments 40] [--segment-kb 256] [--latency-ms 40]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dash_downloader import DashDownloader
+from bench_hls import serve
+
+def build_origin(segments, segment_size):
+    files = {}
+    tracks = {}
+    for rep_id in ('v360', 'v720', 'a128'):
+        size = segment_size if rep_id.startswith('v') else segment_size // 4
+        init = os.urandom(512)
+        chunks = [os.urandom(size) for _ in range(segments)]
+        files[f'/media/{rep_id}/init.mp4'] = init
+        for number, chunk in enumerate(chunks, start=1):
+            files[f'/media/{rep_id}/{number:05d}.m4s'] = chunk
+        files[f'/media/{rep_id}.mp4'] = init + b''.join(chunks)  # single-file form for SegmentBase
+        tracks[rep_id] = (init, chunks)
+    
+    duration = segments * 4
+    files['/template.mpd'] = f'''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{duration}S">
+  <Period>
+    <BaseURL>media/</BaseURL>
+    <AdaptationSet contentType="video" mimeType="video/mp4">
+      <SegmentTemplate initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/$Number%05d$.m4s"
+                       startNumber="1" timescale="1000" duration="4000"/>
+      <Representation id="v360" bandwidth="800000" width="640" height="360"/>
+      <Representation id="v720" bandwidth="2500000" width="1280" height="720"/>
+    </AdaptationSet>
+    <AdaptationSet contentType="audio" mimeType="audio/mp4">
+      <Representation id="a128" bandwidth="128000">
+        <SegmentTemplate initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/$Number%05d$.m4s"
+                         startNumber="1" timescale="48000">
+          <SegmentTimeline><S t="0" d="192000" r="{segments - 1}"/></SegmentTimeline>
+        </SegmentTemplate>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>'''.encode()
+    
+    segment_urls = ''.join(f'<SegmentURL media="{n:05d}.m4s"/>' for n in range(1, segments + 1))
+    files['/list.mpd'] = f'''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{duration}S">
+  <Period>
+    <AdaptationSet mimeType="video/mp4">
+      <Representation id="v720" bandwidth="2500000" height="720">
+        <BaseURL>media/v720/</BaseURL>
+        <SegmentList><Initialization sourceURL="init.mp4"/>{segment_urls}</SegmentList>
+      </Representation>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4">
+      <Representation id="a128" bandwidth="128000">
+        <BaseURL>media/a128.mp4</BaseURL>
+        <SegmentBase indexRange="0-511"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>'''.encode()
+    return files, tracks
+
+def fetch(url, workers, workdir, quality):
+    """Resolve and fetch every track; returns ([bytes per track], seconds)"""
+    engine = DashDownloader(workdir, workers=workers, max_retries=0)
+    session = engine.make_session()
+    started = time.perf_counter()
+    try:
+        playlists = engine.resolve(session, url, quality)
+        folder = os.path.join(engine.work_folder(url, quality), str(workers))
+        tracks = [(playlist, os.path.join(folder, str(i))) for i, playlist in enumerate(playlists)]
+        track_paths = engine.fetch_tracks(session, tracks)
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+    
+    data = []
+    for paths in track_paths:
+        joined = b''
+        for path in paths:
+            with open(path, 'rb') as f:
+                joined += f.read()
+        data.append(joined)
+    return data, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segments', type=int, default=40)
+    parser.add_argument('--segment-kb', type=int, default=256)
+    parser.add_argument('--latency-ms', type=float, default=40)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    
+    files, tracks = build_origin(args.segments, args.segment_kb * 1024)
+    server = serve(files, args.latency_ms / 1000)
+    origin = f'http://127.0.0.1:{server.server_port}'
+    expected = lambda rep_id: tracks[rep_id][0] + b''.join(tracks[rep_id][1])
+    total_mb = (len(expected('v720')) + len(expected('a128'))) / 1024 / 1024
+    
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        for workers in (1, args.workers):
+            data, elapsed = fetch(f'{origin}/template.mpd', workers, workdir, 'best')
+            ok = data == [expected('v720'), expected('a128')]
+            failed = failed or not ok
+            print(f"workers={workers:<3d} {elapsed:6.2f}s  {total_mb / elapsed:7.1f} MB/s  "
+                  f"video+audio {'OK' if ok else 'MISMATCH'}")
+        
+        checks = [
+            ('quality=480 picks 360p', f'{origin}/template.mpd', '480', [expected('v360'), expected('a128')]),
+            ('SegmentList + SegmentBase', f'{origin}/list.mpd', 'best', [expected('v720'), expected('a128')]),
+        ]
+        for name, url, quality, want in checks:
+            data, _ = fetch(url, args.workers, workdir, quality)
+            if data != want:
+                print(f"FAIL: {name}")
+                failed = True
+    
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
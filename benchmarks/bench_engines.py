@@ -0,0 +1,311 @@
+"""Download flows end to end against the local origin, with JSON results that can be compared between runs.
+
+Each flow goes through DownloadManager.download_files, so routing, the
+job workspace, the engine and the commit into downloads/ are all timed:
+
+    direct  download_direct: one file over parallel Range requests
+    gofile  download_gofile's pattern: share page, content API, then every
+            file over the same session (the real handler's API host is
+            fixed, so a stand-in handler is routed to localhost)
+    hls     download_m3u8: encrypted segments, decrypted and joined
+    dash    download_streaming_manifest: video + audio segment templates
+
+Synthetic segments aren't media ffmpeg could read, so for hls and dash the
+final ffmpeg -c copy mux is replaced by joining the tracks.
+
+Every measurement runs in a fresh worker process (the origin stays in
+this one) at each --concurrency level: that many downloads at once,
+--rounds times. Reported are aggregate throughput, CPU seconds per GB,
+peak RSS and the speedup over concurrency 1. Every download is checked
+against the generated bytes; a mismatch fails the run (exit 1). Injected
+errors are drawn from --seed, so runs with the same arguments fail the
+same share of requests.
+
+--output writes the results as JSON. --baseline compares against an
+earlier file and flags throughput drops or CPU/RSS growth beyond
+--tolerance as regressions (exit 1).
+
+    python benchmarks/bench_engines.py [--flows direct,gofile,hls,dash] [--concurrency 1,4]
+        [--size-mb 64] [--latency-ms 20] [--rate-mbps 0] [--error-rate 0] [--seed 1] [--rounds 3]
+        [--output results.json] [--baseline previous.json] [--tolerance 0.15]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import statistics
+import subprocess
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from origin import Origin, build_direct, build_gofile, build_hls, build_dash
+
+SEGMENT_KB = 512
+
+def build_flow(flow, size):
+    """(files, [expected outputs], path of the URL to download, host it is fetched from)"""
+    if flow == 'direct':
+        files, data = build_direct(size)
+        return files, [data], '/files/direct.mp4', '127.0.0.1'
+    if flow == 'gofile':
+        files, expected = build_gofile(2, size // 2)
+        return files, list(expected.values()), '/d/bench', 'localhost'
+    if flow == 'hls':
+        files, data = build_hls(max(1, size // (SEGMENT_KB * 1024)), SEGMENT_KB * 1024)
+        return files, [data], '/hls/master.m3u8', '127.0.0.1'
+    if flow == 'dash':
+        files, data = build_dash(max(1, size // (SEGMENT_KB * 1024)), SEGMENT_KB * 1024)
+        return files, [data], '/dash/manifest.mpd', '127.0.0.1'
+    raise ValueError(f"unknown flow {flow}")
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def run_worker(url, expected, concurrency, rounds):
+    """One measurement in a fresh process; returns its result dict"""
+    command = [sys.executable, os.path.abspath(__file__), '--worker', url, '--concurrency', str(concurrency),
+               '--rounds', str(rounds), '--expect', ','.join(expected)]
+    done = subprocess.run(command, capture_output=True, text=True)
+    lines = done.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {'ok': False, 'errors': [f"worker exited with {done.returncode}: {done.stderr.strip()[-500:]}"]}
+
+def worker_main(url, expected, concurrency, rounds):
+    """Body of the worker process: download url concurrency times at once, rounds times, and report as JSON"""
+    import shutil
+    import tempfile
+    try:
+        import resource
+    except ImportError:
+        resource = None  # Windows: no peak RSS
+    
+    # An empty working directory: no proxies.txt, so every request goes out directly
+    workdir = tempfile.mkdtemp(prefix='bench_engines_')
+    os.chdir(workdir)
+    import downloader
+    from hls_downloader import HlsDownloader
+    from dash_downloader import DashDownloader
+    
+    class JoinedHls(HlsDownloader):
+        def remux(self, tracks, filepath):
+            self.join([path for paths in tracks for path in paths], filepath)
+    
+    class JoinedDash(DashDownloader):
+        def remux(self, tracks, filepath):
+            self.join([path for paths in tracks for path in paths], filepath)
+    
+    def download_gofile_local(manager, url):
+        """download_gofile's requests, with the content API on the origin; returns every file of the folder"""
+        proxy = manager.pick_proxy()
+        proxies = {'http': proxy, 'https': proxy} if proxy else None
+        base, _, rest = url.partition('/d/')
+        content_id, _, query = rest.partition('?')
+        with manager.sessions.session(proxy) as session:
+            session.get(url, proxies=proxies)
+            data = session.get(f'{base}/getContent?contentId={content_id}&{query}', proxies=proxies).json()
+            names = []
+            for file_info in data['data']['contents'].values():
+                manager.engine.download(file_info['link'], manager.work_path(file_info['name']), proxies=proxies,
+                                        progress=manager.current_progress(), session=session)
+                names.append(file_info['name'])
+            return names
+    
+    downloader.ROUTER.register(download_gofile_local, hosts=['localhost'])
+    manager = downloader.DownloadManager('downloads')
+    manager.hls = JoinedHls(manager.hls.partial_folder, timeout=manager.timeout)
+    manager.dash = JoinedDash(manager.dash.partial_folder, timeout=manager.timeout)
+    
+    errors = []
+    
+    def fetch(job_url, outputs):
+        try:
+            outputs.extend(manager.download_files(job_url))
+        except Exception as e:
+            errors.append(f"{job_url}: {str(e)[:200]}")
+    
+    def check(outputs):
+        hashes = []
+        for name in outputs:
+            path = os.path.join('downloads', name)
+            with open(path, 'rb') as f:
+                hashes.append(sha256(f.read()))
+            os.remove(path)
+        return sorted(hashes)
+    
+    separator = '&' if '?' in url else '?'
+    warmup = []
+    fetch(f'{url}{separator}run=warmup', warmup)  # imports, first connections
+    if warmup and check(warmup) != sorted(expected):
+        errors.append("warm-up download doesn't match the origin's bytes")
+    rss_before = peak_rss_mb(resource)
+    
+    seconds = []
+    cpu = 0.0
+    for round_number in range(rounds):
+        outputs = [[] for _ in range(concurrency)]
+        threads = [threading.Thread(target=fetch, args=(f'{url}{separator}run={round_number}-{i}', outputs[i]))
+                   for i in range(concurrency)]
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds.append(time.perf_counter() - started)
+        cpu += time.process_time() - cpu_started
+        for job_outputs in outputs:
+            if job_outputs and check(job_outputs) != sorted(expected):
+                errors.append(f"round {round_number}: output doesn't match the origin's bytes")
+    
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {'ok': not errors, 'errors': errors[:5], 'seconds': seconds, 'cpu_seconds': cpu,
+            'rss_before_mb': rss_before, 'peak_rss_mb': peak_rss_mb(resource)}
+
+def peak_rss_mb(resource):
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def measure(flow, args):
+    files, expected, path, host = build_flow(flow, args.size_mb * 1024 * 1024)
+    origin = Origin(files, latency=args.latency_ms / 1000, rate=args.rate_mbps * 1e6 / 8 or None,
+                    error_rate=args.error_rate, seed=args.seed).start()
+    job_bytes = sum(len(data) for data in expected)
+    hashes = [sha256(data) for data in expected]
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            before = origin.stats()
+            outcome = run_worker(origin.url(path, host), hashes, concurrency, args.rounds)
+            after = origin.stats()
+            result = {'flow': flow, 'concurrency': concurrency, 'job_bytes': job_bytes, 'ok': outcome['ok']}
+            if outcome.get('seconds'):
+                median = statistics.median(outcome['seconds'])
+                total_bytes = job_bytes * concurrency * len(outcome['seconds'])
+                result.update({
+                    'seconds': round(median, 3),
+                    'mb_per_s': round(job_bytes * concurrency / median / 1e6, 1),
+                    'cpu_s_per_gb': round(outcome['cpu_seconds'] / (total_bytes / 1e9), 2),
+                    'rss_before_mb': outcome['rss_before_mb'],
+                    'peak_rss_mb': outcome['peak_rss_mb'],
+                })
+            result.update({'requests': after['requests'] - before['requests'],
+                           'injected_errors': after['injected_errors'] - before['injected_errors']})
+            if outcome.get('errors'):
+                result['errors'] = outcome['errors']
+            results.append(result)
+    finally:
+        origin.stop()
+    
+    single = next((r for r in results if r['concurrency'] == 1 and 'mb_per_s' in r), None)
+    for result in results:
+        if single and 'mb_per_s' in result:
+            result['speedup'] = round(result['mb_per_s'] / single['mb_per_s'], 2)
+    return results
+
+def environment(args):
+    import config
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {'DOWNLOAD_SEGMENTS': config.DOWNLOAD_SEGMENTS, 'HLS_SEGMENT_WORKERS': config.HLS_SEGMENT_WORKERS,
+                     'MAX_RETRIES': config.MAX_RETRIES},
+        'args': {'size_mb': args.size_mb, 'latency_ms': args.latency_ms, 'rate_mbps': args.rate_mbps,
+                 'error_rate': args.error_rate, 'seed': args.seed, 'rounds': args.rounds},
+    }
+
+def compare(results, baseline, tolerance):
+    """Regression messages for results that got worse than baseline by more than tolerance"""
+    previous = {(r['flow'], r['concurrency']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get((result['flow'], result['concurrency']))
+        if not old or 'mb_per_s' not in old or 'mb_per_s' not in result:
+            continue
+        name = f"{result['flow']} x{result['concurrency']}"
+        if result['mb_per_s'] < old['mb_per_s'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['mb_per_s']} -> {result['mb_per_s']} MB/s")
+        if result['cpu_s_per_gb'] > old['cpu_s_per_gb'] * (1 + tolerance):
+            regressions.append(f"{name}: CPU {old['cpu_s_per_gb']} -> {result['cpu_s_per_gb']} s/GB")
+        # Peak RSS moves by a few MB from run to run; only growth that is big in absolute terms too counts
+        if old.get('peak_rss_mb') and result.get('peak_rss_mb') and \
+                result['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance) and \
+                result['peak_rss_mb'] - old['peak_rss_mb'] > 20:
+            regressions.append(f"{name}: peak RSS {old['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', default='direct,gofile,hls,dash')
+    parser.add_argument('--concurrency', default='1,4', type=lambda v: [int(n) for n in v.split(',')])
+    parser.add_argument('--size-mb', type=int, default=64, help="bytes per download")
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--rate-mbps', type=float, default=0, help="per-connection limit, 0 for none")
+    parser.add_argument('--error-rate', type=float, default=0, help="share of media responses that fail")
+    parser.add_argument('--seed', type=int, default=1, help="for the injected errors")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--expect', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        print(json.dumps(worker_main(args.worker, args.expect.split(','), args.concurrency[0], args.rounds)))
+        return
+    
+    results = []
+    for flow in args.flows.split(','):
+        for result in measure(flow, args):
+            results.append(result)
+            if 'mb_per_s' in result:
+                line = (f"{flow:<7} x{result['concurrency']:<3d} {result['mb_per_s']:8.1f} MB/s  "
+                        f"{result['cpu_s_per_gb']:6.2f} CPU s/GB  peak RSS {result['peak_rss_mb']} MB  "
+                        f"speedup {result.get('speedup', '-')}")
+            else:
+                line = f"{flow:<7} x{result['concurrency']:<3d} no measurement"
+            if result['injected_errors']:
+                line += f"  ({result['injected_errors']} injected errors)"
+            if not result['ok']:
+                line += f"  FAILED: {'; '.join(result.get('errors', []))}"
+            print(line)
+    
+    report = {'environment': environment(args), 'results': results}
+    failed = not all(result['ok'] for result in results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['environment'].get('args') != report['environment']['args']:
+            print("Note: the baseline was run with different arguments, the comparison is rough")
+        report['regressions'] = compare(results, baseline, args.tolerance)
+        for message in report['regressions']:
+            print(f"REGRESSION {message}")
+        failed = failed or bool(report['regressions'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
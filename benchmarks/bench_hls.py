@@ -0,0 +1,149 @@
+"""Native HLS engine against a local stand-in origin.
+
+Serves a generated master playlist (two variants), AES-128 encrypted
+segments and their key from a local HTTP server (Range capable) that
+adds a fixed delay per request, like a real CDN round trip. Checks that
+variant selection, decryption and ordering produce exactly the original
+bytes (exit 1 if not), then times fetch + join with one worker (what
+ffmpeg -i does) against the parallel pool. The final remux is included when ffmpeg is
+installed.
+
+    python benchmarks/bench_hls.py [--segments 60] [--segment-kb 256] [--latency-ms 40]
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Crypto.Cipher import AES
+from hls_downloader import HlsDownloader
+
+KEY = bytes(range(16))
+
+def build_origin(segments, segment_size):
+    """{path: body} for a master playlist, two media playlists, their segments and the key"""
+    files = {'/key.bin': KEY}
+    plain = {}
+    for height in (360, 720):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0',
+                 '#EXT-X-KEY:METHOD=AES-128,URI="/key.bin"']
+        chunks = []
+        for i in range(segments):
+            data = os.urandom(segment_size)
+            chunks.append(data)
+            padding = 16 - len(data) % 16
+            files[f'/{height}/seg{i}.ts'] = AES.new(KEY, AES.MODE_CBC, i.to_bytes(16, 'big')).encrypt(
+                data + bytes([padding]) * padding)
+            lines += ['#EXTINF:4.0,', f'seg{i}.ts']
+        lines.append('#EXT-X-ENDLIST')
+        files[f'/{height}/index.m3u8'] = '\n'.join(lines).encode()
+        plain[height] = b''.join(chunks)
+    
+    files['/master.m3u8'] = '\n'.join([
+        '#EXTM3U',
+        '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360',
+        '360/index.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720',
+        '720/index.m3u8',
+    ]).encode()
+    return files, plain
+
+def serve(files, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_GET(self):
+            time.sleep(latency)
+            body = files.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+                body = body[start:end + 1]
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run(url, workers, workdir, quality):
+    engine = HlsDownloader(workdir, workers=workers, max_retries=0)
+    session = engine.make_session()
+    started = time.perf_counter()
+    try:
+        playlists = engine.resolve(session, url, quality)
+        folder = os.path.join(engine.work_folder(url, quality), str(workers))
+        paths = engine.fetch_segments(session, playlists[0], folder)
+        joined = os.path.join(workdir, f'joined{workers}.ts')
+        engine.join(paths, joined)
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+    
+    remux_seconds = None
+    if shutil.which('ffmpeg'):
+        t = time.perf_counter()
+        try:
+            engine.remux([paths], os.path.join(workdir, f'out{workers}.mp4'))
+            remux_seconds = time.perf_counter() - t
+        except Exception:
+            pass  # random bytes aren't a real transport stream
+    return joined, elapsed, remux_seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segments', type=int, default=60)
+    parser.add_argument('--segment-kb', type=int, default=256)
+    parser.add_argument('--latency-ms', type=float, default=40)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    
+    files, plain = build_origin(args.segments, args.segment_kb * 1024)
+    server = serve(files, args.latency_ms / 1000)
+    url = f'http://127.0.0.1:{server.server_port}/master.m3u8'
+    total_mb = args.segments * args.segment_kb / 1024
+    
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        for workers in (1, args.workers):
+            joined, elapsed, remux_seconds = run(url, workers, workdir, '720')
+            with open(joined, 'rb') as f:
+                ok = f.read() == plain[720]
+            failed = failed or not ok
+            line = f"workers={workers:<3d} {elapsed:6.2f}s  {total_mb / elapsed:7.1f} MB/s  bytes {'OK' if ok else 'MISMATCH'}"
+            if remux_seconds is not None:
+                line += f"  remux {remux_seconds:.2f}s"
+            print(line)
+        
+        # Quality capping picks the 360p variant
+        joined, _, _ = run(url, args.workers, workdir, '480')
+        with open(joined, 'rb') as f:
+            if f.read() != plain[360]:
+                print("FAIL: quality=480 did not select the 360p variant")
+                failed = True
+    
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Job time with random.choice vs. ProxyPool over a simulated proxy list.
+
+No network: each simulated proxy has a throughput and a chance of failing,
+and a failure costs a full socket timeout, as it does in the handlers.
+Both strategies run the same number of jobs against the same proxies;
+ProxyPool only learns from the outcomes it is told about.
+
+    python benchmarks/bench_proxy_pool.py [--jobs 5000] [--proxies 50] [--timeout 300]
+"""
+import os
+import sys
+import random
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proxy_pool import ProxyPool
+
+def make_proxies(count, rng):
+    """{proxy: (bytes/s, failure probability)} - a few fast ones, many mediocre, some dead"""
+    proxies = {}
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.2:
+            proxies[f'http://10.0.0.{i}:8080'] = (rng.uniform(0.0, 0.1) * 2 ** 20, 0.95)  # dead
+        elif kind < 0.8:
+            proxies[f'http://10.0.0.{i}:8080'] = (rng.uniform(0.2, 1.0) * 2 ** 20, 0.15)
+        else:
+            proxies[f'http://10.0.0.{i}:8080'] = (rng.uniform(4.0, 8.0) * 2 ** 20, 0.02)
+    return proxies
+
+def run_job(proxy, proxies, size, timeout, rng):
+    """(seconds, succeeded) for one simulated download"""
+    throughput, failure = proxies[proxy]
+    if rng.random() < failure:
+        return timeout, False
+    return size / throughput, True
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=5000)
+    parser.add_argument('--proxies', type=int, default=50)
+    parser.add_argument('--size-mb', type=float, default=50)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+    
+    proxies = make_proxies(args.proxies, random.Random(1))
+    size = args.size_mb * 2 ** 20
+    
+    rng = random.Random(2)
+    chooser = random.Random(3)
+    total = failures = 0
+    for _ in range(args.jobs):
+        seconds, ok = run_job(chooser.choice(list(proxies)), proxies, size, args.timeout, rng)
+        total += seconds
+        failures += not ok
+    print(f"random.choice  {total / args.jobs:7.1f} s/job  {failures / args.jobs:6.1%} failed")
+    
+    rng = random.Random(2)
+    random.seed(3)
+    # A huge cooldown keeps the simulation offline: benched proxies are never probed
+    pool = ProxyPool(list(proxies), cooldown=10 ** 9)
+    total = failures = 0
+    for _ in range(args.jobs):
+        proxy = pool.choose()
+        seconds, ok = run_job(proxy, proxies, size, args.timeout, rng)
+        if ok:
+            pool.succeeded(proxy, seconds, size)
+        else:
+            with contextlib.redirect_stdout(None):  # "benched" notices
+                pool.failed(proxy)
+        total += seconds
+        failures += not ok
+    stats = pool.stats()
+    print(f"ProxyPool      {total / args.jobs:7.1f} s/job  {failures / args.jobs:6.1%} failed  "
+          f"({stats['open']} of {stats['total']} proxies benched)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Proxy validation throughput, the old thread pool vs. ProxyValidator.
+
+A child process plays every proxy and the test target at once. It listens
+on all loopback addresses, so 127.0.0.N:port candidates all reach it, and
+the N decides the behaviour: working (transparent, anonymous or elite, after
+--latency-ms), accepting but never answering (a timeout), or nothing
+listening (refused). Both validators get the same candidate list. The
+anonymity levels they report are checked against what the stand-in did.
+
+    python benchmarks/bench_proxy_validator.py [--candidates 2000] [--timeout 1]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from proxy_validator import ProxyValidator
+
+def behaviour(address):
+    """What the stand-in does for a candidate at 127.0.0.N (by N)"""
+    n = int(address.rsplit('.', 1)[1]) % 10
+    return {0: 'transparent', 1: 'anonymous', 2: 'elite'}.get(n, 'silent' if n < 6 else 'refused')
+
+def serve(latency):
+    """Run in the child: proxy + echo target on one port, a never-answering port, print both"""
+    async def handle(reader, writer):
+        address = writer.get_extra_info('sockname')[0]
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                headers[name.strip()] = value.strip()
+            await asyncio.sleep(latency)
+            # Absolute-form target = we're being used as a proxy; relative = a direct request to the target
+            proxied = request_line.split()[1].startswith(b'http')
+            mode = behaviour(address) if proxied else 'direct'
+            if mode == 'transparent':
+                headers['X-Forwarded-For'] = '127.0.0.1'
+            elif mode == 'anonymous':
+                headers['Via'] = '1.1 stand-in'
+            origin = '127.0.0.1' if mode in ('direct', 'transparent') else '198.51.100.7'
+            body = json.dumps({'origin': origin, 'headers': headers}).encode()
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         b'Content-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(body), body))
+            await writer.drain()
+        finally:
+            writer.close()
+    
+    async def silent(reader, writer):
+        await asyncio.sleep(3600)
+    
+    async def main():
+        server = await asyncio.start_server(handle, '0.0.0.0', 0, backlog=4096)
+        blackhole = await asyncio.start_server(silent, '0.0.0.0', 0, backlog=4096)
+        print(server.sockets[0].getsockname()[1], blackhole.sockets[0].getsockname()[1], flush=True)
+        await asyncio.sleep(10 ** 9)
+    
+    asyncio.run(main())
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def candidates(count, port, silent_port, closed_port):
+    proxies = []
+    for i in range(count):
+        address = f'127.0.{i // 250}.{i % 250 + 1}'
+        mode = behaviour(address)
+        proxies.append(f"{address}:{silent_port if mode == 'silent' else closed_port if mode == 'refused' else port}")
+    return proxies
+
+def threaded(proxies, test_url, timeout, workers=30):
+    """The old ProxyScraper loop: requests.get per candidate on 30 threads"""
+    def test(proxy):
+        try:
+            response = requests.get(test_url, proxies={'http': f'http://{proxy}'}, timeout=timeout)
+            return proxy if response.status_code == 200 else None
+        except requests.exceptions.RequestException:
+            return None
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(test, proxy) for proxy in proxies]
+        return [f.result() for f in as_completed(futures) if f.result()]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, default=2000)
+    parser.add_argument('--timeout', type=float, default=1)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--serve', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve is not None:
+        serve(args.serve)
+        return
+    
+    server = subprocess.Popen([sys.executable, __file__, '--serve', str(args.latency_ms / 1000)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        port, silent_port = map(int, server.stdout.readline().split())
+        test_url = f'http://127.0.0.1:{port}/get'
+        proxies = candidates(args.candidates, port, silent_port, free_port())
+        expected = {p: behaviour(p.split(':')[0]) for p in proxies
+                    if behaviour(p.split(':')[0]) in ('transparent', 'anonymous', 'elite')}
+        
+        started = time.perf_counter()
+        working = threaded(proxies, test_url, args.timeout)
+        elapsed = time.perf_counter() - started
+        print(f"threads(30)     {elapsed:6.1f}s  {len(proxies) / elapsed:7.0f} candidates/s  {len(working)} working")
+        
+        validator = ProxyValidator(test_url, timeout=args.timeout, concurrency=args.concurrency)
+        started = time.perf_counter()
+        first = None
+        checks = {}
+        for check in validator.iter_working(proxies):
+            first = first or time.perf_counter() - started
+            checks[check.proxy] = check
+        elapsed = time.perf_counter() - started
+        print(f"ProxyValidator  {elapsed:6.1f}s  {len(proxies) / elapsed:7.0f} candidates/s  {len(checks)} working, "
+              f"first after {first:.2f}s")
+        
+        wrong = [p for p, level in expected.items() if p not in checks or checks[p].anonymity != level]
+        if wrong:
+            print(f"FAIL: {len(wrong)} working proxies missed or misclassified, e.g. {wrong[0]}")
+            sys.exit(1)
+    finally:
+        server.kill()
+
+if __name__ == '__main__':
+    main()
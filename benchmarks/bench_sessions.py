@@ -0,0 +1,93 @@
+"""Connection setup per job, module-level requests.get vs. the shared SessionPool.
+
+Each job makes three small back-to-back requests (what download_gofile
+does before the file itself) to a local HTTPS server with a self-signed
+certificate. The server waits --rtt-ms when a connection is opened, to
+stand in for the TCP and TLS round trips of a real origin. Needs the
+openssl command line tool for the certificate.
+
+    python benchmarks/bench_sessions.py [--jobs 50] [--rtt-ms 30]
+"""
+import os
+import ssl
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from session_pool import SessionPool
+
+def serve(certfile, keyfile, rtt):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+        
+        def setup(self):
+            time.sleep(rtt)  # handshake round trips of a new connection
+            super().setup()
+        
+        def do_GET(self):
+            body = b'{"status": "ok"}'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def make_cert(folder):
+    certfile, keyfile = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+                    '-keyout', keyfile, '-out', certfile], check=True, capture_output=True)
+    return certfile, keyfile
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=50)
+    parser.add_argument('--rtt-ms', type=float, default=30)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as folder:
+        certfile, keyfile = make_cert(folder)
+        server = serve(certfile, keyfile, args.rtt_ms / 1000)
+        urls = [f'https://127.0.0.1:{server.server_port}/{path}' for path in ('page', 'api', 'link')]
+        
+        started = time.perf_counter()
+        for _ in range(args.jobs):
+            for url in urls:
+                requests.get(url, verify=certfile).raise_for_status()
+        fresh = time.perf_counter() - started
+        
+        pool = SessionPool()
+        started = time.perf_counter()
+        for _ in range(args.jobs):
+            with pool.session() as session:
+                for url in urls:
+                    session.get(url, verify=certfile).raise_for_status()
+        pooled = time.perf_counter() - started
+        stats = pool.stats()
+        pool.close()
+        server.shutdown()
+    
+    print(f"requests.get   {fresh / args.jobs * 1000:7.1f} ms/job  ({args.jobs * len(urls)} connections)")
+    print(f"SessionPool    {pooled / args.jobs * 1000:7.1f} ms/job  ({stats['connections']} connections, "
+          f"reuse rate {stats['reuse_rate']})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Worker boot time: how long `import app` takes, measured with -X importtime.
+
+Imports app in a fresh interpreter (in a scratch directory, so the
+downloads/logs/data folders it creates don't land in the repo) a few
+times and reports the median. Exits 1 when the median is over budget or
+when a site backend that should be imported lazily shows up at boot.
+
+    python benchmarks/bench_startup.py [--budget-ms 400] [--runs 5]
+"""
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only imported by the handlers that need them
+LAZY_MODULES = ['yt_dlp', 'instaloader', 'gdown', 'mega', 'internetarchive', 'telethon', 'static_ffmpeg']
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+def measure(workdir):
+    """(total microseconds for `import app`, {top-level module: cumulative us})"""
+    env = dict(os.environ, PYTHONPATH=REPO, DEBUG='true')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"import app failed:\n{result.stderr[-2000:]}")
+    
+    modules = {}
+    total = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)), match.group(4)
+        modules[name.split('.')[0]] = max(modules.get(name.split('.')[0], 0), cumulative)
+        if name == 'app':
+            total = cumulative
+    return total, modules
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 400)))
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [measure(workdir) for _ in range(args.runs)]
+    
+    totals = [total / 1000 for total, _ in runs]
+    median = statistics.median(totals)
+    _, modules = runs[-1]
+    
+    print(f"import app: median {median:.0f} ms over {args.runs} runs (min {min(totals):.0f}, max {max(totals):.0f})")
+    print("heaviest top-level imports:")
+    for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {name:24s} {cumulative / 1000:7.1f} ms")
+    
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        print(f"FAIL: imported at boot, should be lazy: {', '.join(eager)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: boot time {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
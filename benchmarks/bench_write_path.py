@@ -0,0 +1,107 @@
+"""CPU cost per GB of the streamed write path.
+
+Serves --size-mb of data from a child process (so its CPU is not counted)
+and downloads it to a temporary file three ways:
+- iter_content(8192) + write, the loop the handlers used originally;
+- iter_content(64KB), the engine's loop before BodyReader;
+- BodyReader, readinto a reusable buffer whose size grows with throughput.
+Reports wall time and client CPU seconds per GB, and checks the byte count.
+
+    python benchmarks/bench_write_path.py [--size-mb 512] [--runs 3]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from download_engine import BodyReader
+
+def serve(size):
+    """Run in the child: answer every GET with size bytes, print the port, serve until killed"""
+    block = memoryview(os.urandom(1024 * 1024))
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+            remaining = size
+            while remaining:
+                part = block[:min(remaining, len(block))]
+                self.wfile.write(part)
+                remaining -= len(part)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+def iter_content_copy(chunk_size):
+    def copy(response, f):
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                f.write(chunk)
+    return copy
+
+def body_reader_copy(response, f):
+    for chunk in BodyReader(response).chunks():
+        f.write(chunk)
+
+def measure(session, url, copy, path):
+    wall, cpu = time.perf_counter(), time.process_time()
+    response = session.get(url, stream=True)
+    try:
+        with open(path, 'wb') as f:
+            copy(response, f)
+    finally:
+        response.close()
+    return time.perf_counter() - wall, time.process_time() - cpu, os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        return
+    
+    size = args.size_mb * 1024 * 1024
+    server = subprocess.Popen([sys.executable, __file__, '--serve', str(size)], stdout=subprocess.PIPE, text=True)
+    try:
+        url = f'http://127.0.0.1:{server.stdout.readline().strip()}/file'
+        session = requests.Session()
+        variants = [
+            ('iter_content(8KB)', iter_content_copy(8192)),
+            ('iter_content(64KB)', iter_content_copy(64 * 1024)),
+            ('BodyReader', body_reader_copy),
+        ]
+        failed = False
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'out.bin')
+            for name, copy in variants:
+                # Best of N: the first run also warms the page cache
+                runs = [measure(session, url, copy, path) for _ in range(args.runs)]
+                wall, cpu, written = min(runs, key=lambda run: run[1])
+                failed = failed or written != size
+                gb = size / 1024 ** 3
+                print(f"{name:<20} {size / wall / 1024 / 1024:7.0f} MB/s  {cpu / gb:6.2f} CPU s/GB  "
+                      f"bytes {'OK' if written == size else 'MISMATCH'}")
+        session.close()
+    finally:
+        server.kill()
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
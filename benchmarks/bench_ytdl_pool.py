@@ -0,0 +1,87 @@
+"""Per-job yt-dlp setup overhead, fresh YoutubeDL vs. the warm pool.
+
+Runs N metadata-only jobs against a local HTTP server (so the network is
+not what gets measured) two ways: building a new YoutubeDL per job, as the
+handlers used to, and checking one out of YoutubeDLPool.
+
+    python benchmarks/bench_ytdl_pool.py [jobs]
+"""
+import os
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from ytdl_pool import YoutubeDLPool
+
+PAYLOAD = b'\0' * 4096
+
+class VideoHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(PAYLOAD)))
+        self.end_headers()
+    
+    def do_GET(self):
+        self.do_HEAD()
+        self.wfile.write(PAYLOAD)
+    
+    def log_message(self, *args):
+        pass
+
+def job_opts(i):
+    # Same profile every time, only the per-call output template differs
+    return {
+        'format': 'best',
+        'outtmpl': f'/tmp/bench_ytdl_{i}_%(title)s.%(ext)s',
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 10,
+        'retries': 3,
+        'http_headers': {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'},
+    }
+
+def run_fresh(url, jobs):
+    setup = 0.0
+    started = time.perf_counter()
+    for i in range(jobs):
+        t = time.perf_counter()
+        ydl = yt_dlp.YoutubeDL(job_opts(i))
+        setup += time.perf_counter() - t
+        with ydl:
+            ydl.extract_info(url, download=False)
+    return setup, time.perf_counter() - started
+
+def run_pooled(url, jobs):
+    pool = YoutubeDLPool(max_idle=4)
+    setup = 0.0
+    started = time.perf_counter()
+    for i in range(jobs):
+        t = time.perf_counter()
+        with pool.checkout(job_opts(i)) as ydl:
+            setup += time.perf_counter() - t
+            ydl.extract_info(url, download=False)
+    return setup, time.perf_counter() - started
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), VideoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/clip.mp4'
+    
+    # Warm imports and lazy extractor loading so neither side pays for them
+    run_fresh(url, 1)
+    
+    for name, run in (('fresh YoutubeDL', run_fresh), ('pooled', run_pooled)):
+        setup, total = run(url, jobs)
+        print(f"{name:16s} setup {setup / jobs * 1000:7.2f} ms/job   total {total / jobs * 1000:7.2f} ms/job")
+    
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Local stand-in origin for the download benchmarks.
+
+Serves an in-memory {path: bytes} table over HTTP/1.1 keep-alive with
+Range and If-Range support, a fixed delay per request (a CDN round trip),
+an optional per-connection rate limit and injected failures: a share of
+media responses is either a 503 or a body cut off half-way, the two
+things retry code has to survive. Playlists, manifests and API calls are
+never failed.
+
+The builders return the files for one flow together with the bytes a
+correct download must end up with.
+
+    files, expected = build_direct(64 * 1024 * 1024)
+    origin = Origin(files, latency=0.02, rate=20e6, error_rate=0.02).start()
+    url = origin.url('/files/direct.mp4')
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from Crypto.Cipher import AES
+
+KEY = bytes(range(16))
+WRITE_SIZE = 64 * 1024
+
+class Origin:
+    """HTTP server on 127.0.0.1 (a free port) in background threads"""
+    
+    def __init__(self, files, latency=0.0, rate=None, error_rate=0.0, seed=1):
+        self.files = files
+        self.latency = latency
+        self.rate = rate  # bytes/s per connection, None for unthrottled
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.injected = 0
+        self.bytes_sent = 0
+        self.server = None
+    
+    def start(self):
+        origin = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                origin.handle(self, send_body=True)
+            
+            def do_HEAD(self):
+                origin.handle(self, send_body=False)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    @property
+    def port(self):
+        return self.server.server_port
+    
+    def url(self, path, host='127.0.0.1'):
+        return f'http://{host}:{self.port}{path}'
+    
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'injected_errors': self.injected, 'bytes_sent': self.bytes_sent}
+    
+    def handle(self, request, send_body):
+        time.sleep(self.latency)
+        parsed = urlsplit(request.path)
+        with self.lock:
+            self.requests += 1
+        
+        if parsed.path == '/getContent':
+            body = self.gofile_api(parsed)
+        else:
+            body = self.files.get(parsed.path)
+        if body is None:
+            request.send_error(404)
+            return
+        
+        failure = None
+        if self.error_rate and is_media(parsed.path):
+            with self.lock:
+                if self.random.random() < self.error_rate:
+                    failure = self.random.choice(('503', 'truncate'))
+                    self.injected += 1
+        if failure == '503':
+            request.send_response(503)
+            request.send_header('Content-Length', '0')
+            request.send_header('Retry-After', '0')
+            request.end_headers()
+            return
+        
+        etag = '"%s"' % hashlib.md5(parsed.path.encode()).hexdigest()
+        start, end = 0, len(body) - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', request.headers.get('Range', ''))
+        if_range = request.headers.get('If-Range')
+        if match and (if_range is None or if_range == etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            if start > end:
+                request.send_response(416)
+                request.send_header('Content-Range', f'bytes */{len(body)}')
+                request.send_header('Content-Length', '0')
+                request.end_headers()
+                return
+            request.send_response(206)
+            request.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+        else:
+            request.send_response(200)
+        request.send_header('Content-Length', str(end - start + 1))
+        request.send_header('Accept-Ranges', 'bytes')
+        request.send_header('ETag', etag)
+        request.end_headers()
+        if not send_body:
+            return
+        
+        if failure == 'truncate':
+            end = start + (end - start) // 2
+        self.write(request, memoryview(body)[start:end + 1])
+        if failure == 'truncate':
+            request.close_connection = True
+    
+    def write(self, request, data):
+        started = time.perf_counter()
+        sent = 0
+        try:
+            while sent < len(data):
+                chunk = data[sent:sent + WRITE_SIZE]
+                request.wfile.write(chunk)
+                sent += len(chunk)
+                if self.rate:
+                    ahead = sent / self.rate - (time.perf_counter() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            request.close_connection = True
+        with self.lock:
+            self.bytes_sent += sent
+    
+    def gofile_api(self, parsed):
+        """getContent answer for a folder served by build_gofile; links carry the request's other query parameters"""
+        params = dict(parse_qsl(parsed.query))
+        folder = params.pop('contentId', '')
+        listing = self.files.get(f'/folders/{folder}')
+        if listing is None:
+            return json.dumps({'status': 'error-notFound'}).encode()
+        query = ('?' + urlencode(params)) if params else ''
+        base = f'http://127.0.0.1:{self.port}'
+        contents = {f'file{i}': {'name': name, 'link': f'{base}/files/{folder}/{name}{query}'}
+                    for i, name in enumerate(json.loads(listing))}
+        return json.dumps({'status': 'ok', 'data': {'contents': contents}}).encode()
+
+def is_media(path):
+    return not path.endswith(('.m3u8', '.mpd', '/key.bin')) and not path.startswith(('/d/', '/folders/', '/getContent'))
+
+def build_direct(size):
+    data = os.urandom(size)
+    return {'/files/direct.mp4': data}, data
+
+def build_gofile(file_count, size, folder='bench'):
+    """A GoFile-style folder: a share page, the folder listing behind /getContent and the files"""
+    files = {f'/d/{folder}': b'<html><body>GoFile stand-in</body></html>'}
+    names = [f'part{i + 1}.mp4' for i in range(file_count)]
+    files[f'/folders/{folder}'] = json.dumps(names).encode()
+    expected = {}
+    for name in names:
+        data = os.urandom(size)
+        files[f'/files/{folder}/{name}'] = data
+        expected[name] = data
+    return files, expected
+
+def build_hls(segments, segment_size):
+    """Master playlist with 360p/720p variants of AES-128 encrypted segments; expected is the 720p plaintext"""
+    files = {'/hls/key.bin': KEY}
+    plain = {}
+    for height in (360, 720):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0',
+                 '#EXT-X-KEY:METHOD=AES-128,URI="../key.bin"']
+        chunks = []
+        for i in range(segments):
+            data = os.urandom(segment_size)
+            chunks.append(data)
+            padding = 16 - len(data) % 16
+            files[f'/hls/{height}/seg{i}.ts'] = AES.new(KEY, AES.MODE_CBC, i.to_bytes(16, 'big')).encrypt(
+                data + bytes([padding]) * padding)
+            lines += ['#EXTINF:4.0,', f'seg{i}.ts']
+        lines.append('#EXT-X-ENDLIST')
+        files[f'/hls/{height}/index.m3u8'] = '\n'.join(lines).encode()
+        plain[height] = b''.join(chunks)
+    files['/hls/master.m3u8'] = '\n'.join([
+        '#EXTM3U',
+        '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360',
+        '360/index.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720',
+        '720/index.m3u8',
+    ]).encode()
+    return files, plain[720]
+
+def build_dash(segments, segment_size):
+    """MPD with 360p/720p video and one audio representation (SegmentTemplate); expected is 720p then audio"""
+    files = {}
+    tracks = {}
+    for rep_id in ('v360', 'v720', 'a128'):
+        size = segment_size if rep_id.startswith('v') else segment_size // 4
+        init = os.urandom(512)
+        chunks = [os.urandom(size) for _ in range(segments)]
+        files[f'/dash/{rep_id}/init.mp4'] = init
+        for number, chunk in enumerate(chunks, start=1):
+            files[f'/dash/{rep_id}/{number:05d}.m4s'] = chunk
+        tracks[rep_id] = init + b''.join(chunks)
+    
+    template = ('<SegmentTemplate timescale="1" duration="4" startNumber="1" '
+                'initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/$Number%05d$.m4s"/>')
+    files['/dash/manifest.mpd'] = f'''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{segments * 4}S">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" contentType="video">
+      {template}
+      <Representation id="v360" bandwidth="800000" width="640" height="360"/>
+      <Representation id="v720" bandwidth="2500000" width="1280" height="720"/>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4" contentType="audio">
+      {template}
+      <Representation id="a128" bandwidth="128000"/>
+    </AdaptationSet>
+  </Period>
+</MPD>'''.encode()
+    return files, tracks['v720'] + tracks['a128']
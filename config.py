@@ -7,14 +7,102 @@ DOWNLOAD_TIMEOUT = 300  # 5 minutes
 MAX_RETRIES = 3
 CLEANUP_AGE_HOURS = 24  # Delete files older than 24 hours
 
+# Download cache - finished files are reused for repeat requests and
+# evicted least-recently-used first once downloads/ grows past this
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 10 * 1024 * 1024 * 1024))  # 10GB
+
+# Janitor - background expiry of uploads, partial downloads and job workspaces,
+# and download cache eviction (janitor.py)
+UPLOAD_MAX_AGE = 3600  # Uploads are only tool inputs - 1 hour
+CACHE_LOW_WATER = 0.9  # Evict down to this fraction of CACHE_MAX_BYTES
+DISK_HIGH_WATER = float(os.environ.get('DISK_HIGH_WATER', 0.90))  # Start evicting when the disk is this full
+DISK_LOW_WATER = float(os.environ.get('DISK_LOW_WATER', 0.85))  # ...and stop once it is down to this
+JANITOR_RESCAN_INTERVAL = 5 * 60  # Re-measure the folders from disk: other workers write and evict too
+
+# Segmented downloads (download_direct, GoFile)
+DOWNLOAD_SEGMENTS = 4  # Parallel range connections per file
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024  # Don't split files into parts smaller than 4MB
+HLS_SEGMENT_WORKERS = 8  # Parallel segment fetches per HLS download
+READ_SIZE_MAX = 4 * 1024 * 1024  # Socket reads grow from 64KB up to this on fast links
+PREALLOCATE_DOWNLOADS = True  # posix_fallocate ranged downloads up front, so a full disk fails at the start
+FSYNC_DOWNLOADS = os.environ.get('FSYNC_DOWNLOADS', 'False').lower() == 'true'  # fsync each file once before it is renamed into place
+
+# Keep-alive HTTP sessions shared by the direct/GoFile/HLS/DASH handlers, one per proxy
+HTTP_MAX_SESSIONS = 16  # Least recently used idle session is closed beyond this
+HTTP_POOL_HOSTS = 32  # Hosts per session with a connection pool kept open
+HTTP_POOL_PER_HOST = 16  # Connections per host; further requests wait for a free one
+HTTP_SESSION_IDLE_TIMEOUT = 300  # seconds
+
+# Warm yt-dlp instances, reused by jobs with identical options
+YTDL_POOL_SIZE = 8  # Idle YoutubeDL objects kept per worker
+YTDL_POOL_IDLE_TIMEOUT = 600  # seconds
+
+# Download scheduler
+MAX_CONCURRENT_DOWNLOADS = 4  # Worker threads running download jobs
+MAX_QUEUED_DOWNLOADS = 50  # Beyond this /download answers 503 + Retry-After
+QUEUE_RETRY_AFTER = 30  # seconds, used until real job durations are known
+
+# Host suffix -> concurrency pool; each pool has its own cap so one slow
+# host can't occupy every worker
+DOMAIN_POOLS = {
+    'youtube.com': 'googlevideo',
+    'youtu.be': 'googlevideo',
+    'googlevideo.com': 'googlevideo',
+    'mega.nz': 'mega',
+    'mega.io': 'mega',
+    'drive.google.com': 'gdrive',
+    'archive.org': 'archive',
+}
+DOMAIN_CONCURRENCY = {
+    'googlevideo': 2,
+    'mega': 1,
+    'gdrive': 1,
+    'archive': 1,
+}
+BULK_POOLS = {'mega', 'gdrive', 'archive'}  # Queued behind regular videos
+
+# Job store - download status shared by every gunicorn worker
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', 'data/jobs.db')
+JOB_TTL = 3600  # Keep finished jobs for 1 hour
+JOB_STALE_SECONDS = 6 * 3600  # Active jobs with no update for this long are failed
+
+# Progress push (Server-Sent Events on /events/<id>)
+# An open stream holds one of the worker's gthread threads until it ends, so
+# long-lived streams (/events and /stream together) only get a quarter of them: the
+# rest must stay free for /status, /download, /file and /health or the site hangs
+# instead of answering 503
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 8))  # gunicorn --threads (render.yaml)
+MAX_LONG_REQUESTS = max(1, WORKER_THREADS // 4)  # Per worker, shared by /events and /stream
+EVENT_STREAM_TIMEOUT = 600  # seconds before a stream closes and the client reconnects
+
+# Streaming a download while it is still running (/stream/<id>)
+STREAM_START_TIMEOUT = 30  # seconds to wait for a queued job to start writing
+
+# Batch downloads (/batch: a list of URLs or a playlist/channel)
+BATCH_CONCURRENCY = 3  # Items of one batch downloading at once; the rest wait their turn
+BATCH_MAX_ITEMS = 500  # Entries taken from a batch, the rest of a playlist is ignored
+MAX_ACTIVE_BATCHES = 4  # Per worker, each one holds a thread while it feeds its items
+
 # Rate limiting
 MAX_REQUESTS_PER_MINUTE = 10
 RATE_LIMIT_WINDOW = 60  # seconds
 
 # Proxy settings
+PROXY_FILE = 'proxies.txt'
+PROXY_RELOAD_INTERVAL = 5  # seconds between checks for a rewritten PROXY_FILE
 PROXY_UPDATE_INTERVAL = 6  # hours
-MAX_PROXY_TEST = 100
+MAX_PROXY_TEST = 50000  # Scraped candidates validated per refresh
 PROXY_TIMEOUT = 3  # seconds
+PROXY_TEST_URL = os.environ.get('PROXY_TEST_URL', 'http://httpbin.org/get')  # Must echo the request (for anonymity)
+PROXY_TEST_CONCURRENCY = 500  # Open test connections at once; keep below the open-file limit
+PROXY_DB_PATH = os.environ.get('PROXY_DB_PATH', 'data/proxies.db')  # What every refresh has learned
+PROXY_STALE_AFTER = 12 * 3600  # Working proxies are retested once their last check is this old
+PROXY_DEAD_STREAK = 3  # Failed checks in a row before a candidate counts as dead
+PROXY_DEAD_RETRY = 24 * 3600  # Dead candidates are retested this rarely
+PROXY_FORGET_AFTER = 3 * 24 * 3600  # Dead candidates no source has listed for this long are deleted
+PROXY_FAILURE_THRESHOLD = 3  # Failures in a row before a proxy is benched
+PROXY_COOLDOWN = 300  # seconds on the bench before a probe may bring it back
+PROXY_PROBE_URL = os.environ.get('PROXY_PROBE_URL', 'http://www.google.com')
 
 # Server settings
 HOST = '0.0.0.0'
@@ -23,6 +111,7 @@ DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
 THREADED = True
 
 # Security
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # /admin/* endpoints are disabled unless this is set
 MAX_URL_LENGTH = 2048
 ALLOWED_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm', 
                       '.pdf', '.zip', '.rar', '.jpg', '.png', '.jpeg', '.gif'}
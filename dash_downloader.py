@@ -0,0 +1,206 @@
+import re
+import math
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin
+from hls_downloader import HlsDownloader, HlsUnsupported, MediaPlaylist, Segment, pick_variant
+
+# SegmentBase representations are one big file; it is fetched in ranges of this size
+SEGMENT_BASE_CHUNK = 4 * 1024 * 1024
+
+TEMPLATE_IDENTIFIER = re.compile(r'\$(RepresentationID|Number|Bandwidth|Time)(?:%0(\d+)d)?\$')
+
+class DashUnsupported(HlsUnsupported):
+    """MPD uses something the native engine doesn't handle (live, multi-period, DRM, ...)"""
+
+def parse_duration(value):
+    """Seconds in an ISO 8601 duration such as PT1H2M3.5S"""
+    match = re.match(r'P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?$', value or '')
+    if not match:
+        return None
+    years, months, days, hours, minutes, seconds = match.groups()
+    return ((int(years or 0) * 365 + int(months or 0) * 30 + int(days or 0)) * 86400
+            + int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds or 0))
+
+def strip_namespaces(root):
+    for element in root.iter():
+        if '}' in element.tag:
+            element.tag = element.tag.split('}', 1)[1]
+    return root
+
+def fill_template(template, representation_id, bandwidth, number=None, time=None):
+    def replace(match):
+        value = {'RepresentationID': representation_id, 'Bandwidth': bandwidth,
+                 'Number': number, 'Time': time}[match.group(1)]
+        if match.group(2):
+            return str(value).zfill(int(match.group(2)))
+        return str(value)
+    return TEMPLATE_IDENTIFIER.sub(replace, template).replace('$$', '$')
+
+def base_url(element, parent_url):
+    node = element.find('BaseURL')
+    if node is not None and node.text:
+        return urljoin(parent_url, node.text.strip())
+    return parent_url
+
+def parse_range(value):
+    start, _, end = value.partition('-')
+    return int(start), int(end)
+
+def parse_mpd(text, url):
+    """Video and audio representations of a static single-period MPD, as dicts for resolve()"""
+    try:
+        root = strip_namespaces(ET.fromstring(text))
+    except ET.ParseError as e:
+        raise DashUnsupported(f"invalid MPD: {e}")
+    if root.get('type') == 'dynamic':
+        raise DashUnsupported("live MPD")
+    periods = root.findall('Period')
+    if len(periods) != 1:
+        raise DashUnsupported(f"{len(periods)} periods")
+    period = periods[0]
+    duration = parse_duration(period.get('duration')) or parse_duration(root.get('mediaPresentationDuration'))
+    period_url = base_url(period, base_url(root, url))
+    
+    representations = {'video': [], 'audio': []}
+    for adaptation in period.findall('AdaptationSet'):
+        if adaptation.find('ContentProtection') is not None:
+            raise DashUnsupported("DRM protected")
+        adaptation_url = base_url(adaptation, period_url)
+        for rep in adaptation.findall('Representation'):
+            mime = rep.get('mimeType') or adaptation.get('mimeType') or ''
+            kind = adaptation.get('contentType') or mime.split('/')[0]
+            if kind not in representations:
+                continue
+            representations[kind].append({
+                'id': rep.get('id'),
+                'bandwidth': int(rep.get('bandwidth') or 0),
+                'height': int(rep.get('height') or adaptation.get('height') or 0) or None,
+                'url': base_url(rep, adaptation_url),
+                # Segment info is inherited from the adaptation set unless the representation overrides it
+                'template': merged(adaptation.find('SegmentTemplate'), rep.find('SegmentTemplate')),
+                'list': rep.find('SegmentList') if rep.find('SegmentList') is not None else adaptation.find('SegmentList'),
+                'base': rep.find('SegmentBase') if rep.find('SegmentBase') is not None else adaptation.find('SegmentBase'),
+                'duration': duration,
+            })
+    return representations['video'], representations['audio']
+
+def merged(outer, inner):
+    """SegmentTemplate with inner's attributes/children taking precedence over outer's"""
+    if outer is None or inner is None:
+        return inner if inner is not None else outer
+    template = ET.Element('SegmentTemplate', dict(outer.attrib, **inner.attrib))
+    timeline = inner.find('SegmentTimeline')
+    if timeline is None:
+        timeline = outer.find('SegmentTimeline')
+    if timeline is not None:
+        template.append(timeline)
+    return template
+
+def template_segments(rep):
+    """(init Segment, [Segment]) for a SegmentTemplate representation"""
+    template = rep['template']
+    media = template.get('media')
+    if not media:
+        raise DashUnsupported("SegmentTemplate without media")
+    timescale = int(template.get('timescale') or 1)
+    number = int(template.get('startNumber') or 1)
+    fill = lambda **kw: urljoin(rep['url'], fill_template(media, rep['id'], rep['bandwidth'], **kw))
+    
+    init = None
+    if template.get('initialization'):
+        init = Segment(urljoin(rep['url'], fill_template(template.get('initialization'), rep['id'], rep['bandwidth'])), -1)
+    
+    segments = []
+    timeline = template.find('SegmentTimeline')
+    if timeline is not None:
+        time = 0
+        entries = timeline.findall('S')
+        for i, entry in enumerate(entries):
+            time = int(entry.get('t') or time)
+            length = int(entry.get('d'))
+            repeat = int(entry.get('r') or 0)
+            if repeat < 0:
+                # Repeat until the next S (or the end of the period)
+                if i + 1 < len(entries) and entries[i + 1].get('t'):
+                    end = int(entries[i + 1].get('t'))
+                elif rep['duration']:
+                    end = rep['duration'] * timescale
+                else:
+                    raise DashUnsupported("open-ended SegmentTimeline")
+                repeat = math.ceil((end - time) / length) - 1
+            for _ in range(repeat + 1):
+                segments.append(Segment(fill(number=number, time=time), number))
+                time += length
+                number += 1
+    else:
+        segment_duration = int(template.get('duration') or 0)
+        if not segment_duration or not rep['duration']:
+            raise DashUnsupported("SegmentTemplate without duration")
+        count = math.ceil(rep['duration'] * timescale / segment_duration)
+        for i in range(count):
+            segments.append(Segment(fill(number=number + i, time=i * segment_duration), number + i))
+    return init, segments
+
+def list_segments(rep):
+    """(init Segment, [Segment]) for a SegmentList representation"""
+    segment_list = rep['list']
+    init = None
+    initialization = segment_list.find('Initialization')
+    if initialization is not None:
+        init_range = parse_range(initialization.get('range')) if initialization.get('range') else None
+        init = Segment(urljoin(rep['url'], initialization.get('sourceURL') or ''), -1, byte_range=init_range)
+    
+    segments = []
+    for number, entry in enumerate(segment_list.findall('SegmentURL')):
+        media_range = parse_range(entry.get('mediaRange')) if entry.get('mediaRange') else None
+        segments.append(Segment(urljoin(rep['url'], entry.get('media') or ''), number, byte_range=media_range))
+    return init, segments
+
+class DashDownloader(HlsDownloader):
+    """Native DASH downloader: the HLS engine's parallel segment pipeline fed from an MPD.
+    
+    Picks the tallest video representation within the requested quality
+    and the best audio one, then fetches both at once through one bounded
+    worker pool and muxes them with a single ffmpeg -c copy run.
+    """
+    
+    folder_prefix = 'dash'
+    
+    def resolve(self, session, url, quality='best', headers=None, proxies=None):
+        """[video MediaPlaylist, audio MediaPlaylist] (just one if the MPD has no separate audio)"""
+        text = self.fetch(session, url, headers, proxies).decode('utf-8', 'replace')
+        videos, audios = parse_mpd(text, url)
+        chosen = []
+        if videos:
+            chosen.append(pick_variant(videos, quality))
+        if audios:
+            chosen.append(max(audios, key=lambda rep: rep['bandwidth']))
+        if not chosen:
+            raise DashUnsupported("no audio or video representations")
+        return [self.playlist_for(session, rep, headers, proxies) for rep in chosen]
+    
+    def playlist_for(self, session, rep, headers, proxies):
+        if rep['template'] is not None:
+            init, segments = template_segments(rep)
+        elif rep['list'] is not None:
+            init, segments = list_segments(rep)
+        else:
+            init, segments = self.base_segments(session, rep, headers, proxies)
+        return MediaPlaylist(rep['url'], segments, init)
+    
+    def base_segments(self, session, rep, headers, proxies):
+        """A SegmentBase (or bare BaseURL) representation is a single file - split it into byte ranges"""
+        size = self.content_length(session, rep['url'], headers, proxies)
+        if not size:
+            return None, [Segment(rep['url'], 0)]
+        return None, [Segment(rep['url'], i, byte_range=(start, min(start + SEGMENT_BASE_CHUNK, size) - 1))
+                      for i, start in enumerate(range(0, size, SEGMENT_BASE_CHUNK))]
+    
+    def content_length(self, session, url, headers, proxies):
+        probe_headers = dict(headers or {}, Range='bytes=0-0')
+        response = session.get(url, headers=probe_headers, proxies=proxies, stream=True, timeout=self.timeout)
+        try:
+            match = re.match(r'bytes\s+0-0/(\d+)', response.headers.get('Content-Range', ''))
+            return int(match.group(1)) if response.status_code == 206 and match else None
+        finally:
+            response.close()
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+import config
+
+# Query parameters that never change what gets downloaded
+TRACKING_PARAMS = {'fbclid', 'gclid', 'igshid', 'si', 'feature', 'ref', 'ref_src', 'pp'}
+
+# Names of files that are still being written by yt-dlp/ffmpeg
+IN_PROGRESS_SUFFIXES = ('.part', '.ytdl', '.ffmpeg', '.tmp')
+
+def normalize_url(url):
+    """Canonical form of a URL for cache lookups"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if parsed.port and not ((scheme == 'http' and parsed.port == 80) or (scheme == 'https' and parsed.port == 443)):
+        host = f'{host}:{parsed.port}'
+    
+    path = parsed.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    
+    params = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+              if k not in TRACKING_PARAMS and not k.startswith('utm_')]
+    
+    # youtu.be/<id> and youtube.com/watch?v=<id> are the same video
+    if host == 'youtu.be' and len(path) > 1:
+        params.append(('v', path[1:]))
+        host, path = 'youtube.com', '/watch'
+    
+    return urlunparse((scheme, host, path, '', urlencode(sorted(params)), ''))
+
+class DownloadCache:
+    """Maps (URL, quality, audio_only) to a finished file in the download folder.
+    
+    The cache only keeps the index; the janitor (janitor.py) deletes files
+    least-recently-used first once the folder grows past max_bytes and
+    tells the cache through forget().
+    """
+    
+    def __init__(self, download_folder, max_bytes=None):
+        self.download_folder = download_folder
+        self.max_bytes = max_bytes or config.CACHE_MAX_BYTES
+        self.index_path = os.path.join(download_folder, '.cache_index.json')
+        self.entries = {}  # key -> {'file', 'size', 'last_access'}
+        self.index_mtime = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.load()
+    
+    def make_key(self, url, quality, audio_only):
+        raw = f"{normalize_url(url)}|{quality}|{bool(audio_only)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def load(self):
+        """(Re)read the index if another worker has rewritten it"""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime == self.index_mtime:
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self.lock:
+            for key, entry in entries.items():
+                current = self.entries.get(key)
+                if not current or current['last_access'] < entry['last_access']:
+                    self.entries[key] = entry
+            self.index_mtime = mtime
+    
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.entries)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_path)
+            self.index_mtime = os.path.getmtime(self.index_path)
+        except OSError as e:
+            print(f"Error saving cache index: {e}")
+    
+    def lookup(self, url, quality='best', audio_only=False):
+        """Return the cached filename for this request, or None"""
+        key = self.make_key(url, quality, audio_only)
+        self.load()
+        
+        with self.lock:
+            entry = self.entries.get(key)
+            filepath = os.path.join(self.download_folder, entry['file']) if entry else None
+            if entry and os.path.isfile(filepath) and os.path.getsize(filepath) == entry['size']:
+                entry['last_access'] = time.time()
+                self.hits += 1
+                filename = entry['file']
+            else:
+                if entry:
+                    # File was removed or replaced behind our back
+                    self.entries.pop(key, None)
+                self.misses += 1
+                filename = None
+        
+        if filename:
+            self.save()
+        return filename
+    
+    def store(self, url, quality, audio_only, filename):
+        """Remember a finished download"""
+        filepath = os.path.join(self.download_folder, filename)
+        if not os.path.isfile(filepath):
+            return
+        
+        key = self.make_key(url, quality, audio_only)
+        with self.lock:
+            self.entries[key] = {
+                'file': filename,
+                'size': os.path.getsize(filepath),
+                'last_access': time.time()
+            }
+        self.save()
+    
+    def access_times(self):
+        """{filename: last access} over every entry, for the janitor's eviction order"""
+        self.load()
+        with self.lock:
+            last_access = {}
+            for entry in self.entries.values():
+                last_access[entry['file']] = max(entry['last_access'], last_access.get(entry['file'], 0))
+        return last_access
+    
+    def forget(self, filenames):
+        """Drop the entries of files the janitor evicted"""
+        filenames = set(filenames)
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if e['file'] in filenames]:
+                del self.entries[key]
+            self.evictions += len(filenames)
+        self.save()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,643 @@
+import os
+import re
+import json
+import time
+import uuid
+import errno
+import socket
+import hashlib
+import threading
+import http.client
+import requests
+import config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: partials are only guarded between threads of one process
+
+class ResumeState:
+    """On-disk record of which byte ranges of a .part file are already written.
+    
+    Stored as a small JSON sidecar next to the .part file so that a retried
+    job, or the same URL submitted again after a restart, can pick up where
+    the last attempt stopped.
+    """
+    
+    def __init__(self, manifest_path, url, size, etag=None, last_modified=None, completed=None):
+        self.manifest_path = manifest_path
+        self.url = url
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.completed = merge_ranges(completed or [])
+        self.active = {}  # segment start -> bytes written so far
+        self.progress = None
+        self.lock = threading.Lock()
+        self.last_saved = 0
+    
+    @classmethod
+    def load(cls, manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                data = json.load(f)
+            return cls(manifest_path, data['url'], data['size'], data.get('etag'),
+                       data.get('last_modified'), [tuple(r) for r in data.get('completed', [])])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def matches(self, url, size, etag, last_modified):
+        """True if the remote file is still the one this state was recorded for"""
+        if self.url != url or self.size != size:
+            return False
+        if etag and self.etag:
+            return etag == self.etag
+        if last_modified and self.last_modified:
+            return last_modified == self.last_modified
+        # No validator to compare against - can't prove the partial data is still good
+        return False
+    
+    def validator(self):
+        """Value for If-Range, so a changed file comes back as a full 200 instead of a bad splice"""
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+    
+    def advance(self, start, written):
+        with self.lock:
+            self.active[start] = written
+        if time.time() - self.last_saved >= 1:
+            self.save()
+    
+    def finish_segment(self, start, end):
+        with self.lock:
+            self.active.pop(start, None)
+            self.completed = merge_ranges(self.completed + [(start, end)])
+    
+    def missing_ranges(self):
+        """Byte ranges (inclusive) that still have to be fetched"""
+        missing = []
+        position = 0
+        for start, end in self.completed:
+            if start > position:
+                missing.append((position, start - 1))
+            position = max(position, end + 1)
+        if position < self.size:
+            missing.append((position, self.size - 1))
+        return missing
+    
+    def bytes_done(self):
+        return sum(end - start + 1 for start, end in self.completed)
+    
+    def downloaded(self):
+        """Finished ranges plus what the running segments have written so far"""
+        with self.lock:
+            return self.bytes_done() + sum(self.active.values())
+    
+    def save(self):
+        with self.lock:
+            ranges = list(self.completed)
+            ranges += [(start, start + written - 1) for start, written in self.active.items() if written]
+            data = {
+                'url': self.url,
+                'size': self.size,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'completed': merge_ranges(ranges),
+                'updated': time.time(),
+            }
+            self.last_saved = time.time()
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.manifest_path)
+
+class ProgressReporter:
+    """Turns raw byte counters into throttled progress updates for a job.
+    
+    callback receives a dict with progress (percent), downloaded_bytes,
+    total_bytes, speed (bytes/s) and eta (seconds). Safe to call from
+    several segment threads at once.
+    """
+    
+    def __init__(self, callback, interval=0.5):
+        self.callback = callback
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last_report = 0
+        self.last_bytes = 0
+        self.last_time = time.time()
+        self.speed = None
+    
+    def update(self, downloaded, total=None, speed=None, eta=None):
+        now = time.time()
+        with self.lock:
+            if now - self.last_report < self.interval and not (total and downloaded >= total):
+                return
+            if speed is None:
+                elapsed = now - self.last_time
+                # The first update may include bytes resumed from disk - not a speed sample
+                if self.last_report and elapsed > 0 and downloaded >= self.last_bytes:
+                    current = (downloaded - self.last_bytes) / elapsed
+                    self.speed = current if self.speed is None else 0.7 * self.speed + 0.3 * current
+                speed = self.speed
+            if eta is None and speed and total:
+                eta = max(0, (total - downloaded) / speed)
+            self.last_report = self.last_time = now
+            self.last_bytes = downloaded
+        
+        self.callback({
+            'stage': 'downloading',
+            'progress': min(100, int(downloaded * 100 / total)) if total else None,
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'speed': int(speed) if speed else None,
+            'eta': int(eta) if eta is not None else None,
+        })
+    
+    def stage(self, name):
+        """Report a step without byte counts, e.g. 'processing' while ffmpeg merges"""
+        with self.lock:
+            self.last_report = time.time()
+        self.callback({'stage': name, 'speed': None, 'eta': None})
+    
+    def partial(self, part_path, filename, total=None):
+        """Announce the .part file being written, so readers can tail it before the job finishes"""
+        self.callback({'partial_file': part_path, 'partial_name': filename, 'total_bytes': total})
+
+def fetch_with_retry(session, url, headers=None, proxies=None, timeout=None, max_retries=None, byte_range=None):
+    """GET a small resource (playlist, segment, key) into memory, retrying dropped or failed requests.
+    
+    byte_range is an optional inclusive (start, end) tuple. 4xx answers
+    other than 408/429 are not retried.
+    """
+    headers = dict(headers or {})
+    if byte_range:
+        headers['Range'] = f'bytes={byte_range[0]}-{byte_range[1]}'
+    timeout = timeout or config.DOWNLOAD_TIMEOUT
+    max_retries = config.MAX_RETRIES if max_retries is None else max_retries
+    
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(url, headers=headers, proxies=proxies, timeout=timeout)
+            if response.status_code < 400:
+                if byte_range and response.status_code == 200:
+                    # Range ignored - cut the slice out of the full body
+                    return response.content[byte_range[0]:byte_range[1] + 1]
+                return response.content
+            if not is_retryable_status(response.status_code):
+                response.raise_for_status()
+            error = requests.exceptions.HTTPError(f"{response.status_code} for {url[:100]}", response=response)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+        if attempt == max_retries:
+            raise error
+        time.sleep(min(2 ** attempt, 8))
+
+class BodyReader:
+    """Reads a streamed response body into one reusable buffer.
+    
+    Plain bodies go straight from the socket into the buffer with readinto,
+    so there is no per-chunk bytes object; content-encoded ones fall back to
+    requests' decoder. The read size starts at min_size and doubles while a
+    read fills in under half of target_seconds (halving when one takes over
+    twice as long), up to max_size: a fast link makes a few large reads, a
+    slow one still returns often enough for progress and stop checks.
+    """
+    
+    def __init__(self, response, min_size=64 * 1024, max_size=None, target_seconds=0.25):
+        self.response = response
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size or config.READ_SIZE_MAX)
+        self.target_seconds = target_seconds
+        self.size = min_size
+        self.buffer = bytearray(min_size)
+    
+    def plain_stream(self):
+        """The http.client response under urllib3, if the body can be read from it as-is"""
+        encoding = self.response.headers.get('Content-Encoding', 'identity').strip().lower()
+        stream = getattr(self.response.raw, '_fp', None)
+        if encoding not in ('', 'identity') or not hasattr(stream, 'readinto'):
+            return None
+        return stream
+    
+    def chunks(self):
+        """Yield the body piece by piece; a memoryview is only valid until the next one is requested"""
+        stream = self.plain_stream()
+        if stream is None:
+            yield from self.response.iter_content(chunk_size=self.size)
+            return
+        
+        while True:
+            view = memoryview(self.buffer)[:self.size]
+            started = time.perf_counter()
+            try:
+                count = stream.readinto(view)
+            except socket.timeout as e:
+                raise requests.exceptions.ReadTimeout(e)
+            except (OSError, http.client.HTTPException) as e:
+                raise requests.exceptions.ConnectionError(e)
+            if not count:
+                if stream.length:
+                    # http.client's readinto reports a dropped connection as a plain end of body
+                    raise requests.exceptions.ConnectionError(f"connection closed with {stream.length} bytes of the body left")
+                # Body fully read: hand the connection back for keep-alive
+                self.response.raw.release_conn()
+                return
+            elapsed = time.perf_counter() - started
+            yield view[:count]
+            if count == self.size:
+                self.adapt(elapsed)
+    
+    def adapt(self, elapsed):
+        if elapsed < self.target_seconds / 2 and self.size < self.max_size:
+            self.size = min(self.size * 2, self.max_size)
+            if len(self.buffer) < self.size:
+                self.buffer = bytearray(self.size)
+        elif elapsed > self.target_seconds * 2 and self.size > self.min_size:
+            self.size = max(self.size // 2, self.min_size)
+
+def preallocate(f, size):
+    """Size f to size bytes, reserving the blocks up front where the filesystem supports it"""
+    f.truncate(size)
+    if not config.PREALLOCATE_DOWNLOADS or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        # ENOSPC is a real answer (fail now rather than gigabytes later); anything else just means "not supported here"
+        if e.errno == errno.ENOSPC:
+            raise
+        print(f"posix_fallocate not available here ({e}), keeping a sparse file")
+
+def sync_file(path):
+    """fsync path once, before it is renamed into place (only when FSYNC_DOWNLOADS is on)"""
+    if not config.FSYNC_DOWNLOADS:
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def merge_ranges(ranges):
+    """Sort and merge overlapping/adjacent inclusive (start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+class SegmentedDownloader:
+    """Download a URL over several parallel byte-range connections"""
+    
+    def __init__(self, partial_folder, segments=None, min_segment_size=None, timeout=None,
+                 max_retries=None, chunk_size=64 * 1024):
+        # chunk_size is the first read size; BodyReader grows it on fast links
+        self.partial_folder = partial_folder
+        self.segments = segments or config.DOWNLOAD_SEGMENTS
+        self.min_segment_size = min_segment_size or config.MIN_SEGMENT_SIZE
+        self.timeout = timeout or config.DOWNLOAD_TIMEOUT
+        self.max_retries = config.MAX_RETRIES if max_retries is None else max_retries
+        self.chunk_size = chunk_size
+        self.claimed = set()  # partial keys held by downloads in this process
+        self.claimed_lock = threading.Lock()
+        os.makedirs(self.partial_folder, exist_ok=True)
+    
+    def partial_key(self, url):
+        return hashlib.sha1(url.encode()).hexdigest()
+    
+    def partial_paths(self, url, private=False):
+        """(.part path, manifest path) for url - stable across restarts, or unique to one download if private"""
+        key = self.partial_key(url)
+        if private:
+            key += '-' + uuid.uuid4().hex[:12]
+        base = os.path.join(self.partial_folder, key)
+        return base + '.part', base + '.part.json'
+    
+    def claim_partial(self, url):
+        """Take the shared partial of url for this download; returns a claim for release_partial, or None if it is in use.
+        
+        Held by a set within this process and by a flock on a .lock file
+        against other workers; the flock goes away with a killed process.
+        """
+        key = self.partial_key(url)
+        with self.claimed_lock:
+            if key in self.claimed:
+                return None
+            self.claimed.add(key)
+        fd = None
+        if fcntl:
+            try:
+                fd = os.open(os.path.join(self.partial_folder, key + '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if fd is not None:
+                    os.close(fd)
+                with self.claimed_lock:
+                    self.claimed.discard(key)
+                return None
+        return key, fd
+    
+    def release_partial(self, claim):
+        key, fd = claim
+        if fd is not None:
+            os.close(fd)  # drops the flock
+        with self.claimed_lock:
+            self.claimed.discard(key)
+    
+    def probe(self, session, url, headers, proxies):
+        """Ask for the first byte to learn the size and whether ranges work.
+        
+        Returns (total_size, response). total_size is None when ranges
+        can't be used (the server ignored the Range header, or answered
+        without a usable total such as bytes 0-0/*); the response is then a
+        normal 200 stream of the whole file that the caller can read from
+        directly. An empty file (416 with bytes */0) is (0, None).
+        """
+        probe_headers = dict(headers)
+        probe_headers['Range'] = 'bytes=0-0'
+        response = self.open_stream(session, url, probe_headers, proxies)
+        content_range = response.headers.get('Content-Range', '').strip()
+        if response.status_code == 416 and re.match(r'bytes\s+\*/0$', content_range):
+            response.close()
+            return 0, None
+        response.raise_for_status()
+        
+        if response.status_code == 206:
+            match = re.match(r'bytes\s+0-0/(\d+)$', content_range)
+            if match:
+                return int(match.group(1)), response
+            # A partial answer with no known total: its one-byte body is not the file, ask for all of it
+            response.close()
+            response = self.open_stream(session, url, headers, proxies)
+            response.raise_for_status()
+        
+        return None, response
+    
+    def open_stream(self, session, url, headers, proxies):
+        """Streamed GET, retried like fetch_with_retry; other 4xx answers are returned for the caller to judge"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = session.get(url, headers=headers, proxies=proxies, stream=True, timeout=self.timeout)
+                if not is_retryable_status(response.status_code):
+                    return response
+                response.close()
+                error = requests.exceptions.HTTPError(f"{response.status_code} for {url[:100]}", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            time.sleep(min(2 ** attempt, 8))
+    
+    def plan_segments(self, missing):
+        """Split the missing (start, end) ranges into at most self.segments parts"""
+        total = sum(end - start + 1 for start, end in missing)
+        count = max(1, min(self.segments, total // self.min_segment_size))
+        target = max(1, -(-total // count))
+        ranges = []
+        for start, end in missing:
+            while start <= end:
+                stop = min(end, start + target - 1)
+                # Don't leave a tiny tail segment behind
+                if end - stop < self.min_segment_size // 2:
+                    stop = end
+                ranges.append((start, stop))
+                start = stop + 1
+        return ranges
+    
+    def download(self, url, filepath, headers=None, proxies=None, progress=None, session=None):
+        """Download url to filepath, in parallel when the server supports ranges.
+        
+        Data goes to a .part file first. If the download fails, the .part file
+        and its manifest stay behind and the next call for the same URL only
+        fetches what is still missing. progress is an optional ProgressReporter.
+        session is a shared requests.Session to use (and leave open); without
+        one a private session is opened for this download.
+        """
+        headers = dict(headers or {})
+        claim = self.claim_partial(url)
+        # Another job is fetching the same URL into the shared partial right now: this one
+        # can't resume from it or write into it, so it works on a private pair of files
+        part_path, manifest_path = self.partial_paths(url, private=claim is None)
+        finished = False
+        own_session = session is None
+        if own_session:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.segments)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        
+        try:
+            total_size, response = self.probe(session, url, headers, proxies)
+            
+            if total_size == 0:
+                self.discard_partial(part_path, manifest_path)
+                open(filepath, 'wb').close()
+                finished = True
+                return filepath
+            
+            if total_size is None:
+                # Server ignored Range - nothing can be resumed, stream the probe response as-is
+                self.discard_partial(part_path, manifest_path)
+                open(part_path, 'wb').close()
+                if progress:
+                    progress.partial(part_path, os.path.basename(filepath),
+                                     int(response.headers.get('Content-Length') or 0) or None)
+                self.stream_to_file(response, part_path, progress)
+                sync_file(part_path)
+                os.replace(part_path, filepath)
+                finished = True
+                return filepath
+            
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            response.close()
+            
+            state = ResumeState.load(manifest_path)
+            if state and state.matches(url, total_size, etag, last_modified) and os.path.exists(part_path):
+                print(f"Resuming {url[:80]} ({state.bytes_done()}/{total_size} bytes already on disk)")
+            else:
+                state = ResumeState(manifest_path, url, total_size, etag, last_modified)
+                # Manifest first: a reader tailing the file must never see the
+                # preallocated zeros without a manifest saying they aren't data yet
+                state.save()
+                # Preallocate so every segment can write at its own offset
+                with open(part_path, 'wb') as f:
+                    preallocate(f, total_size)
+            
+            state.progress = progress
+            if progress:
+                progress.partial(part_path, os.path.basename(filepath), total_size)
+            missing = state.missing_ranges()
+            if missing:
+                ranges = self.plan_segments(missing)
+                if len(ranges) == 1:
+                    self.fetch_range(session, url, headers, proxies, part_path, ranges[0], state, threading.Event())
+                else:
+                    self.fetch_parallel(session, url, headers, proxies, part_path, ranges, state)
+            if progress:
+                progress.update(total_size, total_size)
+            
+            sync_file(part_path)
+            os.replace(part_path, filepath)
+            self.remove_quietly(manifest_path)
+            finished = True
+            return filepath
+        except ChangedUpstream:
+            # The file changed between attempts - the partial data is useless
+            self.discard_partial(part_path, manifest_path)
+            raise Exception("Remote file changed during download, please retry")
+        finally:
+            if claim is None:
+                if not finished:
+                    self.discard_partial(part_path, manifest_path)  # nobody could resume a private partial
+            else:
+                self.release_partial(claim)
+            if own_session:
+                session.close()
+    
+    def fetch_parallel(self, session, url, headers, proxies, part_path, ranges, state):
+        """Fetch every range on its own thread, stopping all of them on the first error"""
+        stop = threading.Event()
+        errors = []
+        
+        def worker(byte_range):
+            try:
+                self.fetch_range(session, url, headers, proxies, part_path, byte_range, state, stop)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+        
+        threads = [threading.Thread(target=worker, args=(r,), daemon=True) for r in ranges]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if errors:
+            # Record what the stopped segments managed to write before giving up
+            state.save()
+            raise errors[0]
+    
+    def fetch_range(self, session, url, headers, proxies, part_path, byte_range, state, stop):
+        """Write bytes start..end of url into part_path at the same offset, retrying from where a dropped connection left off"""
+        start, end = byte_range
+        written = 0
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                written = self.fetch_range_once(session, url, headers, proxies, part_path,
+                                                start, end, written, state, stop)
+                if stop.is_set():
+                    return
+                state.finish_segment(start, end)
+                state.save()
+                return
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, IncompleteSegment, ServerBusy) as e:
+                written = state.active.get(start, written)
+                state.save()
+                if attempt == self.max_retries or stop.is_set():
+                    raise
+                wait_time = 2 ** attempt
+                print(f"Segment {start}-{end} dropped at {written} bytes ({e}), retrying in {wait_time}s...")
+                time.sleep(wait_time)
+            except Exception:
+                state.save()
+                raise
+    
+    def fetch_range_once(self, session, url, headers, proxies, part_path, start, end, written, state, stop):
+        """One request for the unfinished tail of a segment; returns the segment's written byte count"""
+        range_headers = dict(headers)
+        range_headers['Range'] = f'bytes={start + written}-{end}'
+        validator = state.validator()
+        if validator:
+            range_headers['If-Range'] = validator
+        
+        response = session.get(url, headers=range_headers, proxies=proxies, stream=True, timeout=self.timeout)
+        try:
+            if is_retryable_status(response.status_code):
+                raise ServerBusy(f"{response.status_code} for segment {start}-{end}")
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise ChangedUpstream()
+            
+            expected = end - start + 1
+            reader = BodyReader(response, self.chunk_size)
+            with open(part_path, 'r+b') as f:
+                f.seek(start + written)
+                for chunk in reader.chunks():
+                    if stop.is_set():
+                        return written
+                    if chunk:
+                        f.write(chunk)
+                        f.flush()  # the manifest must never get ahead of what readers can see
+                        written += len(chunk)
+                        state.advance(start, written)
+                        if state.progress:
+                            state.progress.update(state.downloaded(), state.size)
+            
+            if written != expected:
+                raise IncompleteSegment(f"Segment {start}-{end} incomplete: got {written} of {expected} bytes")
+            return written
+        finally:
+            response.close()
+    
+    def stream_to_file(self, response, filepath, progress=None):
+        """Single-connection fallback"""
+        total = int(response.headers.get('Content-Length') or 0) or None
+        written = 0
+        try:
+            reader = BodyReader(response, self.chunk_size)
+            with open(filepath, 'wb') as f:
+                for chunk in reader.chunks():
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+                        if progress:
+                            progress.update(written, total)
+        finally:
+            response.close()
+    
+    def readable_bytes(self, part_path, f):
+        """How many bytes from the start of a .part file are real data, for a reader holding it open as f.
+        
+        Ranged downloads preallocate the file, so the answer comes from the
+        manifest: the completed range that starts at 0. Without a manifest
+        (single-connection download, or finished and renamed) the file is
+        written front to back and its size is the answer.
+        """
+        try:
+            with open(part_path + '.json', 'r') as manifest:
+                completed = json.load(manifest).get('completed') or []
+        except (OSError, ValueError):
+            return os.fstat(f.fileno()).st_size
+        if completed and completed[0][0] == 0:
+            return completed[0][1] + 1
+        return 0
+    
+    def discard_partial(self, *paths):
+        for path in paths:
+            self.remove_quietly(path)
+    
+    def remove_quietly(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class ChangedUpstream(Exception):
+    """The server answered a ranged request with the full (changed) file"""
+
+class IncompleteSegment(Exception):
+    """The connection closed before the whole range arrived"""
+
+class ServerBusy(Exception):
+    """The server answered with a status that is worth retrying (5xx, 408, 429)"""
+
+def is_retryable_status(status):
+    return status >= 500 or status in (408, 429)
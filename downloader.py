@@ -1,42 +1,85 @@
-import yt_dlp
-import instaloader
-import gdown
-import requests
+# Site backends (instaloader, gdown, mega, internetarchive, yt-dlp) are
+# imported inside the handlers that use them, so a worker only pays for
+# the ones it actually needs
 import re
-try:
-    from mega import Mega
-    MEGA_AVAILABLE = True
-except:
-    MEGA_AVAILABLE = False
-from internetarchive import download as ia_download
 import os
-import random
 import subprocess
-from urllib.parse import urlparse
-import asyncio
+from urllib.parse import urlparse, unquote
 import time
 import hashlib
+import threading
+import itertools
 import config
-try:
-    from telethon import TelegramClient
-    from telethon.tl.types import MessageMediaDocument, MessageMediaPhoto
-    import telegram_config
-    TELETHON_AVAILABLE = True
-except:
-    TELETHON_AVAILABLE = False
+from download_engine import SegmentedDownloader, ProgressReporter
+from download_cache import DownloadCache
+from url_router import UrlRouter, Route
+from ytdl_pool import YoutubeDLPool
+from ffmpeg_locator import ffmpeg_path
+from hls_downloader import HlsDownloader, HlsUnsupported
+from dash_downloader import DashDownloader
+from session_pool import SessionPool
+from proxy_pool import ProxyPool, ProxyFileWatcher, is_network_error
+from workspace import Workspace
+import metrics
+
+# Handler table for DownloadManager.dispatch. Hosts match on domain suffix
+# (so www./m./cdn subdomains are covered), host keywords anywhere in the
+# host name, extensions on the URL path. A host rule always wins over an
+# extension rule.
+ROUTER = UrlRouter(default=Route('download_ytdlp', takes_quality=True))  # yt-dlp supports 1000+ sites
+ROUTER.register('download_youtube', hosts=['youtube.com', 'youtu.be'], takes_quality=True)
+ROUTER.register('download_telegram', hosts=['t.me', 'telegram.me', 'telegram.org'], takes_quality=True)
+ROUTER.register('download_dailymotion', hosts=['dailymotion.com'], takes_quality=True)
+ROUTER.register('download_instagram_api', hosts=['instagram.com'])
+ROUTER.register('download_mega', hosts=['mega.nz', 'mega.io'])
+ROUTER.register('download_gdrive', hosts=['drive.google.com'])
+ROUTER.register('download_gofile', hosts=['gofile.io'])
+ROUTER.register('download_terabox', hosts=[
+    'terabox.com', 'terabox.app', 'teraboxapp.com', '1024terabox.com', 'freeterabox.com',
+    'terabox.fun', 'teraboxlink.com', 'terasharelink.com', 'terasharefile.com',
+    'nephobox.com', '4funbox.com', 'mirrobox.com', 'momerybox.com', 'tibibox.com',
+], host_keywords=['terabox'])  # TeraBox keeps adding mirror domains
+ROUTER.register('download_archive', hosts=['archive.org'])
+# Adult content sites (videos + cam sites)
+ROUTER.register('download_adult_site', takes_quality=True, hosts=[
+    'camgirlsleak.com', 'pornhub.com', 'xvideos.com', 'xnxx.com', 'redtube.com', 'youporn.com',
+    'spankbang.com', 'eporner.com', 'xhamster.com', 'chaturbate.com', 'stripchat.com', 'cam4.com',
+    'bongacams.com', 'myfreecams.com', 'camsoda.com', 'livejasmin.com',
+])
+# Live streams
+ROUTER.register('download_live_stream', schemes=['rtmp', 'rtmps', 'rtsp', 'rtsps'])
+# HLS/DASH manifests
+ROUTER.register('download_m3u8', extensions=['.m3u8'], takes_quality=True)
+ROUTER.register('download_streaming_manifest', extensions=['.mpd', '.m3u'], takes_quality=True)
+# Direct video and file links
+ROUTER.register('download_direct', extensions=[
+    '.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm',
+    '.pdf', '.zip', '.rar', '.jpg', '.png',
+])
 
 class DownloadManager:
     def __init__(self, download_folder):
         self.download_folder = download_folder
-        self.proxies = self.load_proxies()
+        self.proxy_pool = ProxyPool(self.load_proxies())
         self.max_retries = config.MAX_RETRIES
         self.timeout = config.DOWNLOAD_TIMEOUT
+        self.engine = SegmentedDownloader(os.path.join(download_folder, '.partial'), timeout=self.timeout)
+        self.hls = HlsDownloader(os.path.join(download_folder, '.partial'), timeout=self.timeout)
+        self.dash = DashDownloader(os.path.join(download_folder, '.partial'), timeout=self.timeout)
+        self.cache = DownloadCache(download_folder)
+        self.ytdl_pool = YoutubeDLPool()
+        self.sessions = SessionPool()  # keep-alive HTTP sessions, one per proxy
+        self.job = threading.local()  # per-download context (progress reporting, proxies, workspace)
+        # proxies.txt is rewritten by the auto-updater; pick up new lists without a restart
+        self.proxy_watcher = ProxyFileWatcher(config.PROXY_FILE, self.reload_proxies)
+        # Called with scratch paths to expire if nobody finishes them (a workspace, a failed job's partials)
+        self.on_scratch = None
         
     def load_proxies(self):
         proxies = []  # No default None
         try:
-            if os.path.exists('proxies.txt'):
-                with open('proxies.txt', 'r') as f:
+            if os.path.exists(config.PROXY_FILE):
+                with open(config.PROXY_FILE, 'r') as f:
                     for line in f:
                         line = line.strip()
                         if line and not line.startswith('#'):
@@ -49,8 +92,19 @@ class DownloadManager:
             return [None]
         return proxies
     
-    def get_random_proxy(self):
-        return random.choice(self.proxies)
+    def reload_proxies(self):
+        """Re-read the proxy file and swap the new list in (runs on the watcher thread)"""
+        self.proxy_pool.replace(self.load_proxies())
+    
+    def pick_proxy(self):
+        """Proxy for the current job (None = direct), chosen by health; download() reports how it went"""
+        proxy = self.proxy_pool.choose()
+        picked = getattr(self.job, 'proxies', None)
+        if picked is None:
+            self.proxy_pool.released(proxy)  # not inside download(), nothing will report back
+        else:
+            picked.append(proxy)
+        return proxy
     
     def sanitize_filename(self, filename):
         """Remove invalid characters from filename"""
@@ -70,87 +124,236 @@ class DownloadManager:
                 print(f"Retry {attempt + 1}/{self.max_retries} after {wait_time}s...")
                 time.sleep(wait_time)
     
-    def download(self, url, quality='best', audio_only=False):
+    def download(self, url, quality='best', audio_only=False, on_progress=None):
+        """Download url and return the filename in download_folder (the main one, for a multi-file result)"""
+        files = self.download_files(url, quality, audio_only, on_progress)
+        return files[0] if files else None
+    
+    def download_files(self, url, quality='best', audio_only=False, on_progress=None):
+        """Download url and return the filenames in download_folder, the main (biggest) file first.
+        
+        on_progress, if given, is called with dicts of progress fields
+        (progress, downloaded_bytes, total_bytes, speed, eta, stage).
+        
+        Handlers write into the job's own Workspace and return the name of
+        their output there, or a list of names when the result is several
+        files; they are moved into download_folder only once the handler
+        has succeeded.
+        """
         url = url.strip()
         if not url.startswith(('http://', 'https://')):
             raise Exception("Invalid URL format")
         
-        domain = urlparse(url).netloc.lower()
-        
-        # If audio only requested, use audio downloader
-        if audio_only:
-            return self.download_audio(url)
-        
-        # YouTube
-        if 'youtube.com' in domain or 'youtu.be' in domain:
-            return self.download_youtube(url, quality)
-        
-        # Telegram
-        elif 't.me' in domain or 'telegram.me' in domain or 'telegram.org' in domain:
-            return self.download_telegram(url, quality)
+        # Same URL/quality fetched before and still on disk
+        cached = self.cache.lookup(url, quality, audio_only)
+        if cached:
+            print(f"Cache hit: {url[:100]} -> {cached}")
+            metrics.CACHE_HITS.inc()
+            return [cached]
         
-        # Dailymotion
-        elif 'dailymotion.com' in domain:
-            return self.download_dailymotion(url, quality)
+        started = time.time()
+        first_byte = []
+        # When postprocessing began, and bytes fetched by earlier files of the job (yt-dlp restarts the count per format)
+        marks = {'processing': None, 'bytes': 0, 'earlier_bytes': 0}
         
-        # Instagram
-        elif 'instagram.com' in domain:
-            return self.download_instagram_api(url)
+        def report(fields):
+            # Called from whichever thread is downloading - time to first byte feeds the proxy's latency
+            if not first_byte and fields.get('downloaded_bytes'):
+                first_byte.append(time.time())
+            if fields.get('downloaded_bytes') is not None:
+                if fields['downloaded_bytes'] < marks['bytes']:
+                    marks['earlier_bytes'] += marks['bytes']
+                marks['bytes'] = fields['downloaded_bytes']
+            if fields.get('stage') == 'processing' and marks['processing'] is None:
+                marks['processing'] = time.time()
+            if on_progress:
+                on_progress(fields)
         
-        # Mega
-        elif 'mega.nz' in domain or 'mega.io' in domain:
-            return self.download_mega(url)
+        self.job.progress = ProgressReporter(report)
+        self.job.proxies = []
+        self.job.workspace = Workspace(self.download_folder)
+        self.job.handler = None
+        self.watch_scratch([self.job.workspace.path])
+        try:
+            result = self.dispatch(url, quality, audio_only)
+            names = result if isinstance(result, list) else [result] if result else []
+            files = [self.job.workspace.commit(name, self.sanitize_filename(os.path.basename(name))) for name in names]
+        except Exception as e:
+            # Partials are kept for a retry to resume; make sure they expire if none comes
+            partial_folder = self.engine.partial_folder
+            if os.path.isdir(partial_folder):
+                self.watch_scratch([os.path.join(partial_folder, name) for name in os.listdir(partial_folder)])
+            self.report_proxies(started, first_byte, error=e)
+            self.record_timings(started, first_byte, marks, error=e)
+            raise
+        else:
+            self.report_proxies(started, first_byte, files=files)
+            self.record_timings(started, first_byte, marks, files=files)
+        finally:
+            self.job.workspace.close()
+            self.job.progress = None
+            self.job.proxies = None
+            self.job.workspace = None
+            self.job.handler = None
         
-        # Google Drive
-        elif 'drive.google.com' in domain:
-            return self.download_gdrive(url)
+        # The cache maps a request to one file; multi-file results are fetched again
+        if len(files) == 1:
+            self.cache.store(url, quality, audio_only, files[0])
+        return files
+    
+    def watch_scratch(self, paths):
+        if self.on_scratch:
+            try:
+                self.on_scratch(paths)
+            except Exception as e:
+                print(f"Scratch watcher failed: {e}")
+    
+    def report_proxies(self, started, first_byte, files=(), error=None):
+        """Tell the proxy pool how the job went on the proxy it ended up using"""
+        if not self.job.proxies:
+            return
+        *earlier, proxy = self.job.proxies
+        for skipped in earlier:
+            self.proxy_pool.released(skipped)  # a handler fell back to another attempt
         
-        # GoFile
-        elif 'gofile.io' in domain:
-            return self.download_gofile(url)
+        if error is not None:
+            # Only connection-level errors say anything about the proxy; a missing video doesn't
+            if is_network_error(error):
+                self.proxy_pool.failed(proxy)
+                metrics.PROXY_RESULTS.inc('failed')
+            else:
+                self.proxy_pool.released(proxy)
+                metrics.PROXY_RESULTS.inc('released')
+            return
         
-        # TeraBox
-        elif 'terabox' in domain or 'terasharefile.com' in domain:
-            return self.download_terabox(url)
+        paths = [os.path.join(self.download_folder, filename) for filename in files]
+        nbytes = sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+        latency = first_byte[0] - started if first_byte else None
+        self.proxy_pool.succeeded(proxy, time.time() - started, nbytes, latency)
+        metrics.PROXY_RESULTS.inc('ok')
+    
+    def record_timings(self, started, first_byte, marks, files=(), error=None):
+        """Per-stage durations and bytes of the job that just ended, for /metrics.
         
-        # Archive.org
-        elif 'archive.org' in domain:
-            return self.download_archive(url)
+        Extraction runs until the first byte arrives, the transfer until
+        the handler reports 'processing' (or returns), postprocessing from
+        there on. A stage the job never reached isn't recorded.
+        """
+        ended = time.time()
+        handler = self.job.handler or 'unknown'
+        result = 'error' if error is not None else 'ok'
+        metrics.JOB_SECONDS.observe(handler, result, value=ended - started)
         
-        # M3U8 streams
-        elif '.m3u8' in url.lower():
-            return self.download_m3u8(url)
+        transfer_start = first_byte[0] if first_byte else None
+        processing = marks['processing']
+        metrics.EXTRACT_SECONDS.observe(handler, result, value=(transfer_start or processing or ended) - started)
+        if transfer_start is not None:
+            metrics.TRANSFER_SECONDS.observe(handler, result, value=max(processing or ended, transfer_start) - transfer_start)
+        if processing is not None:
+            metrics.POSTPROCESS_SECONDS.observe(handler, result, value=ended - processing)
         
-        # Direct MP4/video links
-        elif url.startswith('http') and any(ext in url.lower() for ext in ['.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm']):
-            return self.download_direct(url)
+        nbytes = marks['earlier_bytes'] + marks['bytes']
+        if not nbytes:
+            # Backends without progress reporting (gdown, mega): what they left behind
+            paths = [os.path.join(self.download_folder, filename) for filename in files]
+            nbytes = sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+        if nbytes:
+            metrics.BYTES.inc(handler, result, amount=nbytes)
+    
+    def work_path(self, name=''):
+        """Path of name in the current job's workspace (the workspace itself for '')"""
+        return self.job.workspace.file(name)
+    
+    def current_progress(self):
+        """ProgressReporter of the download running on this thread, or None"""
+        return getattr(self.job, 'progress', None)
+    
+    def ytdlp_progress_hook(self, progress):
+        """yt-dlp progress_hooks entry that feeds a ProgressReporter"""
+        def hook(d):
+            if d.get('status') == 'downloading':
+                progress.update(d.get('downloaded_bytes') or 0,
+                                d.get('total_bytes') or d.get('total_bytes_estimate'),
+                                d.get('speed'), d.get('eta'))
+            elif d.get('status') == 'finished':
+                # Merging/converting with ffmpeg comes next
+                progress.stage('processing')
+        return hook
+    
+    def make_ytdl(self, ydl_opts):
+        """Pooled YoutubeDL for ydl_opts (use in a with block), wired to the current job's progress reporting"""
+        progress = self.current_progress()
+        if progress:
+            ydl_opts = dict(ydl_opts, progress_hooks=[self.ytdlp_progress_hook(progress)])
+        if os.path.isabs(ffmpeg_path()) and 'ffmpeg_location' not in ydl_opts:
+            ydl_opts = dict(ydl_opts, ffmpeg_location=ffmpeg_path())
+        return self.ytdl_pool.checkout(ydl_opts)
+    
+    def dispatch(self, url, quality, audio_only):
+        """Pick the handler for url and run it"""
+        # If audio only requested, use audio downloader
+        if audio_only:
+            self.job.handler = 'download_audio'
+            return self.download_audio(url)
         
-        # Other direct links
-        elif url.startswith('http') and any(ext in url.lower() for ext in ['.pdf', '.zip', '.rar', '.jpg', '.png']):
-            return self.download_direct(url)
+        route = ROUTER.resolve(url)
+        if isinstance(route.handler, str):
+            handler = getattr(self, route.handler)
+            self.job.handler = route.handler
+        else:
+            handler = lambda *args: route.handler(self, *args)
+            self.job.handler = getattr(route.handler, '__name__', 'custom')
         
-        # Adult content sites (videos + cam sites)
-        elif any(site in domain for site in ['camgirlsleak.com', 'pornhub.com', 'xvideos.com', 'xnxx.com', 'redtube.com', 'youporn.com', 'spankbang.com', 'eporner.com', 'xhamster.com', 'chaturbate.com', 'stripchat.com', 'cam4.com', 'bongacams.com', 'myfreecams.com', 'camsoda.com', 'livejasmin.com']):
-            return self.download_adult_site(url, quality)
+        if route.takes_quality:
+            return handler(url, quality)
+        return handler(url)
+    
+    def iter_playlist(self, url, max_items=None):
+        """(url, title) of the first max_items (BATCH_MAX_ITEMS) entries of a playlist or channel URL.
         
-        # Live streams (RTMP, RTSP, HLS, DASH)
-        elif any(protocol in url.lower() for protocol in ['rtmp://', 'rtmps://', 'rtsp://', 'rtsps://']):
-            return self.download_live_stream(url)
+        Flat extraction without processing leaves yt-dlp's entries as a
+        generator, so only the pages holding those entries are requested.
+        They are all read before the first one is yielded: the pooled
+        YoutubeDL goes back to the pool right away instead of staying
+        checked out while the batch works through its items. A URL that
+        isn't a playlist yields just itself.
+        """
+        proxy = self.pick_proxy()
+        ydl_opts = {'extract_flat': 'in_playlist', 'lazy_playlist': True, 'quiet': True, 'skip_download': True}
+        if proxy:
+            ydl_opts['proxy'] = proxy
         
-        # HLS/DASH manifests
-        elif any(ext in url.lower() for ext in ['.mpd', '.m3u', '.m3u8']):
-            return self.download_streaming_manifest(url)
+        with self.ytdl_pool.checkout(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            # Channel URLs usually redirect to one of their tabs first
+            for _ in range(3):
+                if not info or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+            
+            is_playlist = info and info.get('_type') in ('playlist', 'multi_video')
+            if is_playlist:
+                entries = list(itertools.islice((entry for entry in info.get('entries') or [] if entry),
+                                                max_items or config.BATCH_MAX_ITEMS))
         
-        # Default: yt-dlp (supports 1000+ sites)
-        else:
-            return self.download_ytdlp(url, quality)
+        if not is_playlist:
+            yield url, (info or {}).get('title')
+            return
+        for entry in entries:
+            # Usually a link to the entry's page; embedded videos come fully extracted, with formats instead
+            formats = entry.get('formats') or [{}]
+            entry_url = next((u for u in (entry.get('url'), entry.get('webpage_url'), formats[-1].get('url'))
+                              if u and u.startswith(('http://', 'https://'))), None)
+            if entry_url:
+                yield entry_url, entry.get('title')
     
     def download_ytdlp(self, url, quality):
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         
         ydl_opts = {
             'format': f'bestvideo[height<={quality}]+bestaudio/best' if quality != 'best' else 'best',
-            'outtmpl': os.path.join(self.download_folder, '%(title)s.%(ext)s'),
+            'outtmpl': self.work_path('%(title)s.%(ext)s'),
+            'noplaylist': True,  # one job, one file - playlists go through /batch
             'quiet': False,
             'socket_timeout': self.timeout,
             'retries': self.max_retries,
@@ -171,18 +374,19 @@ class DownloadManager:
         if proxy:
             ydl_opts['proxy'] = proxy
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with self.make_ytdl(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
             filename = ydl.prepare_filename(info)
-            return self.sanitize_filename(os.path.basename(filename))
+            return os.path.basename(filename)
     
     def download_audio(self, url):
         """Download audio only (MP3)"""
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         
         ydl_opts = {
             'format': 'bestaudio/best',
-            'outtmpl': os.path.join(self.download_folder, '%(title)s.%(ext)s'),
+            'outtmpl': self.work_path('%(title)s.%(ext)s'),
+            'noplaylist': True,
             'quiet': False,
             'socket_timeout': self.timeout,
             'retries': self.max_retries,
@@ -201,21 +405,22 @@ class DownloadManager:
         if proxy:
             ydl_opts['proxy'] = proxy
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with self.make_ytdl(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
             # After conversion, filename will have .mp3 extension
             filename = ydl.prepare_filename(info)
             # Replace extension with .mp3
             filename_base = os.path.splitext(filename)[0]
             mp3_filename = filename_base + '.mp3'
-            return self.sanitize_filename(os.path.basename(mp3_filename))
+            return os.path.basename(mp3_filename)
     
     def download_youtube(self, url, quality):
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         
         ydl_opts = {
             'format': f'bestvideo[height<={quality}]+bestaudio/best' if quality != 'best' else 'best',
-            'outtmpl': os.path.join(self.download_folder, '%(title)s.%(ext)s'),
+            'outtmpl': self.work_path('%(title)s.%(ext)s'),
+            'noplaylist': True,
             'merge_output_format': 'mp4',
             'quiet': False,
             'no_warnings': False,
@@ -240,10 +445,10 @@ class DownloadManager:
             ydl_opts['proxy'] = proxy
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.make_ytdl(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
                 filename = ydl.prepare_filename(info)
-                return self.sanitize_filename(os.path.basename(filename))
+                return os.path.basename(filename)
         except Exception as e:
             error_msg = str(e)
             if '429' in error_msg or 'Too Many Requests' in error_msg:
@@ -253,12 +458,12 @@ class DownloadManager:
             raise e
     
     def download_dailymotion(self, url, quality):
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         timestamp = int(time.time())
         
         ydl_opts = {
             'format': 'best',
-            'outtmpl': os.path.join(self.download_folder, f'{timestamp}_%(title)s.%(ext)s'),
+            'outtmpl': self.work_path(f'{timestamp}_%(title)s.%(ext)s'),
             'quiet': False,
             'no_check_certificate': True,
             'geo_bypass': True,
@@ -275,10 +480,10 @@ class DownloadManager:
         if proxy:
             ydl_opts['proxy'] = proxy
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with self.make_ytdl(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
             filename = ydl.prepare_filename(info)
-            return self.sanitize_filename(os.path.basename(filename))
+            return os.path.basename(filename)
     
     def download_telegram(self, url, quality):
         # Check if it's a private channel (/c/ in URL)
@@ -286,12 +491,12 @@ class DownloadManager:
             raise Exception("Private Telegram channels are not supported. Please use public Telegram links only.")
         
         # Public channels - use yt-dlp
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         timestamp = int(time.time())
         
         ydl_opts = {
             'format': 'best',
-            'outtmpl': os.path.join(self.download_folder, f'{timestamp}_%(title)s.%(ext)s'),
+            'outtmpl': self.work_path(f'{timestamp}_%(title)s.%(ext)s'),
             'quiet': False,
             'socket_timeout': self.timeout,
             'retries': self.max_retries,
@@ -301,12 +506,12 @@ class DownloadManager:
             ydl_opts['proxy'] = proxy
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.make_ytdl(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
                 if info is None:
                     raise Exception("Video not found or not accessible. Please check the link.")
                 filename = ydl.prepare_filename(info)
-                return self.sanitize_filename(os.path.basename(filename))
+                return os.path.basename(filename)
         except Exception as e:
             if 'Private Telegram' in str(e):
                 raise e
@@ -318,6 +523,8 @@ class DownloadManager:
     
     def download_instagram_api(self, url):
         """Download Instagram using RapidAPI Downloader"""
+        import instaloader
+        
         try:
             # Extract shortcode from URL
             if '/p/' in url or '/reel/' in url or '/tv/' in url:
@@ -330,7 +537,7 @@ class DownloadManager:
             # Method 1: Try Instaloader (works for public posts)
             try:
                 L = instaloader.Instaloader(
-                    dirname_pattern=self.download_folder,
+                    dirname_pattern=self.work_path(),
                     download_video_thumbnails=False,
                     download_geotags=False,
                     download_comments=False,
@@ -342,36 +549,21 @@ class DownloadManager:
                 post = instaloader.Post.from_shortcode(L.context, shortcode)
                 L.download_post(post, target='')
                 
-                # Get the downloaded file
-                files = [f for f in os.listdir(self.download_folder) 
-                        if f.endswith(('.mp4', '.jpg', '.jpeg', '.png')) and 
-                        not f.endswith('.json.xz') and
-                        os.path.getmtime(os.path.join(self.download_folder, f)) > time.time() - 60]
-                
-                if files:
-                    latest = max([os.path.join(self.download_folder, f) for f in files], key=os.path.getctime)
-                    new_name = f"{timestamp}_instagram{os.path.splitext(latest)[1]}"
-                    new_path = os.path.join(self.download_folder, new_name)
-                    os.rename(latest, new_path)
-                    
-                    # Clean up extra files
-                    for f in os.listdir(self.download_folder):
-                        if f.endswith(('.json.xz', '.txt')) and shortcode in f:
-                            try:
-                                os.remove(os.path.join(self.download_folder, f))
-                            except:
-                                pass
-                    
+                # The video if there is one, else the picture; the .json.xz/.txt extras go with the workspace
+                media = self.job.workspace.largest_file(extensions=('.mp4', '.jpg', '.jpeg', '.png'))
+                if media:
+                    new_name = f"{timestamp}_instagram{os.path.splitext(media)[1]}"
+                    os.rename(self.work_path(media), self.work_path(new_name))
                     return new_name
             except Exception as e:
                 print(f"Instaloader failed: {e}")
             
             # Method 2: Try yt-dlp with cookies
             try:
-                proxy = self.get_random_proxy()
+                proxy = self.pick_proxy()
                 ydl_opts = {
                     'format': 'best',
-                    'outtmpl': os.path.join(self.download_folder, f'{timestamp}_instagram.%(ext)s'),
+                    'outtmpl': self.work_path(f'{timestamp}_instagram.%(ext)s'),
                     'quiet': False,
                     'cookiesfrombrowser': ('chrome',),
                     'http_headers': {
@@ -383,7 +575,7 @@ class DownloadManager:
                 if proxy:
                     ydl_opts['proxy'] = proxy
                 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                with self.make_ytdl(ydl_opts) as ydl:
                     info = ydl.extract_info(url, download=True)
                     if info:
                         filename = ydl.prepare_filename(info)
@@ -400,11 +592,11 @@ class DownloadManager:
         try:
             timestamp = int(time.time())
             
-            proxy = self.get_random_proxy()
+            proxy = self.pick_proxy()
             
             ydl_opts = {
                 'format': 'best',
-                'outtmpl': os.path.join(self.download_folder, f'{timestamp}_%(title)s.%(ext)s'),
+                'outtmpl': self.work_path(f'{timestamp}_%(title)s.%(ext)s'),
                 'quiet': False,
                 'http_headers': {
                     'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1',
@@ -417,7 +609,7 @@ class DownloadManager:
             if proxy:
                 ydl_opts['proxy'] = proxy
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.make_ytdl(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
                 filename = ydl.prepare_filename(info)
                 return os.path.basename(filename)
@@ -427,7 +619,7 @@ class DownloadManager:
             # Fallback to instaloader
             try:
                 L = instaloader.Instaloader(
-                    dirname_pattern=self.download_folder,
+                    dirname_pattern=self.work_path(),
                     download_video_thumbnails=False,
                     download_geotags=False,
                     download_comments=False,
@@ -442,12 +634,9 @@ class DownloadManager:
                     L.download_post(post, target='')
                     
                     # Get only video/image files (not json/txt)
-                    files = [f for f in os.listdir(self.download_folder) 
-                            if f.endswith(('.mp4', '.jpg', '.jpeg', '.png')) and not f.endswith('.json.xz')]
-                    
-                    if files:
-                        latest = max([os.path.join(self.download_folder, f) for f in files], key=os.path.getctime)
-                        return os.path.basename(latest)
+                    media = self.job.workspace.largest_file(extensions=('.mp4', '.jpg', '.jpeg', '.png'))
+                    if media:
+                        return media
                 
                 raise Exception("Instagram download failed. Could not find media file.")
             except Exception as e2:
@@ -455,54 +644,55 @@ class DownloadManager:
                 raise Exception(f"Instagram download failed. The post may be private or require login. Try a public post.")
     
     def download_mega(self, url):
-        if not MEGA_AVAILABLE:
+        try:
+            from mega import Mega
+        except ImportError:
             # Fallback to yt-dlp for mega
             return self.download_ytdlp(url, 'best')
         
         try:
             m = Mega()
-            file = m.download_url(url, self.download_folder)
+            file = m.download_url(url, self.work_path())
             return os.path.basename(file)
         except:
             # Fallback to yt-dlp
             return self.download_ytdlp(url, 'best')
     
     def download_gdrive(self, url):
-        output = os.path.join(self.download_folder, 'gdrive_file')
-        gdown.download(url, output, quiet=False, fuzzy=True)
+        import gdown
         
-        files = os.listdir(self.download_folder)
-        latest = max([os.path.join(self.download_folder, f) for f in files], key=os.path.getctime)
-        return os.path.basename(latest)
+        # A directory as output makes gdown keep Drive's file name; it returns the path it wrote
+        output = gdown.download(url, self.work_path() + os.sep, quiet=False, fuzzy=True)
+        if not output:
+            raise Exception("Google Drive download failed. The file may be private or over its download quota.")
+        return os.path.basename(output)
     
     def download_gofile(self, url):
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         proxies = {'http': proxy, 'https': proxy} if proxy else None
         
-        response = requests.get(url, proxies=proxies)
-        
-        # GoFile requires token and content ID parsing
-        # Simplified version - you may need to enhance this
-        content_id = url.split('/')[-1]
-        
-        # Get download link
-        api_url = f'https://api.gofile.io/getContent?contentId={content_id}'
-        data = requests.get(api_url, proxies=proxies).json()
-        
-        if data['status'] == 'ok':
-            files = data['data']['contents']
-            for file_id, file_info in files.items():
-                download_url = file_info['link']
-                filename = file_info['name']
-                
-                file_response = requests.get(download_url, proxies=proxies, stream=True)
-                filepath = os.path.join(self.download_folder, filename)
-                
-                with open(filepath, 'wb') as f:
-                    for chunk in file_response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
-                return filename
+        with self.sessions.session(proxy) as session:
+            response = session.get(url, proxies=proxies)
+            
+            # GoFile requires token and content ID parsing
+            # Simplified version - you may need to enhance this
+            content_id = url.split('/')[-1]
+            
+            # Get download link
+            api_url = f'https://api.gofile.io/getContent?contentId={content_id}'
+            data = session.get(api_url, proxies=proxies).json()
+            
+            if data['status'] == 'ok':
+                files = data['data']['contents']
+                for file_id, file_info in files.items():
+                    download_url = file_info['link']
+                    filename = file_info['name']
+                    
+                    filepath = self.work_path(filename)
+                    self.engine.download(download_url, filepath, proxies=proxies, progress=self.current_progress(),
+                                         session=session)
+                    
+                    return filename
         
         return None
     
@@ -528,7 +718,7 @@ class DownloadManager:
             
             # Preferences for auto download
             prefs = {
-                'download.default_directory': os.path.abspath(self.download_folder),
+                'download.default_directory': os.path.abspath(self.work_path()),
                 'download.prompt_for_download': False,
                 'download.directory_upgrade': True,
                 'safebrowsing.enabled': True
@@ -573,12 +763,11 @@ class DownloadManager:
                 if download_clicked:
                     time.sleep(15)  # Wait for download
                     
-                    # Get latest file
-                    files = [f for f in os.listdir(self.download_folder) if not f.endswith('.crdownload')]
-                    if files:
-                        latest = max([os.path.join(self.download_folder, f) for f in files], key=os.path.getctime)
+                    # Chrome saves into this job's workspace; .crdownload means it isn't finished
+                    downloaded = self.job.workspace.largest_file(skip=('.crdownload',))
+                    if downloaded:
                         driver.quit()
-                        return os.path.basename(latest)
+                        return downloaded
                 
                 # If no download button found, try to get direct link from page
                 try:
@@ -615,49 +804,95 @@ class DownloadManager:
             raise Exception(f"TeraBox download failed: {str(e)}")
     
     def download_archive(self, url):
-        identifier = url.split('/')[-1]
-        ia_download(identifier, destdir=self.download_folder)
-        
-        files = os.listdir(self.download_folder)
-        latest = max([os.path.join(self.download_folder, f) for f in files], key=os.path.getctime)
-        return os.path.basename(latest)
-    
-    def download_m3u8(self, url):
-        proxy = self.get_random_proxy()
+        from internetarchive import download as ia_download
         
-        filename = f"video_{hash(url)}.mp4"
-        filepath = os.path.join(self.download_folder, filename)
+        # archive.org/details/<identifier> or archive.org/download/<identifier>/<file>
+        parts = [p for p in urlparse(url).path.split('/') if p]
+        if len(parts) >= 2 and parts[0] in ('details', 'download', 'embed'):
+            identifier, filename = parts[1], '/'.join(parts[2:])
+        else:
+            identifier, filename = parts[-1], ''
         
-        # Use ffmpeg for m3u8 streams
-        if proxy:
-            cmd = ['ffmpeg', '-http_proxy', proxy, '-i', url, '-c', 'copy', '-bsf:a', 'aac_adtstoasc', filepath]
+        if parts and parts[0] == 'download' and filename:
+            ia_download(identifier, files=[unquote(filename)], destdir=self.work_path(), no_directory=True)
         else:
-            cmd = ['ffmpeg', '-i', url, '-c', 'copy', '-bsf:a', 'aac_adtstoasc', filepath]
+            ia_download(identifier, destdir=self.work_path(), no_directory=True)
         
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
+        # A whole item is several files (media, metadata, thumbnails), biggest first; /bundle serves them as one ZIP
+        downloaded = self.job.workspace.files()
+        if not downloaded:
+            raise Exception(f"archive.org returned no files for {identifier}")
+        return downloaded
+    
+    def download_m3u8(self, url, quality='best'):
+        proxy = self.pick_proxy()
+        
+        # Stable name so a retry (even after a restart) finds the previous attempt's fragments
+        name_key = url if quality == 'best' else f"{url}|{quality}"
+        filename = f"video_{hashlib.md5(name_key.encode()).hexdigest()[:12]}.mp4"
+        filepath = self.work_path(filename)
+        
+        if os.path.exists(os.path.join(self.download_folder, filename)):
             return filename
-        except:
-            # Fallback to yt-dlp for m3u8
-            ydl_opts = {
-                'format': 'best',
-                'outtmpl': filepath,
-            }
+        
+        # yt-dlp keeps a .part file plus a .ytdl fragment index when an HLS download
+        # is interrupted; ffmpeg can't continue that, so resume with yt-dlp directly.
+        # Those live with the other partial downloads, the workspace goes when the job fails
+        resume_path = os.path.join(self.hls.partial_folder, filename)
+        resume_ytdlp = os.path.exists(resume_path + '.part') or os.path.exists(resume_path + '.ytdl')
+        
+        if not resume_ytdlp:
+            # Native engine: parallel segments, kept on disk between attempts, one remux at the end.
+            # Its errors are final (a retry resumes from the fetched segments); only streams it
+            # can't handle (live, SAMPLE-AES) go on to ffmpeg/yt-dlp below
+            proxies = {'http': proxy, 'https': proxy} if proxy else None
+            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+            try:
+                with self.sessions.session(proxy) as session:
+                    self.hls.download(url, filepath, quality, headers=headers, proxies=proxies,
+                                      progress=self.current_progress(), session=session)
+                return filename
+            except HlsUnsupported as e:
+                print(f"Native HLS engine can't handle {url[:80]} ({e}), using ffmpeg")
+            
+            tmp_path = filepath + '.ffmpeg'
             if proxy:
-                ydl_opts['proxy'] = proxy
+                cmd = [ffmpeg_path(), '-y', '-http_proxy', proxy, '-i', url, '-c', 'copy', '-bsf:a', 'aac_adtstoasc', '-f', 'mp4', tmp_path]
+            else:
+                cmd = [ffmpeg_path(), '-y', '-i', url, '-c', 'copy', '-bsf:a', 'aac_adtstoasc', '-f', 'mp4', tmp_path]
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            return filename
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+                os.replace(tmp_path, filepath)
+                return filename
+            except:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        
+        # Fallback to yt-dlp for m3u8 (native HLS downloader, resumes fragment by fragment)
+        ydl_opts = {
+            'format': 'best',
+            'outtmpl': resume_path,
+            'continuedl': True,
+            'retries': self.max_retries,
+            'fragment_retries': self.max_retries,
+        }
+        if proxy:
+            ydl_opts['proxy'] = proxy
+        
+        with self.make_ytdl(ydl_opts) as ydl:
+            ydl.download([url])
+        os.replace(resume_path, filepath)
+        return filename
     
     def download_adult_site(self, url, quality):
         """Download from adult content sites (videos + cam recordings)"""
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         timestamp = int(time.time())
         
         ydl_opts = {
             'format': 'best',
-            'outtmpl': os.path.join(self.download_folder, f'{timestamp}_video.%(ext)s'),
+            'outtmpl': self.work_path(f'{timestamp}_video.%(ext)s'),
             'quiet': False,
             'no_check_certificate': True,
             'age_limit': 21,
@@ -674,14 +909,15 @@ class DownloadManager:
             ydl_opts['proxy'] = proxy
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.make_ytdl(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
                 filename = ydl.prepare_filename(info)
                 return os.path.basename(filename)
         except Exception as e:
             # Try to extract direct video/stream URL from page
             try:
-                response = requests.get(url, headers=ydl_opts['http_headers'])
+                with self.sessions.session() as session:
+                    response = session.get(url, headers=ydl_opts['http_headers'])
                 html = response.text
                 
                 # Look for video URLs and streaming URLs
@@ -716,12 +952,12 @@ class DownloadManager:
         """Download RTMP/RTSP live streams"""
         timestamp = int(time.time())
         filename = f"{timestamp}_livestream.mp4"
-        filepath = os.path.join(self.download_folder, filename)
+        filepath = self.work_path(filename)
         
         try:
             # Use FFmpeg to capture live stream
             cmd = [
-                'ffmpeg',
+                ffmpeg_path(),
                 '-i', url,
                 '-c', 'copy',
                 '-t', '3600',  # Max 1 hour recording
@@ -739,16 +975,33 @@ class DownloadManager:
         except Exception as e:
             raise Exception(f"Live stream download failed: {str(e)}")
     
-    def download_streaming_manifest(self, url):
+    def download_streaming_manifest(self, url, quality='best'):
         """Download HLS (.m3u8) or DASH (.mpd) streams"""
         if '.m3u8' in url.lower():
-            return self.download_m3u8(url)
+            return self.download_m3u8(url, quality)
         
         # DASH manifest
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
+        
+        if urlparse(url).path.lower().endswith('.mpd'):
+            # Native engine: video and audio segments in parallel, one stream-copy mux
+            name_key = url if quality == 'best' else f"{url}|{quality}"
+            filename = f"stream_{hashlib.md5(name_key.encode()).hexdigest()[:12]}.mp4"
+            filepath = self.work_path(filename)
+            if os.path.exists(os.path.join(self.download_folder, filename)):
+                return filename
+            try:
+                with self.sessions.session(proxy) as session:
+                    self.dash.download(url, filepath, quality, proxies={'http': proxy, 'https': proxy} if proxy else None,
+                                       progress=self.current_progress(), session=session,
+                                       headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
+                return filename
+            except HlsUnsupported as e:
+                print(f"Native DASH engine can't handle {url[:80]} ({e}), using yt-dlp")
+        
         timestamp = int(time.time())
         filename = f"{timestamp}_stream.mp4"
-        filepath = os.path.join(self.download_folder, filename)
+        filepath = self.work_path(filename)
         
         ydl_opts = {
             'format': 'best',
@@ -760,14 +1013,14 @@ class DownloadManager:
             ydl_opts['proxy'] = proxy
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.make_ytdl(ydl_opts) as ydl:
                 ydl.download([url])
             return filename
         except Exception as e:
             raise Exception(f"Streaming manifest download failed: {str(e)}")
     
     def download_direct(self, url):
-        proxy = self.get_random_proxy()
+        proxy = self.pick_proxy()
         proxies = {'http': proxy, 'https': proxy} if proxy else None
         
         filename = url.split('/')[-1].split('?')[0]
@@ -775,17 +1028,11 @@ class DownloadManager:
             filename = f"download_{hashlib.md5(url.encode()).hexdigest()[:8]}.mp4"
         
         filename = self.sanitize_filename(filename)
-        filepath = os.path.join(self.download_folder, filename)
-        
-        response = requests.get(url, proxies=proxies, stream=True, timeout=self.timeout, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        response.raise_for_status()
+        filepath = self.work_path(filename)
         
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        with self.sessions.session(proxy) as session:
+            self.engine.download(url, filepath, proxies=proxies, progress=self.current_progress(), session=session,
+                                 headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
         
         return filename
     
@@ -810,7 +1057,7 @@ class DownloadManager:
                 },
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.make_ytdl(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 
                 if not info:
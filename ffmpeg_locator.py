@@ -0,0 +1,30 @@
+import os
+import shutil
+import logging
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def resolve_ffmpeg():
+    """(ffmpeg, ffprobe) executables, looked up once per process.
+    
+    FFMPEG_BINARY/FFPROBE_BINARY win if set, then the static-ffmpeg binaries
+    (fetched at build time by build.sh), then whatever is on PATH.
+    """
+    if os.environ.get('FFMPEG_BINARY'):
+        return os.environ['FFMPEG_BINARY'], os.environ.get('FFPROBE_BINARY', 'ffprobe')
+    
+    try:
+        from static_ffmpeg import run
+        ffmpeg, ffprobe = run.get_or_fetch_platform_executables_else_raise()
+        logging.info(f"Using static-ffmpeg: {ffmpeg}")
+        return ffmpeg, ffprobe
+    except Exception as e:
+        logging.warning(f"Static-ffmpeg failed, using system FFmpeg: {e}")
+    
+    return shutil.which('ffmpeg') or 'ffmpeg', shutil.which('ffprobe') or 'ffprobe'
+
+def ffmpeg_path():
+    return resolve_ffmpeg()[0]
+
+def ffprobe_path():
+    return resolve_ffmpeg()[1]
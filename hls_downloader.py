@@ -0,0 +1,300 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import requests
+import config
+from download_engine import fetch_with_retry
+from ffmpeg_locator import ffmpeg_path
+
+ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+def parse_attributes(text):
+    """KEY=value,KEY="quoted, value" attribute list of an #EXT-X tag"""
+    return {key: value.strip('"') for key, value in ATTRIBUTE.findall(text)}
+
+class HlsUnsupported(Exception):
+    """Playlist uses something the native engine doesn't handle (live, SAMPLE-AES, ...)"""
+
+class Segment:
+    """One media segment of a playlist"""
+    
+    def __init__(self, url, sequence, key=None, byte_range=None):
+        self.url = url
+        self.sequence = sequence
+        self.key = key  # {'uri', 'iv'} for AES-128, or None
+        self.byte_range = byte_range  # inclusive (start, end), or None
+
+class MediaPlaylist:
+    """Segments of one rendition, plus its fMP4 init section if it has one"""
+    
+    def __init__(self, url, segments, init=None):
+        self.url = url
+        self.segments = segments
+        self.init = init  # Segment for #EXT-X-MAP, or None
+
+def parse_master(text, base_url):
+    """Variants of a master playlist as dicts (url, bandwidth, height, audio), plus its audio renditions by group"""
+    variants = []
+    audio = {}
+    pending = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            resolution = re.match(r'(\d+)x(\d+)', attrs.get('RESOLUTION', ''))
+            pending = {
+                'bandwidth': int(attrs.get('BANDWIDTH') or 0),
+                'height': int(resolution.group(2)) if resolution else None,
+                'audio': attrs.get('AUDIO'),
+            }
+        elif line.startswith('#EXT-X-MEDIA:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            if attrs.get('TYPE') == 'AUDIO' and attrs.get('URI'):
+                group = audio.setdefault(attrs.get('GROUP-ID'), [])
+                group.append({'url': urljoin(base_url, attrs['URI']), 'default': attrs.get('DEFAULT') == 'YES'})
+        elif line and not line.startswith('#') and pending is not None:
+            pending['url'] = urljoin(base_url, line)
+            variants.append(pending)
+            pending = None
+    return variants, audio
+
+def parse_media(text, base_url):
+    """MediaPlaylist for a media playlist; raises HlsUnsupported for live or SAMPLE-AES streams"""
+    if '#EXT-X-ENDLIST' not in text:
+        raise HlsUnsupported("live playlist")
+    
+    segments = []
+    init = None
+    key = None
+    sequence = 0
+    next_offset = 0
+    byte_range = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-KEY:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            method = attrs.get('METHOD', 'NONE')
+            if method == 'NONE':
+                key = None
+            elif method == 'AES-128':
+                key = {'uri': urljoin(base_url, attrs['URI']), 'iv': attrs.get('IV')}
+            else:
+                raise HlsUnsupported(f"{method} encryption")
+        elif line.startswith('#EXT-X-MAP:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            init_range = None
+            if attrs.get('BYTERANGE'):
+                length, _, offset = attrs['BYTERANGE'].partition('@')
+                init_range = (int(offset or 0), int(offset or 0) + int(length) - 1)
+            init = Segment(urljoin(base_url, attrs['URI']), -1, byte_range=init_range)
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            length, _, offset = line.split(':', 1)[1].partition('@')
+            start = int(offset) if offset else next_offset
+            byte_range = (start, start + int(length) - 1)
+            next_offset = byte_range[1] + 1
+        elif line and not line.startswith('#'):
+            segments.append(Segment(urljoin(base_url, line), sequence, key, byte_range))
+            sequence += 1
+            byte_range = None
+    return MediaPlaylist(base_url, segments, init)
+
+def pick_variant(variants, quality='best'):
+    """Highest variant not taller than quality (like yt-dlp's height<=N), else the smallest one"""
+    if quality == 'best' or not str(quality).isdigit():
+        return max(variants, key=lambda v: (v['height'] or 0, v['bandwidth']))
+    limit = int(quality)
+    fitting = [v for v in variants if v['height'] and v['height'] <= limit]
+    if fitting:
+        return max(fitting, key=lambda v: (v['height'], v['bandwidth']))
+    return min(variants, key=lambda v: (v['height'] or 0, v['bandwidth']))
+
+class HlsDownloader:
+    """Native HLS downloader: fetches a playlist's segments in parallel and remuxes them once.
+    
+    Segments land in their own folder under partial_folder, each written
+    atomically, so a retried job only fetches the ones it doesn't have yet.
+    When every segment is there a single ffmpeg -c copy run reads them in
+    order straight from that folder (the concatf protocol, a list file per
+    track), so the media is written to disk once more, as the output file.
+    """
+    
+    def __init__(self, partial_folder, workers=None, timeout=None, max_retries=None):
+        self.partial_folder = partial_folder
+        self.workers = workers or config.HLS_SEGMENT_WORKERS
+        self.timeout = timeout or config.DOWNLOAD_TIMEOUT
+        self.max_retries = config.MAX_RETRIES if max_retries is None else max_retries
+        os.makedirs(self.partial_folder, exist_ok=True)
+    
+    def make_session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=self.workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def fetch(self, session, url, headers, proxies, byte_range=None):
+        return fetch_with_retry(session, url, headers, proxies, self.timeout, self.max_retries, byte_range)
+    
+    def resolve(self, session, url, quality='best', headers=None, proxies=None):
+        """[video (or muxed) MediaPlaylist, separate audio MediaPlaylist if the variant has one]"""
+        text = self.fetch(session, url, headers, proxies).decode('utf-8', 'replace')
+        if not text.lstrip().startswith('#EXTM3U'):
+            raise HlsUnsupported("not an m3u8 playlist")
+        if '#EXT-X-STREAM-INF' not in text:
+            return [parse_media(text, url)]
+        
+        variants, audio_groups = parse_master(text, url)
+        if not variants:
+            raise HlsUnsupported("master playlist without variants")
+        variant = pick_variant(variants, quality)
+        playlists = [variant['url']]
+        renditions = audio_groups.get(variant['audio']) or []
+        if renditions:
+            rendition = next((r for r in renditions if r['default']), renditions[0])
+            playlists.append(rendition['url'])
+        
+        return [parse_media(self.fetch(session, u, headers, proxies).decode('utf-8', 'replace'), u)
+                for u in playlists]
+    
+    folder_prefix = 'hls'
+    
+    def work_folder(self, url, quality):
+        key = hashlib.sha1(f"{url}|{quality}".encode()).hexdigest()
+        return os.path.join(self.partial_folder, f"{self.folder_prefix}_{key}")
+    
+    def fetch_segments(self, session, playlist, folder, headers=None, proxies=None, progress=None):
+        """Download every segment of playlist into folder (skipping ones already there); returns the paths in order"""
+        return self.fetch_tracks(session, [(playlist, folder)], headers, proxies, progress)[0]
+    
+    def fetch_tracks(self, session, tracks, headers=None, proxies=None, progress=None):
+        """Fetch several (playlist, folder) tracks at once through one pool of self.workers threads.
+        
+        Segments of the tracks are interleaved, so video and audio advance
+        together instead of one after the other. Returns a list of segment
+        paths, in order, for each track.
+        """
+        keys = {}
+        keys_lock = threading.Lock()
+        counter = {'done': 0, 'total': 0, 'bytes': 0}
+        counter_lock = threading.Lock()
+        
+        def key_for(segment):
+            with keys_lock:
+                if segment.key['uri'] not in keys:
+                    keys[segment.key['uri']] = self.fetch(session, segment.key['uri'], headers, proxies)
+                return keys[segment.key['uri']]
+        
+        def fetch_one(folder, index, segment):
+            path = os.path.join(folder, 'init.mp4' if segment.sequence < 0 else f"{index:06d}.seg")
+            if not os.path.exists(path):
+                data = self.fetch(session, segment.url, headers, proxies, segment.byte_range)
+                if segment.key:
+                    data = decrypt_aes128(data, key_for(segment), segment.key['iv'], segment.sequence)
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            with counter_lock:
+                counter['done'] += 1
+                counter['bytes'] += os.path.getsize(path)
+                if progress:
+                    # Total size isn't known up front - extrapolate from the average segment
+                    estimate = int(counter['bytes'] * counter['total'] / counter['done'])
+                    progress.update(counter['bytes'], estimate)
+            return path
+        
+        queues = []
+        for playlist, folder in tracks:
+            os.makedirs(folder, exist_ok=True)
+            jobs = [(folder, index, segment) for index, segment in enumerate(playlist.segments)]
+            if playlist.init:
+                jobs.insert(0, (folder, -1, playlist.init))
+            queues.append(jobs)
+        counter['total'] = sum(len(jobs) for jobs in queues)
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [[] for _ in queues]
+            for position in range(max(len(jobs) for jobs in queues)):
+                for track, jobs in enumerate(queues):
+                    if position < len(jobs):
+                        futures[track].append(pool.submit(fetch_one, *jobs[position]))
+            try:
+                return [[future.result() for future in track_futures] for track_futures in futures]
+            except Exception:
+                for track_futures in futures:
+                    for future in track_futures:
+                        future.cancel()
+                raise
+    
+    def join(self, paths, output_path):
+        """Concatenate segment files in order (what remux's ffmpeg reads, as one file)"""
+        with open(output_path, 'wb') as out:
+            for path in paths:
+                with open(path, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+    
+    def remux(self, tracks, filepath):
+        """One ffmpeg -c copy run over the segment paths of each track, written atomically to filepath"""
+        tmp_path = filepath + '.ffmpeg'
+        cmd = [ffmpeg_path(), '-y']
+        lists = []
+        for track, paths in enumerate(tracks):
+            # concatf: reads the files of a list one after the other, like a joined copy would hold them
+            list_path = f"{filepath}.track{track}.txt"
+            with open(list_path, 'w') as f:
+                f.write('\n'.join(os.path.abspath(path) for path in paths))
+            lists.append(list_path)
+            cmd += ['-i', f'concatf:{os.path.abspath(list_path)}']
+        if len(tracks) > 1:
+            cmd += ['-map', '0:v:0?', '-map', '1:a:0?']
+        cmd += ['-c', 'copy', '-bsf:a', 'aac_adtstoasc', '-f', 'mp4', tmp_path]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+            os.replace(tmp_path, filepath)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            for list_path in lists:
+                os.remove(list_path)
+    
+    def download(self, url, filepath, quality='best', headers=None, proxies=None, progress=None, session=None):
+        """Download the stream at url to filepath (mp4), over session if given (it is left open)"""
+        folder = self.work_folder(url, quality)
+        own_session = session is None
+        if own_session:
+            session = self.make_session()
+        try:
+            playlists = self.resolve(session, url, quality, headers, proxies)
+            tracks = [(playlist, os.path.join(folder, str(track))) for track, playlist in enumerate(playlists)]
+            track_paths = self.fetch_tracks(session, tracks, headers, proxies, progress)
+        finally:
+            if own_session:
+                session.close()
+        
+        if progress:
+            progress.stage('processing')
+        self.remux(track_paths, filepath)
+        shutil.rmtree(folder, ignore_errors=True)
+        return filepath
+
+def decrypt_aes128(data, key, iv, sequence):
+    """AES-128-CBC segment decryption; without an explicit IV the media sequence number is the IV"""
+    from Crypto.Cipher import AES
+    if iv:
+        iv_bytes = bytes.fromhex(iv[2:] if iv.lower().startswith('0x') else iv).rjust(16, b'\0')
+    else:
+        iv_bytes = sequence.to_bytes(16, 'big')
+    decrypted = AES.new(key, AES.MODE_CBC, iv_bytes).decrypt(data)
+    padding = decrypted[-1] if decrypted else 0
+    if 0 < padding <= 16 and decrypted.endswith(bytes([padding]) * padding):
+        decrypted = decrypted[:-padding]
+    return decrypted
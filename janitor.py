@@ -0,0 +1,246 @@
+import os
+import time
+import heapq
+import shutil
+import itertools
+import threading
+import config
+from download_cache import IN_PROGRESS_SUFFIXES
+from workspace import WORK_FOLDER
+
+# Folder of resumable partial downloads, under download_folder
+PARTIAL_FOLDER = '.partial'
+
+class Janitor:
+    """Deletes expired files and evicts cached downloads, on its own thread.
+    
+    Everything with an age limit sits in an expiry heap keyed by when it
+    becomes due: uploads (UPLOAD_MAX_AGE), partial downloads and orphaned
+    job workspaces (CLEANUP_AGE_HOURS). The thread sleeps until the
+    earliest one is due, looks at its mtime once more (a file still being
+    written is pushed back) and deletes it.
+    
+    Finished downloads have no age limit; they are the download cache.
+    Once downloads/ (partials and workspaces included) outgrows the cache's
+    max_bytes or the disk fills past DISK_HIGH_WATER the least recently
+    used ones are deleted down to the low-water marks.
+    
+    Every worker runs a janitor over the same folders, so sizes come from
+    the disk: scan() measures everything at start(), every
+    JANITOR_RESCAN_INTERVAL and again before anything is evicted. track()
+    only adds this worker's new files in between, and watch() schedules
+    a workspace as it is created and a failed job's partials right away.
+    """
+    
+    def __init__(self, download_folder, upload_folder, cache):
+        self.download_folder = download_folder
+        self.upload_folder = upload_folder
+        self.cache = cache
+        self.max_bytes = cache.max_bytes
+        self.files = {}  # name in download_folder -> (size, mtime)
+        self.total = 0
+        self.scratch = 0  # bytes in partials and workspaces
+        self.expiry = []  # (due, seq, path, max_age)
+        self.scheduled = set()  # paths in expiry
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.last_scan = 0
+        self.deleted = 0
+        self.evicted = 0
+    
+    def start(self):
+        threading.Thread(target=self.run, name='janitor', daemon=True).start()
+    
+    def track(self, names):
+        """Files just written to download_folder (by this worker); wakes the thread if they cross the budget"""
+        with self.cond:
+            for name in names:
+                self.add_file(name)
+            if self.total + self.scratch > self.max_bytes:
+                self.cond.notify()
+    
+    def watch(self, paths):
+        """Partials or a workspace under download_folder, new or left by a failed job: expire them after CLEANUP_AGE_HOURS"""
+        with self.cond:
+            for path in paths:
+                self.schedule(path, config.CLEANUP_AGE_HOURS * 3600)
+    
+    def stats(self):
+        with self.cond:
+            return {
+                'files': len(self.files),
+                'bytes': self.total,
+                'scratch_bytes': self.scratch,
+                'max_bytes': self.max_bytes,
+                'scheduled': len(self.expiry),
+                'next_due_in': round(self.expiry[0][0] - time.time(), 1) if self.expiry else None,
+                'deleted': self.deleted,
+                'evicted': self.evicted,
+            }
+    
+    def run(self):
+        while True:
+            try:
+                if time.time() - self.last_scan >= config.JANITOR_RESCAN_INTERVAL:
+                    self.scan()
+                self.expire_due()
+                self.enforce_high_water()
+            except Exception as e:
+                print(f"Janitor error: {e}")
+            with self.cond:
+                # Disk usage is checked at least once a minute; track() wakes it sooner
+                wait = 60 if not self.expiry else min(60, self.expiry[0][0] - time.time())
+                if wait > 0:
+                    self.cond.wait(wait)
+    
+    def scan(self):
+        """Rebuild the download index from the disk and schedule everything with an age limit"""
+        files = {}
+        due = []
+        scratch = 0
+        cleanup_age = config.CLEANUP_AGE_HOURS * 3600
+        for folder in (self.download_folder, self.upload_folder):
+            for name in (os.listdir(folder) if os.path.isdir(folder) else []):
+                path = os.path.join(folder, name)
+                if name in (PARTIAL_FOLDER, WORK_FOLDER):
+                    due.extend((os.path.join(path, entry), cleanup_age) for entry in os.listdir(path))
+                    scratch += folder_size(path)
+                elif name.startswith('.') or not os.path.isfile(path):
+                    continue
+                elif folder == self.upload_folder:
+                    due.append((path, config.UPLOAD_MAX_AGE))
+                else:
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files[name] = (stat.st_size, stat.st_mtime)
+        
+        with self.cond:
+            self.files = files
+            self.total = sum(size for size, _ in files.values())
+            self.scratch = scratch
+            for path, max_age in due:
+                self.schedule(path, max_age)
+            self.last_scan = time.time()
+    
+    def add_file(self, name):
+        """(caller holds cond)"""
+        try:
+            stat = os.stat(os.path.join(self.download_folder, name))
+        except OSError:
+            return
+        old_size = self.files.get(name, (0, 0))[0]
+        self.files[name] = (stat.st_size, stat.st_mtime)
+        self.total += stat.st_size - old_size
+    
+    def schedule(self, path, max_age):
+        """(caller holds cond)"""
+        if path in self.scheduled:
+            return
+        try:
+            mtime = newest_mtime(path)
+        except OSError:
+            return
+        heapq.heappush(self.expiry, (mtime + max_age, next(self.counter), path, max_age))
+        self.scheduled.add(path)
+    
+    def expire_due(self):
+        now = time.time()
+        while True:
+            with self.cond:
+                if not self.expiry or self.expiry[0][0] > now:
+                    return
+                _, _, path, max_age = heapq.heappop(self.expiry)
+                self.scheduled.discard(path)
+            try:
+                mtime = newest_mtime(path)
+            except OSError:
+                continue  # already gone
+            if mtime + max_age > now:
+                # Written to since it was scheduled (a resumed download, a live workspace)
+                with self.cond:
+                    self.schedule(path, max_age)
+                continue
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                continue
+            with self.cond:
+                self.deleted += 1
+    
+    def over_high_water(self):
+        return self.total + self.scratch > self.max_bytes or disk_used(self.download_folder) > config.DISK_HIGH_WATER
+    
+    def enforce_high_water(self):
+        """Delete least recently used downloads until both low-water marks are met"""
+        with self.cond:
+            if not self.over_high_water():
+                return
+        # Other workers may have evicted (or written) since the last scan; decide on what is on disk now
+        self.scan()
+        with self.cond:
+            if not self.over_high_water():
+                return
+            candidates = list(self.files.items())
+        last_access = self.cache.access_times()
+        now = time.time()
+        # Files the cache doesn't know about are aged by mtime; a fresh one may still be picked up by its job
+        candidates = sorted((last_access.get(name, mtime), name, size) for name, (size, mtime) in candidates
+                            if not name.endswith(IN_PROGRESS_SUFFIXES) and (name in last_access or now - mtime >= 600))
+        
+        # Scratch counts toward starting an eviction, but deleting downloads can't shrink it (expiry
+        # does), so only downloads are held to the target - otherwise a big scratch would take them all
+        target = self.max_bytes * config.CACHE_LOW_WATER
+        evicted = []
+        for _, name, size in candidates:
+            if self.total <= target and disk_used(self.download_folder) <= config.DISK_LOW_WATER:
+                break
+            try:
+                os.remove(os.path.join(self.download_folder, name))
+            except FileNotFoundError:
+                pass  # deleted by another worker's janitor
+            except OSError:
+                continue
+            with self.cond:
+                if self.files.pop(name, None) is not None:
+                    self.total -= size
+            evicted.append(name)
+        
+        if evicted:
+            self.cache.forget(evicted)
+            with self.cond:
+                self.evicted += len(evicted)
+            print(f"Janitor evicted {len(evicted)} downloads (now {self.total} bytes, "
+                  f"disk {disk_used(self.download_folder):.0%} full)")
+
+def newest_mtime(path):
+    """mtime of a file, or of the newest file inside a directory (a directory's own mtime misses writes deeper down)"""
+    mtime = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for folder, _, names in os.walk(path):
+            for name in names:
+                try:
+                    mtime = max(mtime, os.path.getmtime(os.path.join(folder, name)))
+                except OSError:
+                    pass
+    return mtime
+
+def folder_size(path):
+    """Bytes in the files under path"""
+    size = 0
+    for folder, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass
+    return size
+
+def disk_used(path):
+    """Fraction of the filesystem holding path that is in use"""
+    usage = shutil.disk_usage(path)
+    return usage.used / usage.total if usage.total else 0
@@ -0,0 +1,122 @@
+import bisect
+import itertools
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+import config
+
+# Lower runs first
+PRIORITY_SHORT = 0   # audio-only, small results
+PRIORITY_NORMAL = 1  # regular video downloads
+PRIORITY_BULK = 2    # multi-GB file hosts (Mega, Drive, archive.org)
+
+class QueueFull(Exception):
+    """The scheduler already holds max_queue waiting jobs"""
+
+class JobScheduler:
+    """Bounded worker pool with a priority queue and per-domain concurrency caps.
+    
+    Jobs wait in priority order (FIFO within a priority). A worker takes the
+    first waiting job whose domain pool still has a free slot, so a backlog
+    for one host doesn't hold up jobs for others.
+    """
+    
+    def __init__(self, max_workers=None, max_queue=None, domain_pools=None, domain_limits=None):
+        self.max_workers = max_workers or config.MAX_CONCURRENT_DOWNLOADS
+        self.max_queue = max_queue or config.MAX_QUEUED_DOWNLOADS
+        self.domain_pools = config.DOMAIN_POOLS if domain_pools is None else domain_pools
+        self.domain_limits = config.DOMAIN_CONCURRENCY if domain_limits is None else domain_limits
+        self.queue = []  # sorted (priority, seq, job_id, pool, func)
+        self.running = {}  # job_id -> pool
+        self.running_by_pool = defaultdict(int)
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.job_seconds = None  # moving average, used for Retry-After
+        
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self.worker_loop, name=f'download-worker-{i}', daemon=True)
+            thread.start()
+    
+    def pool_for(self, url):
+        """Name of the concurrency pool a URL's host belongs to, or None"""
+        host = (urlparse(url).hostname or '').lower()
+        while host:
+            if host in self.domain_pools:
+                return self.domain_pools[host]
+            if '.' not in host:
+                break
+            host = host.split('.', 1)[1]
+        return None
+    
+    def priority_for(self, url, audio_only=False):
+        """Audio extractions jump ahead, multi-GB file hosts wait behind regular videos"""
+        if audio_only:
+            return PRIORITY_SHORT
+        if self.pool_for(url) in config.BULK_POOLS:
+            return PRIORITY_BULK
+        return PRIORITY_NORMAL
+    
+    def submit(self, job_id, func, url, priority=PRIORITY_NORMAL):
+        """Queue func() to run on a worker; raises QueueFull when the queue is at capacity"""
+        pool = self.pool_for(url)
+        with self.cond:
+            if len(self.queue) >= self.max_queue:
+                raise QueueFull()
+            bisect.insort(self.queue, (priority, next(self.counter), job_id, pool, func))
+            self.cond.notify()
+    
+    def retry_after(self):
+        """Rough number of seconds until a queue slot frees up"""
+        with self.cond:
+            average = self.job_seconds or config.QUEUE_RETRY_AFTER
+        return max(5, int(average / self.max_workers))
+    
+    def has_capacity(self, pool):
+        if pool is None or pool not in self.domain_limits:
+            return True
+        return self.running_by_pool[pool] < self.domain_limits[pool]
+    
+    def take_next(self):
+        """Remove and return the first runnable queue entry (caller holds cond)"""
+        for i, entry in enumerate(self.queue):
+            if self.has_capacity(entry[3]):
+                return self.queue.pop(i)
+        return None
+    
+    def worker_loop(self):
+        while True:
+            with self.cond:
+                entry = self.take_next()
+                while entry is None:
+                    self.cond.wait()
+                    entry = self.take_next()
+                _, _, job_id, pool, func = entry
+                self.running[job_id] = pool
+                if pool:
+                    self.running_by_pool[pool] += 1
+            
+            started = time.time()
+            try:
+                func()
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+            finally:
+                with self.cond:
+                    self.running.pop(job_id, None)
+                    if pool:
+                        self.running_by_pool[pool] -= 1
+                    elapsed = time.time() - started
+                    self.job_seconds = elapsed if self.job_seconds is None else 0.8 * self.job_seconds + 0.2 * elapsed
+                    # A freed pool slot may unblock a job another worker skipped
+                    self.cond.notify_all()
+    
+    def stats(self):
+        with self.cond:
+            return {
+                'workers': self.max_workers,
+                'running': len(self.running),
+                'queued': len(self.queue),
+                'max_queue': self.max_queue,
+                'running_by_pool': {k: v for k, v in self.running_by_pool.items() if v}
+            }
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import config
+
+FINISHED_STATUSES = ('completed', 'error')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    flight_key TEXT,
+    follows TEXT,
+    owner TEXT,
+    priority INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_follows ON jobs (follows);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_flight ON jobs (flight_key)
+    WHERE follows IS NULL AND status IN ('queued', 'processing');
+"""
+
+class JobStore:
+    """Download job records in SQLite (WAL mode), shared by all gunicorn workers.
+    
+    Each record has a status, an optional single-flight key and a JSON blob
+    with everything else (file, message, progress...). Finished jobs expire
+    after ttl seconds.
+    """
+    
+    def __init__(self, path=None, ttl=None):
+        self.path = path or config.JOB_DB_PATH
+        self.ttl = ttl or config.JOB_TTL
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.local = threading.local()
+        self.last_expire = 0
+        self.changed = threading.Condition()  # notified on every write from this process
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        
+        conn = self.connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        self.recover_orphans()
+    
+    def connect(self):
+        """One connection per thread"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=10000')
+            self.local.conn = conn
+        return conn
+    
+    def new_id(self):
+        return uuid.uuid4().hex
+    
+    def create(self, job_id, status='queued', flight_key=None, priority=1, **fields):
+        now = time.time()
+        self.connect().execute(
+            'INSERT INTO jobs (id, status, flight_key, owner, priority, data, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, status, flight_key, self.owner, priority, json.dumps(fields), now, now))
+        self.expire_if_due()
+    
+    def join_flight(self, flight_key, job_id, priority=1, attempts=3):
+        """Create job_id as the leader for flight_key, or attach it to the running leader.
+        
+        Returns the leader's id when job_id was attached, None when job_id is
+        the new leader. The partial unique index makes this safe across processes.
+        If leaders keep finishing in between, after attempts tries job_id runs
+        on its own, outside the flight.
+        """
+        for _ in range(attempts):
+            try:
+                self.create(job_id, 'queued', flight_key=flight_key, priority=priority)
+                return None
+            except sqlite3.IntegrityError:
+                pass
+            
+            row = self.connect().execute(
+                "SELECT id FROM jobs WHERE flight_key = ? AND follows IS NULL AND status IN ('queued', 'processing')",
+                (flight_key,)).fetchone()
+            if row is None:
+                continue  # leader finished in between - try to lead again
+            
+            now = time.time()
+            self.connect().execute(
+                'INSERT INTO jobs (id, status, flight_key, follows, owner, priority, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', flight_key, row['id'], self.owner, priority, now, now))
+            return row['id']
+        
+        self.create(job_id, 'queued', priority=priority)
+        return None
+    
+    def update(self, job_id, status=None, replace=False, **fields):
+        """Merge fields into the job's data (or replace it) and optionally change status"""
+        conn = self.connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT status, data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                conn.execute('ROLLBACK')
+                return
+            data = {} if replace else json.loads(row['data'])
+            data.update(fields)
+            new_status = status or row['status']
+            expires_at = now + self.ttl if new_status in FINISHED_STATUSES else None
+            conn.execute('UPDATE jobs SET status = ?, data = ?, updated_at = ?, expires_at = ? WHERE id = ?',
+                         (new_status, json.dumps(data), now, expires_at, job_id))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.notify()
+    
+    def finish(self, job_id, status, **fields):
+        """Set the final status of a leader and copy it to every job attached to it"""
+        self.update(job_id, status, replace=True, **fields)
+        now = time.time()
+        self.connect().execute(
+            'UPDATE jobs SET status = ?, data = ?, updated_at = ?, expires_at = ? WHERE follows = ?',
+            (status, json.dumps(fields), now, now + self.ttl, job_id))
+        self.notify()
+    
+    def notify(self):
+        with self.changed:
+            self.changed.notify_all()
+    
+    def wait_for_change(self, timeout):
+        """Block until a job is written by this process, or timeout (writes from other workers aren't seen)"""
+        with self.changed:
+            self.changed.wait(timeout)
+    
+    def get(self, job_id):
+        """Job as a dict ({'status': ...} plus its data), or None"""
+        row = self.connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row['data'])
+        job['status'] = row['status']
+        if row['follows']:
+            job['follows'] = row['follows']
+        return job
+    
+    def queue_position(self, job_id):
+        """1-based place among this worker's queued jobs, in scheduling order"""
+        row = self.connect().execute(
+            "SELECT COUNT(*) + 1 AS position FROM jobs AS other, jobs AS job "
+            "WHERE job.id = ? AND other.status = 'queued' AND other.follows IS NULL AND other.owner = job.owner "
+            "AND (other.priority < job.priority OR (other.priority = job.priority AND other.created_at < job.created_at))",
+            (job_id,)).fetchone()
+        return row['position'] if row else None
+    
+    def count(self, status):
+        """Downloads with status; attached jobs and batch records (kind='batch', they only track their items) don't count"""
+        row = self.connect().execute(
+            "SELECT COUNT(*) AS n FROM jobs WHERE status = ? AND follows IS NULL "
+            "AND json_extract(data, '$.kind') IS NOT 'batch'", (status,)).fetchone()
+        return row['n']
+    
+    def expire_if_due(self):
+        """Delete expired jobs, at most once a minute"""
+        now = time.time()
+        if now - self.last_expire < 60:
+            return
+        self.last_expire = now
+        self.connect().execute('DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?', (now,))
+    
+    def recover_orphans(self):
+        """Fail active jobs whose worker process is gone, so their flight key is released"""
+        conn = self.connect()
+        host = socket.gethostname()
+        rows = conn.execute(
+            "SELECT id, owner, updated_at FROM jobs WHERE status IN ('queued', 'processing') AND follows IS NULL").fetchall()
+        stale_before = time.time() - config.JOB_STALE_SECONDS
+        for row in rows:
+            owner_host, _, pid = (row['owner'] or '').rpartition(':')
+            orphaned = row['updated_at'] < stale_before
+            if owner_host == host and pid.isdigit() and int(pid) != os.getpid():
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    orphaned = True
+                except PermissionError:
+                    pass
+            if orphaned:
+                self.finish(row['id'], 'error', message='Download was interrupted by a server restart. Please try again.',
+                            timestamp=time.time())
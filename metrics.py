@@ -0,0 +1,205 @@
+import math
+import itertools
+import threading
+
+# Upper bounds (seconds) of the histogram buckets; +Inf is always added
+JOB_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Independent slots per metric; a thread always lands in the same one
+SHARDS = 16
+
+# Slot of each thread, handed out round-robin on its first recording (thread
+# idents are aligned addresses, so ident % SHARDS would put them all in slot 0)
+thread_slot = threading.local()
+next_slot = itertools.count()
+
+class Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}  # label values tuple -> float (counter) or [bucket counts..., sum] (histogram)
+
+class Metric:
+    """Values of one metric, spread over SHARDS slots picked by thread id.
+    
+    Recording takes only the lock of the calling thread's slot, which the
+    other threads rarely hold, so download workers don't queue up
+    behind each other; the slots are only added up when /metrics is read.
+    """
+    
+    kind = None
+    
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.shards = [Shard() for _ in range(SHARDS)]
+    
+    def shard(self):
+        return self.shards[shard_index()]
+    
+    def collect(self):
+        """{label values: value} summed over the shards"""
+        total = {}
+        for shard in self.shards:
+            with shard.lock:
+                values = {key: list(value) if isinstance(value, list) else value
+                          for key, value in shard.values.items()}
+            for key, value in values.items():
+                if key not in total:
+                    total[key] = value
+                elif isinstance(value, list):
+                    total[key] = [a + b for a, b in zip(total[key], value)]
+                else:
+                    total[key] += value
+        return total
+    
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, *label_values, amount=1):
+        shard = self.shard()
+        with shard.lock:
+            shard.values[label_values] = shard.values.get(label_values, 0) + amount
+    
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {format_value(value)}")
+        return lines
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name, help, labels=(), buckets=JOB_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, *label_values, value):
+        # Per-bucket (not cumulative) counts: one increment per observation
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        shard = self.shard()
+        with shard.lock:
+            counts = shard.values.get(label_values)
+            if counts is None:
+                counts = shard.values[label_values] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+    
+    def render(self):
+        lines = self.header()
+        for key, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = format_labels(self.labels + ('le',), key + (format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Gauge(Metric):
+    """Read from read() when /metrics is served; read returns a number or {label values: number}"""
+    
+    kind = 'gauge'
+    
+    def __init__(self, name, help, read, labels=()):
+        super().__init__(name, help, labels)
+        self.read = read
+    
+    def render(self):
+        lines = self.header()
+        try:
+            values = self.read()
+        except Exception as e:
+            print(f"Metric {self.name} unavailable: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {format_value(value)}")
+        return lines
+
+class Registry:
+    """Every metric of this process, rendered in the Prometheus text format.
+    
+    Each gunicorn worker keeps its own numbers, like /admin/proxies.
+    """
+    
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+    
+    def register(self, metric):
+        with self.lock:
+            self.metrics = [m for m in self.metrics if m.name != metric.name] + [metric]
+        return metric
+    
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+    
+    def histogram(self, name, help, labels=(), buckets=JOB_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+    
+    def gauge(self, name, help, read, labels=()):
+        return self.register(Gauge(name, help, read, labels))
+    
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def shard_index():
+    index = getattr(thread_slot, 'index', None)
+    if index is None:
+        index = thread_slot.index = next(next_slot) % SHARDS  # count() is atomic under the GIL
+    return index
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+REGISTRY = Registry()
+
+# Downloads, labelled by the DownloadManager handler that ran and how it ended (ok/error)
+JOB_SECONDS = REGISTRY.histogram('download_job_seconds', 'Whole download job, from dispatch until the files are stored',
+                                 ('handler', 'result'))
+EXTRACT_SECONDS = REGISTRY.histogram('download_extract_seconds', 'Resolving the media before the first byte arrives',
+                                     ('handler', 'result'))
+TRANSFER_SECONDS = REGISTRY.histogram('download_transfer_seconds', 'Fetching the media, first byte to last',
+                                      ('handler', 'result'))
+POSTPROCESS_SECONDS = REGISTRY.histogram('download_postprocess_seconds', 'Merging/remuxing after the transfer',
+                                         ('handler', 'result'))
+BYTES = REGISTRY.counter('download_bytes_total', 'Bytes fetched by download jobs', ('handler', 'result'))
+CACHE_HITS = REGISTRY.counter('download_cache_hits_total', 'Downloads answered from the download cache')
+
+# Proxies, over all proxies (ok, failed or released: the error wasn't the proxy's fault)
+PROXY_RESULTS = REGISTRY.counter('proxy_jobs_total', 'Download jobs by how they went on their proxy', ('result',))
+
+# Video tools
+FFMPEG_SECONDS = REGISTRY.histogram('ffmpeg_job_seconds', 'ffmpeg runs of the video tools', ('operation', 'result'))
+
+# Username finder
+USERNAME_CHECK_SECONDS = REGISTRY.histogram('username_check_seconds', 'One profile lookup', ('platform', 'result'),
+                                            buckets=REQUEST_BUCKETS)
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import config
+
+# Latencies kept per proxy; the median of these ranks working proxies
+LATENCY_HISTORY = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxies (
+    proxy TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_checked REAL,
+    last_success REAL,
+    failure_streak INTEGER NOT NULL DEFAULT 0,
+    checks INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    latency REAL,
+    latency_history TEXT NOT NULL DEFAULT '[]',
+    anonymity TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_proxies_checked ON proxies (last_checked);
+CREATE INDEX IF NOT EXISTS idx_proxies_streak ON proxies (failure_streak);
+"""
+
+class ProxyDB:
+    """Everything the proxy refreshes have learned, kept in SQLite between runs.
+    
+    A row per candidate (ip:port) a source has ever listed: when it was
+    first and last listed, when it was last checked and last worked, its
+    current failure streak and its recent latencies. due_for_check() picks
+    the candidates a refresh actually has to test, so known-good proxies
+    aren't re-tested every time and dead ones only rarely.
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or config.PROXY_DB_PATH
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self.connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+    
+    def connect(self):
+        """One connection per thread"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+    
+    def add_candidates(self, proxies):
+        """Record that the sources listed proxies now; returns how many were never seen before"""
+        conn = self.connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = conn.execute('SELECT COUNT(*) FROM proxies').fetchone()[0]
+            conn.executemany(
+                'INSERT INTO proxies (proxy, first_seen, last_seen) VALUES (?, ?, ?) '
+                'ON CONFLICT (proxy) DO UPDATE SET last_seen = excluded.last_seen',
+                ((proxy, now, now) for proxy in proxies))
+            after = conn.execute('SELECT COUNT(*) FROM proxies').fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return after - before
+    
+    def due_for_check(self, limit=None):
+        """Proxies a refresh should test, most useful first.
+        
+        New candidates, borderline ones (failed recently, or slow), working
+        ones not checked for PROXY_STALE_AFTER, and dead ones (a streak of
+        PROXY_DEAD_STREAK failures) once every PROXY_DEAD_RETRY.
+        """
+        now = time.time()
+        rows = self.connect().execute(
+            """SELECT proxy FROM proxies WHERE
+                   last_checked IS NULL
+                   OR (failure_streak > 0 AND failure_streak < :dead)
+                   OR (failure_streak = 0 AND latency > :slow)
+                   OR (failure_streak < :dead AND last_checked < :stale)
+                   OR (failure_streak >= :dead AND last_checked < :dead_retry)
+               ORDER BY last_checked IS NOT NULL, failure_streak, last_checked
+               LIMIT :limit""",
+            {'dead': config.PROXY_DEAD_STREAK, 'slow': config.PROXY_TIMEOUT / 2,
+             'stale': now - config.PROXY_STALE_AFTER, 'dead_retry': now - config.PROXY_DEAD_RETRY,
+             'limit': limit or -1}).fetchall()
+        return [row['proxy'] for row in rows]
+    
+    def record(self, checks):
+        """Store a batch of ProxyChecks in one transaction"""
+        conn = self.connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for check in checks:
+                row = conn.execute('SELECT latency_history FROM proxies WHERE proxy = ?', (check.proxy,)).fetchone()
+                if row is None:
+                    continue
+                if check.ok:
+                    history = (json.loads(row['latency_history']) + [round(check.latency, 3)])[-LATENCY_HISTORY:]
+                    conn.execute(
+                        'UPDATE proxies SET last_checked = ?, last_success = ?, failure_streak = 0, '
+                        'checks = checks + 1, successes = successes + 1, latency = ?, latency_history = ?, '
+                        'anonymity = ? WHERE proxy = ?',
+                        (now, now, median(history), json.dumps(history), check.anonymity, check.proxy))
+                else:
+                    conn.execute(
+                        'UPDATE proxies SET last_checked = ?, failure_streak = failure_streak + 1, '
+                        'checks = checks + 1 WHERE proxy = ?',
+                        (now, check.proxy))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    
+    def working(self, limit=None):
+        """Proxies whose last check passed, fastest first"""
+        rows = self.connect().execute(
+            'SELECT proxy FROM proxies WHERE failure_streak = 0 AND last_success IS NOT NULL '
+            'ORDER BY latency LIMIT ?', (limit or -1,)).fetchall()
+        return [row['proxy'] for row in rows]
+    
+    def forget_dead(self):
+        """Delete dead proxies that no source has listed for PROXY_FORGET_AFTER; returns how many"""
+        cursor = self.connect().execute(
+            'DELETE FROM proxies WHERE failure_streak >= ? AND last_seen < ?',
+            (config.PROXY_DEAD_STREAK, time.time() - config.PROXY_FORGET_AFTER))
+        return cursor.rowcount
+    
+    def stats(self):
+        row = self.connect().execute(
+            'SELECT COUNT(*) AS total, '
+            'SUM(failure_streak = 0 AND last_success IS NOT NULL) AS working, '
+            'SUM(failure_streak >= ?) AS dead, '
+            'SUM(last_checked IS NULL) AS unchecked FROM proxies',
+            (config.PROXY_DEAD_STREAK,)).fetchone()
+        return {key: row[key] or 0 for key in row.keys()}
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
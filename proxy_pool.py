@@ -0,0 +1,231 @@
+import os
+import time
+import random
+import threading
+import requests
+import config
+
+# Words in an error message (yt-dlp and the handlers pass errors on as text)
+# that point at the connection rather than the site or the URL
+NETWORK_ERROR_HINTS = ('timed out', 'timeout', 'proxy', 'tunnel', 'connection', 'reset by peer',
+                       'remote end closed', 'network is unreachable', 'name resolution')
+
+class ProxyHealth:
+    """What real downloads have shown about one proxy"""
+    
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None  # EWMA seconds until the first byte arrived
+        self.throughput = None  # EWMA bytes/s over whole downloads
+        self.in_flight = 0
+        self.state = 'closed'  # circuit breaker: closed (in use), open (benched), probing
+        self.opened_at = None
+        self.last_used = None
+    
+    def success_rate(self):
+        # Laplace smoothing, so an untried proxy starts at 0.5 instead of 0 or 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+    
+    def score(self, default_throughput):
+        """Expected useful bytes/s for the next job; higher is better"""
+        throughput = self.throughput if self.throughput is not None else default_throughput
+        return self.success_rate() * throughput / (1 + self.in_flight)
+    
+    def to_dict(self):
+        return {
+            'proxy': self.proxy,
+            'state': self.state,
+            'successes': self.successes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'success_rate': round(self.success_rate(), 3),
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'throughput': int(self.throughput) if self.throughput is not None else None,
+            'in_flight': self.in_flight,
+            'last_used': self.last_used,
+        }
+
+class ProxyPool:
+    """Picks proxies by observed health instead of uniformly at random.
+    
+    choose() takes two random candidates and returns the one with the better
+    score (success rate x throughput, shared out over jobs already running
+    on it) - the "power of two choices", which keeps load spread while
+    steering away from slow proxies. Untried proxies are scored at the
+    median throughput so they get a fair first chance.
+    
+    After failure_threshold failures in a row a proxy's circuit opens and
+    it gets no jobs. Once cooldown seconds have passed, the next choose()
+    starts a background probe through it; success brings it back, failure
+    benches it for another cooldown.
+    """
+    
+    def __init__(self, proxies, failure_threshold=None, cooldown=None, probe_url=None, probe_timeout=None):
+        self.failure_threshold = failure_threshold or config.PROXY_FAILURE_THRESHOLD
+        self.cooldown = cooldown or config.PROXY_COOLDOWN
+        self.probe_url = probe_url or config.PROXY_PROBE_URL
+        self.probe_timeout = probe_timeout or config.PROXY_TIMEOUT
+        self.health = {proxy: ProxyHealth(proxy) for proxy in proxies}
+        self.lock = threading.Lock()
+    
+    def proxies(self):
+        return list(self.health)
+    
+    def replace(self, proxies):
+        """Swap in a new proxy list; proxies that stay keep their history"""
+        with self.lock:
+            current = self.health
+            self.health = {proxy: current.get(proxy) or ProxyHealth(proxy) for proxy in proxies}
+        kept = sum(1 for proxy in proxies if proxy in current)
+        print(f"Proxy list reloaded: {len(proxies)} proxies ({kept} kept their stats, {len(proxies) - kept} new)")
+    
+    def choose(self):
+        """A proxy for the next job (None = direct connection); pair with succeeded/failed/released"""
+        to_probe = []
+        with self.lock:
+            now = time.time()
+            available = []
+            for health in self.health.values():
+                if health.state == 'open' and now - health.opened_at >= self.cooldown:
+                    health.state = 'probing'
+                    to_probe.append(health.proxy)
+                if health.state == 'closed':
+                    available.append(health)
+            if not available:
+                # Every circuit is open - fall back to the least recently benched instead of failing the job
+                available = [min(self.health.values(), key=lambda h: h.opened_at or 0)]
+            
+            default_throughput = self.median_throughput()
+            candidates = random.sample(available, min(2, len(available)))
+            chosen = max(candidates, key=lambda h: h.score(default_throughput))
+            chosen.in_flight += 1
+            chosen.last_used = now
+        
+        for proxy in to_probe:
+            threading.Thread(target=self.probe, args=(proxy,), daemon=True).start()
+        return chosen.proxy
+    
+    def median_throughput(self):
+        """Median known throughput (caller holds lock); 1 until anything is known"""
+        known = sorted(h.throughput for h in self.health.values() if h.throughput is not None)
+        return known[len(known) // 2] if known else 1
+    
+    def succeeded(self, proxy, seconds, nbytes, latency=None):
+        with self.lock:
+            health = self.health.get(proxy)
+            if health is None:
+                return  # dropped from the list while the job ran
+            health.in_flight = max(0, health.in_flight - 1)
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.state = 'closed'
+            if nbytes and seconds > 0:
+                health.throughput = ewma(health.throughput, nbytes / seconds)
+            if latency is not None:
+                health.latency = ewma(health.latency, latency)
+    
+    def failed(self, proxy):
+        with self.lock:
+            health = self.health.get(proxy)
+            if health is None:
+                return
+            health.in_flight = max(0, health.in_flight - 1)
+            health.failures += 1
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.failure_threshold and health.state == 'closed':
+                health.state = 'open'
+                health.opened_at = time.time()
+                print(f"Proxy {proxy} failed {health.consecutive_failures} times in a row, benched for {self.cooldown}s")
+    
+    def released(self, proxy):
+        """The job ended without saying anything about the proxy (e.g. the video doesn't exist)"""
+        with self.lock:
+            health = self.health.get(proxy)
+            if health is not None:
+                health.in_flight = max(0, health.in_flight - 1)
+    
+    def probe(self, proxy):
+        """Cooldown check for a benched proxy: one small request through it"""
+        started = time.time()
+        try:
+            response = requests.get(self.probe_url, proxies={'http': proxy, 'https': proxy},
+                                    timeout=self.probe_timeout, stream=True)
+            response.close()
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException:
+            ok = False
+        
+        with self.lock:
+            health = self.health.get(proxy)
+            if health is None:
+                return
+            if ok:
+                health.state = 'closed'
+                health.consecutive_failures = 0
+                health.latency = ewma(health.latency, time.time() - started)
+                print(f"Proxy {proxy} passed its cooldown probe, back in rotation")
+            else:
+                health.state = 'open'
+                health.opened_at = time.time()
+    
+    def stats(self):
+        with self.lock:
+            proxies = [health.to_dict() for health in self.health.values()]
+        states = [p['state'] for p in proxies]
+        return {
+            'total': len(proxies),
+            'closed': states.count('closed'),
+            'open': states.count('open'),
+            'probing': states.count('probing'),
+            'proxies': sorted(proxies, key=lambda p: (p['state'] != 'closed', -p['success_rate'])),
+        }
+
+class ProxyFileWatcher:
+    """Background thread that reloads the proxy list when its file changes.
+    
+    Polls the file's mtime/size/inode every interval seconds and calls
+    on_change() when any of them moves, so jobs never touch the file.
+    The updaters write the file to a temp name and rename it into place,
+    so a change is always a complete list.
+    """
+    
+    def __init__(self, path, on_change, interval=None):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval or config.PROXY_RELOAD_INTERVAL
+        self.signature = self.file_signature()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size, stat.st_ino
+        except OSError:
+            return None
+    
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            signature = self.file_signature()
+            if signature == self.signature:
+                continue
+            self.signature = signature
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"Error reloading {self.path}: {e}")
+
+def is_network_error(error):
+    """True if error looks like the connection (and so maybe the proxy) failed"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          ConnectionError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(hint in message for hint in NETWORK_ERROR_HINTS)
+
+def ewma(previous, sample, weight=0.3):
+    return sample if previous is None else (1 - weight) * previous + weight * sample
@@ -1,8 +1,27 @@
 import requests
 import re
+import os
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import socket
+import config
+from proxy_validator import ProxyValidator
+from proxy_db import ProxyDB
+
+def write_proxy_file(lines, filename=None):
+    """Replace the proxy file in one step (temp file + rename), so running workers never read half a list"""
+    filename = filename or config.PROXY_FILE
+    folder = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix='.proxies-', suffix='.tmp', dir=folder)
+    try:
+        os.chmod(tmp_path, 0o644)  # mkstemp creates it owner-only
+        with os.fdopen(fd, 'w') as f:
+            f.writelines(line + '\n' for line in lines)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
 
 class ProxyScraper:
     def __init__(self):
@@ -14,6 +33,7 @@ class ProxyScraper:
             'https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/http.txt',
             'https://raw.githubusercontent.com/clarketm/proxy-list/master/proxy-list-raw.txt',
         ]
+        self.checks = {}  # proxy -> ProxyCheck from the last scrape_proxies
         
     def fetch_from_source(self, url):
         try:
@@ -27,7 +47,7 @@ class ProxyScraper:
     
     def test_proxy(self, proxy, timeout=3):
         try:
-            test_url = 'http://www.google.com'
+            test_url = config.PROXY_TEST_URL
             proxies = {
                 'http': f'http://{proxy}',
                 'https': f'http://{proxy}'
@@ -37,7 +57,8 @@ class ProxyScraper:
         except:
             return None
     
-    def scrape_proxies(self, test=True, max_test=50):
+    def fetch_candidates(self):
+        """Unique ip:port candidates from every source"""
         print("🔍 Fetching proxies from multiple sources...")
         all_proxies = []
         
@@ -48,45 +69,82 @@ class ProxyScraper:
         
         all_proxies = list(set(all_proxies))
         print(f"✅ Found {len(all_proxies)} unique proxies")
+        return all_proxies
+    
+    def refresh(self, db, max_test=None):
+        """Incremental update of a ProxyDB: only new, borderline and stale candidates are tested.
+        
+        Returns the working proxies, fastest first (or [None] if there are none).
+        """
+        new = db.add_candidates(self.fetch_candidates())
+        due = db.due_for_check(max_test or config.MAX_PROXY_TEST)
+        print(f"🧪 Testing {len(due)} proxies ({new} new, the rest stale or borderline) against {config.PROXY_TEST_URL}...")
+        
+        batch = []
+        passed = 0
+        for check in ProxyValidator().iter_checks(due):
+            batch.append(check)
+            passed += check.ok
+            if len(batch) >= 500:
+                db.record(batch)
+                batch = []
+        db.record(batch)
+        forgotten = db.forget_dead()
+        
+        working = db.working()
+        print(f"✅ {passed} of {len(due)} tested proxies passed, {len(working)} known working "
+              f"({forgotten} long-dead proxies forgotten)")
+        return working if working else [None]
+    
+    def scrape_proxies(self, test=True, max_test=None, on_working=None):
+        """Harvest candidates from every source and, if test, keep the ones that work.
+        
+        Up to max_test candidates (default MAX_PROXY_TEST) are validated
+        concurrently by ProxyValidator; on_working(ProxyCheck) is called for
+        each one as soon as it passes. Working proxies come back fastest
+        first, and their checks stay in self.checks.
+        """
+        all_proxies = self.fetch_candidates()
         
         if test and all_proxies:
-            print(f"🧪 Testing proxies (max {max_test})...")
-            working_proxies = []
+            max_test = max_test or config.MAX_PROXY_TEST
             test_proxies = all_proxies[:max_test]
+            print(f"🧪 Testing {len(test_proxies)} proxies against {config.PROXY_TEST_URL}...")
+            self.checks = {}
             
-            with ThreadPoolExecutor(max_workers=30) as executor:
-                future_to_proxy = {executor.submit(self.test_proxy, proxy): proxy for proxy in test_proxies}
-                for future in as_completed(future_to_proxy):
-                    result = future.result()
-                    if result:
-                        working_proxies.append(result)
-                        print(f"✓ Working: {result}")
+            for check in ProxyValidator().iter_working(test_proxies):
+                self.checks[check.proxy] = check
+                print(f"✓ Working: {check.proxy} ({check.latency:.2f}s, {check.anonymity})")
+                if on_working:
+                    on_working(check)
             
+            working_proxies = sorted(self.checks, key=lambda proxy: self.checks[proxy].latency)
             print(f"✅ {len(working_proxies)} working proxies found")
             return working_proxies if working_proxies else [None]
         
         return all_proxies if all_proxies else [None]
     
-    def save_proxies(self, proxies, filename='proxies.txt'):
-        with open(filename, 'w') as f:
-            f.write("# Auto-generated proxy list\n")
-            f.write(f"# Generated at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"# Total proxies: {len(proxies)}\n\n")
-            for proxy in proxies:
-                f.write(f"http://{proxy}\n")
+    def save_proxies(self, proxies, filename=None):
+        filename = filename or config.PROXY_FILE
+        proxies = [proxy for proxy in proxies if proxy]  # [None] means "none found"
+        write_proxy_file([
+            "# Auto-generated proxy list",
+            f"# Generated at: {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"# Total proxies: {len(proxies)}",
+            "",
+        ] + [f"http://{proxy}" for proxy in proxies], filename)
         print(f"💾 Saved {len(proxies)} proxies to {filename}")
 
 def main():
     scraper = ProxyScraper()
-    proxies = scraper.scrape_proxies(test=True, max_test=100)
+    proxies = scraper.refresh(ProxyDB())
     
     if proxies and proxies != [None]:
         scraper.save_proxies(proxies)
         print("\n✅ Proxy list updated successfully!")
     else:
         print("\n⚠️ No working proxies found. Using direct connection.")
-        with open('proxies.txt', 'w') as f:
-            f.write("# No proxies available - using direct connection\n")
+        write_proxy_file(["# No proxies available - using direct connection"])
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,192 @@
+import re
+import ssl
+import json
+import time
+import queue
+import asyncio
+import threading
+from urllib.parse import urlsplit
+import config
+
+# A proxy that cuts the answer short or sends a runaway header line
+READ_ERRORS = (asyncio.IncompleteReadError, asyncio.LimitOverrunError, EOFError)
+
+# Request headers a proxy adds that give away that a proxy is in the path
+PROXY_HEADERS = ('via', 'x-forwarded-for', 'forwarded', 'x-real-ip', 'proxy-connection', 'x-proxy-id')
+
+class ProxyCheck:
+    """Outcome of testing one proxy candidate"""
+    
+    def __init__(self, proxy, ok, latency=None, anonymity=None, error=None):
+        self.proxy = proxy
+        self.ok = ok
+        self.latency = latency  # seconds for the whole test request
+        self.anonymity = anonymity  # transparent, anonymous, elite or unknown
+        self.error = error
+    
+    def __repr__(self):
+        if self.ok:
+            return f"ProxyCheck({self.proxy}, {self.latency:.2f}s, {self.anonymity})"
+        return f"ProxyCheck({self.proxy}, failed: {self.error})"
+
+class ProxyValidator:
+    """Tests proxy candidates concurrently on one asyncio event loop.
+    
+    Each candidate (ip:port, an HTTP proxy) fetches test_url: plain http
+    is sent to the proxy in absolute form, https goes through CONNECT and
+    TLS. At most concurrency tests run at once, so tens of thousands of
+    candidates cost that many sockets rather than that many threads.
+    
+    test_url should echo the request back, like httpbin.org/get; the echo
+    decides the anonymity level. Our own address showing up means
+    transparent, proxy headers without it anonymous, neither elite.
+    """
+    
+    def __init__(self, test_url=None, timeout=None, concurrency=None):
+        self.test_url = test_url or config.PROXY_TEST_URL
+        self.timeout = timeout or config.PROXY_TIMEOUT
+        self.concurrency = concurrency or config.PROXY_TEST_CONCURRENCY
+        self.own_ips = set()
+    
+    async def stream(self, candidates):
+        """Async generator of ProxyCheck for every candidate, in the order the tests finish"""
+        await self.learn_own_ip()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def bounded(proxy):
+            async with semaphore:
+                return await self.check(proxy)
+        
+        # Tasks are created in batches so a huge candidate list doesn't sit in memory as pending tasks
+        candidates = iter(candidates)
+        pending = set()
+        while True:
+            for proxy in candidates:
+                pending.add(asyncio.ensure_future(bounded(proxy)))
+                if len(pending) >= self.concurrency * 2:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    
+    def iter_working(self, candidates):
+        """Blocking generator of working ProxyChecks as they pass"""
+        return self.iter_checks(candidates, working_only=True)
+    
+    def iter_checks(self, candidates, working_only=False):
+        """Blocking generator of ProxyChecks as tests finish; the event loop runs on its own thread"""
+        results = queue.Queue(maxsize=1000)
+        finished = object()
+        
+        async def produce():
+            async for result in self.stream(candidates):
+                if result.ok or not working_only:
+                    await asyncio.get_running_loop().run_in_executor(None, results.put, result)
+        
+        def run():
+            try:
+                asyncio.run(produce())
+            except Exception as e:
+                print(f"Proxy validation stopped: {e}")
+            finally:
+                results.put(finished)
+        
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            result = results.get()
+            if result is finished:
+                return
+            yield result
+    
+    async def learn_own_ip(self):
+        """Fetch test_url directly once, so a proxy that leaks our address can be recognised"""
+        try:
+            body = await asyncio.wait_for(self.fetch(None), self.timeout * 2)
+            self.own_ips = set(re.findall(r'\d+\.\d+\.\d+\.\d+', echoed_origin(body)))
+        except (OSError, asyncio.TimeoutError, ValueError) + READ_ERRORS as e:
+            print(f"Couldn't fetch {self.test_url} directly ({e}), transparent proxies won't be detected")
+    
+    async def check(self, proxy):
+        started = time.perf_counter()
+        try:
+            body = await asyncio.wait_for(self.fetch(proxy), self.timeout)
+        except asyncio.TimeoutError:
+            return ProxyCheck(proxy, False, error='timeout')
+        except (OSError, ValueError, ssl.SSLError) + READ_ERRORS as e:
+            return ProxyCheck(proxy, False, error=str(e) or type(e).__name__)
+        return ProxyCheck(proxy, True, time.perf_counter() - started, self.anonymity(body))
+    
+    async def fetch(self, proxy):
+        """Body of a 200 response for test_url, through proxy (ip:port) or directly when proxy is None"""
+        url = urlsplit(self.test_url)
+        secure = url.scheme == 'https'
+        port = url.port or (443 if secure else 80)
+        target = url.path or '/'
+        if url.query:
+            target += '?' + url.query
+        
+        if proxy is None:
+            reader, writer = await asyncio.open_connection(url.hostname, port, ssl=secure or None)
+        else:
+            host, _, proxy_port = proxy.rpartition(':')
+            reader, writer = await asyncio.open_connection(host, int(proxy_port))
+        try:
+            if proxy is not None and secure:
+                writer.write(f'CONNECT {url.hostname}:{port} HTTP/1.1\r\nHost: {url.hostname}:{port}\r\n\r\n'.encode())
+                status, _ = await read_head(reader)
+                if status != 200:
+                    raise ValueError(f"CONNECT answered {status}")
+                await writer.start_tls(ssl.create_default_context(), server_hostname=url.hostname)
+            elif proxy is not None:
+                target = self.test_url  # plain HTTP proxies take the absolute URL
+            
+            writer.write((f'GET {target} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+                          'User-Agent: Mozilla/5.0\r\nAccept: */*\r\nConnection: close\r\n\r\n').encode())
+            status, headers = await read_head(reader)
+            if status != 200:
+                raise ValueError(f"HTTP {status}")
+            length = headers.get('content-length')
+            return await (reader.readexactly(int(length)) if length else reader.read(64 * 1024))
+        finally:
+            writer.close()
+    
+    def anonymity(self, body):
+        try:
+            echoed = json.loads(body)
+            headers = {name.lower(): str(value) for name, value in (echoed.get('headers') or {}).items()}
+        except (ValueError, AttributeError):
+            # Not an echo we can read - only a leaked address can still be spotted
+            text = body.decode('utf-8', 'replace')
+            return 'transparent' if any(ip in text for ip in self.own_ips) else 'unknown'
+        # Where the target saw the request come from, plus what proxies say about the client
+        seen = ' '.join([echoed_origin(body)] + [headers.get(name, '') for name in PROXY_HEADERS])
+        if any(ip in seen for ip in self.own_ips):
+            return 'transparent'
+        if any(name in headers for name in PROXY_HEADERS):
+            return 'anonymous'
+        return 'elite'
+
+def echoed_origin(body):
+    """Client address an echo target reports ("origin" in httpbin's JSON), or the whole text if it isn't JSON"""
+    text = body.decode('utf-8', 'replace')
+    try:
+        return str(json.loads(text).get('origin', ''))
+    except (ValueError, AttributeError):
+        return text
+
+async def read_head(reader):
+    """(status code, {lowercase header: value}) of an HTTP response"""
+    status_line = await reader.readline()
+    match = re.match(rb'HTTP/\d(?:\.\d)? (\d{3})', status_line)
+    if not match:
+        raise ValueError("not an HTTP response")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return int(match.group(1)), headers
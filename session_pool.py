@@ -0,0 +1,161 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import requests
+import config
+
+class CountingAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter that reports every request and every new connection to its SessionPool"""
+    
+    def __init__(self, counters, **kwargs):
+        self.counters = counters
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.count_connections(self.poolmanager)
+    
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        fresh = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if fresh:
+            self.count_connections(manager)
+        return manager
+    
+    def count_connections(self, manager):
+        manager.pool_classes_by_scheme = {
+            scheme: self.counters.pool_class(pool_cls)
+            for scheme, pool_cls in manager.pool_classes_by_scheme.items()
+        }
+    
+    def send(self, request, *args, **kwargs):
+        self.counters.request_sent()
+        return super().send(request, *args, **kwargs)
+
+class SessionPool:
+    """Keep-alive requests.Session objects shared by every handler, one per proxy.
+    
+    Each session has one HTTPAdapter with up to max_per_host connections to
+    any single host (further requests wait for a free one instead of opening
+    more) and connection pools for up to max_hosts hosts. A session nobody
+    has checked out for idle_timeout seconds is closed; so is the least
+    recently used one once there are more than max_sessions.
+    
+    Cookies work as usual within a job (a login or CDN token set during a
+    redirect chain is sent on), but a session's cookies are cleared
+    whenever it is checked out or returned with no one else using it, so
+    a job never sees cookies left behind by an earlier one.
+    """
+    
+    def __init__(self, max_sessions=None, max_hosts=None, max_per_host=None, idle_timeout=None):
+        self.max_sessions = max_sessions or config.HTTP_MAX_SESSIONS
+        self.max_hosts = max_hosts or config.HTTP_POOL_HOSTS
+        self.max_per_host = max_per_host or config.HTTP_POOL_PER_HOST
+        self.idle_timeout = idle_timeout or config.HTTP_SESSION_IDLE_TIMEOUT
+        self.sessions = OrderedDict()  # proxy -> [session, users, last_used], least recently used first
+        self.pool_classes = {}  # urllib3 pool class -> counting subclass
+        self.pool_classes_lock = threading.Lock()  # sessions are built while self.lock is held
+        self.created = 0
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+    
+    @contextmanager
+    def session(self, proxy=None):
+        """Borrow the session for proxy (None = direct) for the duration of a with block"""
+        entry = self.acquire(proxy)
+        try:
+            yield entry[0]
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                entry[2] = time.time()
+                if entry[1] == 0:
+                    entry[0].cookies.clear()
+    
+    def acquire(self, proxy):
+        evicted = []
+        with self.lock:
+            evicted += self.evict_idle()
+            entry = self.sessions.get(proxy)
+            if entry is None:
+                entry = self.sessions[proxy] = [self.new_session(proxy), 0, time.time()]
+                self.created += 1
+                evicted += self.evict_overflow()
+            self.sessions.move_to_end(proxy)
+            if entry[1] == 0:
+                entry[0].cookies.clear()
+            entry[1] += 1
+        for session in evicted:
+            session.close()
+        return entry
+    
+    def new_session(self, proxy):
+        session = requests.Session()
+        adapter = CountingAdapter(self, pool_connections=self.max_hosts, pool_maxsize=self.max_per_host,
+                                  pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if proxy:
+            session.proxies = {'http': proxy, 'https': proxy}
+        return session
+    
+    def evict_idle(self):
+        """Remove sessions unused for longer than idle_timeout; returns them for closing (caller holds lock)"""
+        cutoff = time.time() - self.idle_timeout
+        expired = [proxy for proxy, (_, users, last_used) in self.sessions.items()
+                   if users == 0 and last_used < cutoff]
+        return [self.sessions.pop(proxy)[0] for proxy in expired]
+    
+    def evict_overflow(self):
+        """Remove idle sessions beyond max_sessions, oldest first (caller holds lock)"""
+        evicted = []
+        for proxy in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if self.sessions[proxy][1] == 0:
+                evicted.append(self.sessions.pop(proxy)[0])
+        return evicted
+    
+    def pool_class(self, base):
+        """Subclass of a urllib3 connection pool class that counts the connections it opens"""
+        with self.pool_classes_lock:
+            if base not in self.pool_classes:
+                pool = self
+                
+                class CountingPool(base):
+                    def _new_conn(self):
+                        pool.connection_opened()
+                        return super()._new_conn()
+                
+                # Keep urllib3's name, it shows up in error messages
+                CountingPool.__name__ = CountingPool.__qualname__ = base.__name__
+                self.pool_classes[base] = CountingPool
+            return self.pool_classes[base]
+    
+    def request_sent(self):
+        with self.lock:
+            self.requests += 1
+    
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+    
+    def close(self):
+        with self.lock:
+            sessions = [entry[0] for entry in self.sessions.values()]
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'sessions': len(self.sessions),
+                'created': self.created,
+                'requests': self.requests,
+                'connections': self.connections,
+                # Share of requests that went out on an already open connection
+                'reuse_rate': round(1 - self.connections / self.requests, 3) if self.requests else None
+            }
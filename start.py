@@ -4,7 +4,6 @@ Production startup script with health monitoring
 """
 import os
 import sys
-import time
 import subprocess
 from pathlib import Path
 
@@ -50,29 +49,6 @@ def setup_directories():
         Path(d).mkdir(exist_ok=True)
     print("✅ Directories ready")
 
-def cleanup_old_files():
-    """Clean up old download files"""
-    print("Cleaning up old files...")
-    try:
-        import config
-        cleanup_age = config.CLEANUP_AGE_HOURS * 3600
-        count = 0
-        
-        for f in os.listdir('downloads'):
-            filepath = os.path.join('downloads', f)
-            if os.path.isfile(filepath):
-                file_age = time.time() - os.path.getmtime(filepath)
-                if file_age > cleanup_age:
-                    os.remove(filepath)
-                    count += 1
-        
-        if count > 0:
-            print(f"✅ Cleaned {count} old files")
-        else:
-            print("✅ No old files to clean")
-    except Exception as e:
-        print(f"⚠️  Cleanup warning: {e}")
-
 def check_proxies():
     """Check if proxies are configured"""
     if os.path.exists('proxies.txt'):
@@ -98,7 +74,6 @@ def main():
     
     check_ffmpeg()
     setup_directories()
-    cleanup_old_files()
     check_proxies()
     
     print()
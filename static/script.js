@@ -1,41 +1,81 @@
 let currentDownloadId = null;
-let progressInterval = null;
 let progressValue = 0;
 
-const statusMessages = [
-    'Initializing download...',
-    'Fetching video information...',
-    'Extracting download link...',
-    'Processing video...',
-    'Downloading content...',
-    'Almost done...',
-    'Finalizing download...'
-];
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    let i = 0;
+    while (bytes >= 1024 && i < units.length - 1) {
+        bytes /= 1024;
+        i++;
+    }
+    return `${bytes.toFixed(i === 0 ? 0 : 1)} ${units[i]}`;
+}
 
-let messageIndex = 0;
+function formatEta(seconds) {
+    if (seconds < 60) return `${seconds}s`;
+    const minutes = Math.floor(seconds / 60);
+    if (minutes < 60) return `${minutes}m ${seconds % 60}s`;
+    return `${Math.floor(minutes / 60)}h ${minutes % 60}m`;
+}
 
-function updateProgressAnimation() {
-    const progressStatus = document.getElementById('progressStatus');
+function setProgress(percent) {
+    progressValue = percent;
     const progressPercentage = document.querySelector('.progress-percentage');
     const progressFill = document.querySelector('.progress-fill');
     
+    if (progressPercentage) {
+        progressPercentage.textContent = `${percent}%`;
+    }
+    
+    if (progressFill) {
+        progressFill.style.width = `${percent}%`;
+    }
+}
+
+function setProgressStatus(message) {
+    const progressStatus = document.getElementById('progressStatus');
     if (progressStatus) {
-        messageIndex = (messageIndex + 1) % statusMessages.length;
-        progressStatus.textContent = statusMessages[messageIndex];
+        progressStatus.textContent = message;
+    }
+}
+
+// Show real progress reported by the server (bytes, speed, ETA)
+function renderProgress(data) {
+    const statusDiv = document.getElementById('status');
+    
+    if (data.status === 'queued') {
+        const message = data.queue_position
+            ? `⏳ Waiting in queue (position ${data.queue_position})...`
+            : '⏳ Waiting in queue...';
+        statusDiv.textContent = message;
+        setProgressStatus('Waiting for a free download slot...');
+        return;
     }
     
-    // Smooth progress increment
-    if (progressValue < 90) {
-        progressValue += Math.floor(Math.random() * 8) + 3;
-        if (progressValue > 90) progressValue = 90;
+    statusDiv.textContent = '⏳ Downloading... Please wait';
+    if (data.stream_url) {
+        // The file is written front to back - it can be saved before the download finishes
+        const link = document.createElement('a');
+        link.href = data.stream_url;
+        link.textContent = ' Save it now';
+        link.target = '_blank';
+        statusDiv.appendChild(link);
     }
     
-    if (progressPercentage) {
-        progressPercentage.textContent = `${progressValue}%`;
+    if (data.stage === 'processing') {
+        setProgressStatus('Processing video...');
+    } else if (data.downloaded_bytes) {
+        let message = `Downloading ${formatBytes(data.downloaded_bytes)}`;
+        if (data.total_bytes) message += ` of ${formatBytes(data.total_bytes)}`;
+        if (data.speed) message += ` · ${formatBytes(data.speed)}/s`;
+        if (data.eta !== null && data.eta !== undefined) message += ` · ${formatEta(data.eta)} left`;
+        setProgressStatus(message);
+    } else {
+        setProgressStatus('Fetching video information...');
     }
     
-    if (progressFill) {
-        progressFill.style.width = `${progressValue}%`;
+    if (typeof data.progress === 'number') {
+        setProgress(data.progress);
     }
 }
 
@@ -72,11 +112,9 @@ async function continueDownload(url, quality, format, statusDiv, progressDiv, do
     statusDiv.classList.remove('hidden');
     progressDiv.classList.remove('hidden');
     
-    // Reset and start progress animation
-    progressValue = 0;
-    messageIndex = 0;
-    progressInterval = setInterval(updateProgressAnimation, 1500);
-    updateProgressAnimation();
+    // Reset progress
+    setProgress(0);
+    setProgressStatus('Fetching video information...');
     
     try {
         // First, try to get direct video URL without downloading
@@ -92,10 +130,7 @@ async function continueDownload(url, quality, format, statusDiv, progressDiv, do
         
         // If we got direct URL, show video immediately
         if (infoData.direct_url && !audio_only) {
-            clearInterval(progressInterval);
-            progressValue = 100;
-            document.querySelector('.progress-percentage').textContent = '100%';
-            document.querySelector('.progress-fill').style.width = '100%';
+            setProgress(100);
             
             showStatus('✅ Video ready!', 'success');
             progressDiv.classList.add('hidden');
@@ -142,15 +177,13 @@ async function continueDownload(url, quality, format, statusDiv, progressDiv, do
             downloadBtn.disabled = false;
             downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
             progressDiv.classList.add('hidden');
-            clearInterval(progressInterval);
             return;
         }
         
         currentDownloadId = data.download_id;
-        checkStatus(currentDownloadId);
+        watchDownload(currentDownloadId);
         
     } catch (error) {
-        clearInterval(progressInterval);
         showStatus('❌ Error: ' + error.message, 'error');
         downloadBtn.disabled = false;
         downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
@@ -158,98 +191,131 @@ async function continueDownload(url, quality, format, statusDiv, progressDiv, do
     }
 }
 
-async function checkStatus(downloadId) {
+// Update the page for a status update; returns true once the download has finished
+function handleStatus(data) {
     const statusDiv = document.getElementById('status');
     const progressDiv = document.getElementById('progress');
     const downloadBtn = document.getElementById('downloadBtn');
     
+    if (data.status === 'completed') {
+        setProgress(100);
+        
+        showStatus('✅ Download completed successfully!', 'success');
+        progressDiv.classList.add('hidden');
+        downloadBtn.disabled = false;
+        downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
+        
+        // Check if it's a video file
+        const videoExtensions = ['.mp4', '.mkv', '.webm', '.avi', '.mov', '.flv'];
+        const isVideo = videoExtensions.some(ext => data.file.toLowerCase().endsWith(ext));
+        
+        // Show video player with download button
+        const previewDiv = document.createElement('div');
+        previewDiv.className = 'video-preview-section';
+        
+        if (isVideo) {
+            previewDiv.innerHTML = `
+                <div class="video-player-container">
+                    <h3><i class="fas fa-play-circle"></i> Video Preview</h3>
+                    <video controls autoplay class="video-player">
+                        <source src="/file/${data.file}" type="video/mp4">
+                        Your browser does not support the video tag.
+                    </video>
+                </div>
+                <div class="download-actions">
+                    <a href="/file/${data.file}" download class="download-final-btn">
+                        <i class="fas fa-download"></i> Download Video
+                    </a>
+                    <button onclick="location.reload()" class="new-download-btn">
+                        <i class="fas fa-plus"></i> Download Another
+                    </button>
+                </div>
+            `;
+        
+        statusDiv.after(previewDiv);
+        } else {
+            previewDiv.innerHTML = `
+                <div class="file-ready-container">
+                    <div class="file-icon"><i class="fas fa-file-download"></i></div>
+                    <h3>File Ready!</h3>
+                    <p>Your file is ready to download</p>
+                </div>
+                <div class="download-actions">
+                    <a href="/file/${data.file}" download class="download-final-btn">
+                        <i class="fas fa-download"></i> Download File
+                    </a>
+                    <a href="/file/${data.file}" target="_blank" class="preview-final-btn">
+                        <i class="fas fa-eye"></i> Preview
+                    </a>
+                    <button onclick="location.reload()" class="new-download-btn">
+                        <i class="fas fa-plus"></i> Download Another
+                    </button>
+                </div>
+            `;
+        }
+        
+        statusDiv.after(previewDiv);
+        
+    } else if (data.status === 'error') {
+        showStatus('❌ Error: ' + data.message, 'error');
+        progressDiv.classList.add('hidden');
+        downloadBtn.disabled = false;
+        downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
+        
+    } else if (data.status === 'queued' || data.status === 'processing') {
+        renderProgress(data);
+        return false;
+        
+    } else {
+        showStatus('⚠️ Unknown status', 'error');
+        progressDiv.classList.add('hidden');
+        downloadBtn.disabled = false;
+        downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
+    }
+    
+    return true;
+}
+
+// Prefer pushed updates (Server-Sent Events); fall back to polling /status
+function watchDownload(downloadId) {
+    if (!window.EventSource) {
+        checkStatus(downloadId);
+        return;
+    }
+    
+    const source = new EventSource(`/events/${downloadId}`);
+    
+    source.onmessage = (event) => {
+        if (handleStatus(JSON.parse(event.data))) {
+            source.close();
+        }
+    };
+    
+    // Server closes long-lived streams; open a fresh one
+    source.addEventListener('timeout', () => {
+        source.close();
+        watchDownload(downloadId);
+    });
+    
+    source.onerror = () => {
+        source.close();
+        checkStatus(downloadId);
+    };
+}
+
+async function checkStatus(downloadId) {
+    const progressDiv = document.getElementById('progress');
+    const downloadBtn = document.getElementById('downloadBtn');
+    
     try {
         const response = await fetch(`/status/${downloadId}`);
         const data = await response.json();
         
-        if (data.status === 'completed') {
-            clearInterval(progressInterval);
-            progressValue = 100;
-            document.querySelector('.progress-percentage').textContent = '100%';
-            document.querySelector('.progress-fill').style.width = '100%';
-            
-            showStatus('✅ Download completed successfully!', 'success');
-            progressDiv.classList.add('hidden');
-            downloadBtn.disabled = false;
-            downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
-            
-            // Check if it's a video file
-            const videoExtensions = ['.mp4', '.mkv', '.webm', '.avi', '.mov', '.flv'];
-            const isVideo = videoExtensions.some(ext => data.file.toLowerCase().endsWith(ext));
-            
-            // Show video player with download button
-            const previewDiv = document.createElement('div');
-            previewDiv.className = 'video-preview-section';
-            
-            if (isVideo) {
-                previewDiv.innerHTML = `
-                    <div class="video-player-container">
-                        <h3><i class="fas fa-play-circle"></i> Video Preview</h3>
-                        <video controls autoplay class="video-player">
-                            <source src="/file/${data.file}" type="video/mp4">
-                            Your browser does not support the video tag.
-                        </video>
-                    </div>
-                    <div class="download-actions">
-                        <a href="/file/${data.file}" download class="download-final-btn">
-                            <i class="fas fa-download"></i> Download Video
-                        </a>
-                        <button onclick="location.reload()" class="new-download-btn">
-                            <i class="fas fa-plus"></i> Download Another
-                        </button>
-                    </div>
-                `;
-            
-            statusDiv.after(previewDiv);
-            } else {
-                previewDiv.innerHTML = `
-                    <div class="file-ready-container">
-                        <div class="file-icon"><i class="fas fa-file-download"></i></div>
-                        <h3>File Ready!</h3>
-                        <p>Your file is ready to download</p>
-                    </div>
-                    <div class="download-actions">
-                        <a href="/file/${data.file}" download class="download-final-btn">
-                            <i class="fas fa-download"></i> Download File
-                        </a>
-                        <a href="/file/${data.file}" target="_blank" class="preview-final-btn">
-                            <i class="fas fa-eye"></i> Preview
-                        </a>
-                        <button onclick="location.reload()" class="new-download-btn">
-                            <i class="fas fa-plus"></i> Download Another
-                        </button>
-                    </div>
-                `;
-            }
-            
-            statusDiv.after(previewDiv);
-            
-        } else if (data.status === 'error') {
-            clearInterval(progressInterval);
-            showStatus('❌ Error: ' + data.message, 'error');
-            progressDiv.classList.add('hidden');
-            downloadBtn.disabled = false;
-            downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
-            
-        } else if (data.status === 'processing') {
-            statusDiv.textContent = '⏳ Downloading... Please wait';
+        if (!handleStatus(data)) {
             setTimeout(() => checkStatus(downloadId), 2000);
-            
-        } else {
-            clearInterval(progressInterval);
-            showStatus('⚠️ Unknown status', 'error');
-            progressDiv.classList.add('hidden');
-            downloadBtn.disabled = false;
-            downloadBtn.innerHTML = '<span class="btn-text">Download Now</span><span class="btn-icon"><i class="fas fa-download"></i></span>';
         }
         
     } catch (error) {
-        clearInterval(progressInterval);
         showStatus('❌ Error checking status: ' + error.message, 'error');
         progressDiv.classList.add('hidden');
         downloadBtn.disabled = false;
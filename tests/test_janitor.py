@@ -0,0 +1,32 @@
+import os
+import time
+
+import config
+from janitor import Janitor
+
+class Cache:
+    max_bytes = 1000
+    
+    def access_times(self):
+        return {}
+    
+    def forget(self, names):
+        pass
+
+def test_scratch_over_budget_does_not_evict_every_download(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DISK_LOW_WATER', 1.0)
+    downloads = tmp_path / 'downloads'
+    (downloads / '.work' / 'job').mkdir(parents=True)
+    (downloads / '.work' / 'job' / 'video.mp4').write_bytes(b'x' * 2000)
+    old = time.time() - 3600
+    for i in range(4):
+        path = downloads / f'file{i}.mp4'
+        path.write_bytes(b'x' * 300)
+        os.utime(path, (old + i, old + i))
+    
+    janitor = Janitor(str(downloads), str(tmp_path / 'uploads'), Cache())
+    janitor.scan()
+    janitor.enforce_high_water()
+    
+    # Downloads alone (1200) are brought down to CACHE_LOW_WATER of the budget, oldest first
+    assert sorted(name for name in os.listdir(downloads) if not name.startswith('.')) == ['file1.mp4', 'file2.mp4', 'file3.mp4']
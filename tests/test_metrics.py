@@ -0,0 +1,21 @@
+import threading
+
+import metrics
+
+def test_threads_record_into_different_shards():
+    counter = metrics.Counter('test_total', 'Test counter')
+    barrier = threading.Barrier(8)
+    
+    def record():
+        barrier.wait()  # all alive at once, so no two share a recycled ident
+        counter.inc()
+    
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    used = [shard for shard in counter.shards if shard.values]
+    assert len(used) == 8
+    assert counter.collect() == {(): 8}
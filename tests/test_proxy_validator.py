@@ -0,0 +1,35 @@
+import json
+import socket
+import asyncio
+import threading
+
+from proxy_validator import ProxyValidator
+
+def serve(body, length):
+    """Answer every request with body under a Content-Length of length, on a background loop; returns the port"""
+    loop = asyncio.new_event_loop()
+    
+    async def handle(reader, writer):
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s' % (length, body))
+        await writer.drain()
+        writer.close()
+    
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = loop.run_until_complete(asyncio.start_server(handle, sock=sock))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return server.sockets[0].getsockname()[1]
+
+def test_truncated_body_fails_only_that_proxy():
+    body = json.dumps({'origin': '198.51.100.7', 'headers': {}}).encode()
+    working = serve(body, len(body))
+    truncating = serve(body[:10], len(body))
+    validator = ProxyValidator(test_url=f'http://127.0.0.1:{working}/get', timeout=5, concurrency=4)
+    
+    results = {check.proxy: check for check in validator.iter_checks(
+        [f'127.0.0.1:{truncating}'] + [f'127.0.0.1:{working}'] * 3)}
+    
+    assert not results[f'127.0.0.1:{truncating}'].ok
+    assert results[f'127.0.0.1:{working}'].ok
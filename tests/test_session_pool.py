@@ -0,0 +1,36 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from session_pool import SessionPool
+
+class Handler(BaseHTTPRequestHandler):
+    """/login sets a cookie and redirects to /private, which answers 403 without it"""
+    
+    def do_GET(self):
+        if self.path == '/login':
+            self.send_response(302)
+            self.send_header('Set-Cookie', 'token=abc; Path=/')
+            self.send_header('Location', '/private')
+        elif 'token=abc' in (self.headers.get('Cookie') or ''):
+            self.send_response(200)
+        else:
+            self.send_response(403)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+def test_cookies_last_for_a_job_but_not_into_the_next():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    pool = SessionPool()
+    try:
+        with pool.session() as session:
+            assert session.get(f'{base}/login').status_code == 200
+        with pool.session() as session:
+            assert session.get(f'{base}/private').status_code == 403
+    finally:
+        pool.close()
+        server.shutdown()
@@ -4,6 +4,7 @@ Run this script anytime to manually update your proxy list
 """
 
 from proxy_scraper import ProxyScraper
+from proxy_db import ProxyDB
 
 if __name__ == '__main__':
     print("🚀 Manual Proxy Update")
@@ -11,10 +12,10 @@ if __name__ == '__main__':
     
     scraper = ProxyScraper()
     
-    # Fetch proxies
-    proxies = scraper.scrape_proxies(test=True, max_test=100)
+    # Fetch new candidates, retest only what's new, stale or borderline
+    proxies = scraper.refresh(ProxyDB())
     
-    if proxies:
+    if proxies and proxies != [None]:
         scraper.save_proxies(proxies)
         print(f"\n✅ SUCCESS! {len(proxies)} working proxies saved to proxies.txt")
     else:
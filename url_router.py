@@ -0,0 +1,89 @@
+import posixpath
+from urllib.parse import urlsplit
+
+class Route:
+    """A download handler and how to call it"""
+    
+    def __init__(self, handler, takes_quality=False):
+        self.handler = handler  # DownloadManager method name, or callable(manager, url[, quality])
+        self.takes_quality = takes_quality
+    
+    def __repr__(self):
+        name = self.handler if isinstance(self.handler, str) else getattr(self.handler, '__name__', self.handler)
+        return f"Route({name})"
+
+class UrlRouter:
+    """Picks a download handler for a URL from a registered table.
+    
+    Handlers declare the URL schemes, host suffixes and path extensions they
+    serve. The table is compiled into plain dicts, so resolving a URL costs
+    one lookup per host label plus one for the extension, no matter how many
+    rules are registered. Precedence is scheme, then host (most specific
+    suffix first), then host keyword, then extension, then the default route.
+    
+    Host keywords are substrings of the host name, for services that keep
+    registering new mirror domains; only hosts no suffix matched are
+    checked against them, one substring test per keyword.
+    """
+    
+    def __init__(self, default):
+        self.default = default
+        self.rules = []
+        self.schemes = None
+        self.hosts = None
+        self.extensions = None
+        self.host_keywords = None
+    
+    def register(self, handler, hosts=(), schemes=(), extensions=(), host_keywords=(), takes_quality=False):
+        route = Route(handler, takes_quality)
+        self.rules.append((route, hosts, schemes, extensions, host_keywords))
+        self.schemes = None  # recompile on next resolve
+        return route
+    
+    def compile(self):
+        schemes, hosts, extensions, host_keywords = {}, {}, {}, {}
+        for route, rule_hosts, rule_schemes, rule_extensions, rule_keywords in self.rules:
+            for table, keys in ((schemes, rule_schemes), (hosts, rule_hosts), (extensions, rule_extensions),
+                                (host_keywords, rule_keywords)):
+                for key in keys:
+                    key = key.lower().strip('.') if table is hosts else key.lower()
+                    if table is extensions and not key.startswith('.'):
+                        key = '.' + key
+                    if key in table and table[key] is not route:
+                        raise ValueError(f"{key!r} is claimed by both {table[key]} and {route}")
+                    table[key] = route
+        self.hosts, self.extensions = hosts, extensions
+        self.host_keywords = list(host_keywords.items())
+        self.schemes = schemes
+    
+    def resolve(self, url):
+        """Route for url"""
+        if self.schemes is None:
+            self.compile()
+        
+        parsed = urlsplit(url)
+        route = self.schemes.get(parsed.scheme.lower())
+        if route:
+            return route
+        
+        # Walk the host's suffixes from most to least specific: a.b.c, b.c, c
+        full_host = host = parsed.netloc.rpartition('@')[2].partition(':')[0].lower()
+        while host:
+            route = self.hosts.get(host)
+            if route:
+                return route
+            dot = host.find('.')
+            if dot < 0:
+                break
+            host = host[dot + 1:]
+        for keyword, route in self.host_keywords:
+            if keyword in full_host:
+                return route
+        
+        extension = posixpath.splitext(parsed.path)[1].lower()
+        if extension:
+            route = self.extensions.get(extension)
+            if route:
+                return route
+        
+        return self.default
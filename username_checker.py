@@ -1,6 +1,7 @@
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
+import metrics
 
 class UsernameChecker:
     def __init__(self):
@@ -140,6 +141,14 @@ class UsernameChecker:
         except Exception:
             return None
     
+    def timed_check(self, platform_name, url):
+        """check_platform, with its latency recorded per platform for /metrics"""
+        started = time.time()
+        result = self.check_platform(platform_name, url)
+        metrics.USERNAME_CHECK_SECONDS.observe(platform_name, 'found' if result else 'not_found',
+                                               value=time.time() - started)
+        return result
+    
     def search_username(self, username, max_workers=20):
         results = {
             'username': username,
@@ -153,7 +162,7 @@ class UsernameChecker:
             
             for platform_name, url_template in self.platforms.items():
                 url = url_template.format(username)
-                future = executor.submit(self.check_platform, platform_name, url)
+                future = executor.submit(self.timed_check, platform_name, url)
                 futures[future] = platform_name
             
             for future in as_completed(futures):
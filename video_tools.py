@@ -1,46 +1,60 @@
 import os
+import time
 import subprocess
 import config
+import metrics
 from werkzeug.utils import secure_filename
-import logging
-
-# Get FFmpeg path from static-ffmpeg
-try:
-    from static_ffmpeg import run
-    ffmpeg_path = run.get_or_download_version('latest')['ffmpeg']
-    logging.info(f"Using static-ffmpeg: {ffmpeg_path}")
-except Exception as e:
-    ffmpeg_path = 'ffmpeg'  # Fallback to system FFmpeg
-    logging.warning(f"Static-ffmpeg failed, using system FFmpeg: {e}")
+from ffmpeg_locator import ffmpeg_path
+from workspace import Workspace
 
 class VideoTools:
     def __init__(self, upload_folder):
         self.upload_folder = upload_folder
-        self.ffmpeg = ffmpeg_path
+    
+    @property
+    def ffmpeg(self):
+        # Resolved on first use, not at import time
+        return ffmpeg_path()
+    
+    def render(self, operation, args, output_filename, timeout, timeout_message):
+        """Run ffmpeg with args, writing output_filename in a private workspace; returns its name in upload_folder.
         
+        The output only appears in upload_folder once ffmpeg has finished, and
+        two jobs with the same output name can't write over each other. The
+        run time is recorded under operation for /metrics.
+        """
+        with Workspace(self.upload_folder) as work:
+            cmd = [self.ffmpeg, '-y'] + args + [work.file(output_filename)]
+            started = time.time()
+            result = 'error'
+            try:
+                subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=timeout)
+                result = 'ok'
+            except subprocess.TimeoutExpired:
+                result = 'timeout'
+                raise Exception(timeout_message)
+            except subprocess.CalledProcessError as e:
+                error_msg = e.stderr if e.stderr else str(e)
+                raise Exception(f"FFmpeg error: {error_msg[:200]}")
+            finally:
+                metrics.FFMPEG_SECONDS.observe(operation, result, value=time.time() - started)
+            return work.commit(output_filename)
+    
     def remove_watermark(self, video_path, x, y, width, height):
         """Remove watermark using FFmpeg delogo filter"""
         filename = os.path.basename(video_path)
         output_filename = f"nowm_{filename}"
-        output_path = os.path.join(self.upload_folder, output_filename)
         
-        cmd = [
-            self.ffmpeg, '-y', '-i', video_path,
+        args = [
+            '-i', video_path,
             '-vf', f'delogo=x={x}:y={y}:w={width}:h={height}',
             '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '28',
             '-c:a', 'copy',
-            '-max_muxing_queue_size', '1024',
-            output_path
+            '-max_muxing_queue_size', '1024'
         ]
         
-        try:
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=180)
-            return output_filename
-        except subprocess.TimeoutExpired:
-            raise Exception("Processing timeout - video too large for free tier")
-        except subprocess.CalledProcessError as e:
-            error_msg = e.stderr if e.stderr else str(e)
-            raise Exception(f"FFmpeg error: {error_msg[:200]}")
+        return self.render('remove_watermark', args, output_filename, 180,
+                           "Processing timeout - video too large for free tier")
     
     def remove_tiktok_watermark(self, video_path):
         """Remove TikTok watermark (bottom center)"""
@@ -54,82 +68,54 @@ class VideoTools:
         """Convert video to GIF"""
         filename = os.path.splitext(os.path.basename(video_path))[0]
         output_filename = f"{filename}.gif"
-        output_path = os.path.join(self.upload_folder, output_filename)
         
-        cmd = [
-            self.ffmpeg, '-y', '-ss', str(start_time), '-t', str(duration),
+        args = [
+            '-ss', str(start_time), '-t', str(duration),
             '-i', video_path,
             '-vf', f'fps={fps},scale=320:-1:flags=lanczos',
-            '-loop', '0',
-            output_path
+            '-loop', '0'
         ]
         
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=120)
-            return output_filename
-        except subprocess.TimeoutExpired:
-            raise Exception("Processing timeout - video too large")
-        except subprocess.CalledProcessError as e:
-            error_msg = e.stderr if e.stderr else str(e)
-            raise Exception(f"FFmpeg error: {error_msg[:200]}")
+        return self.render('video_to_gif', args, output_filename, 120, "Processing timeout - video too large")
     
     def compress_video(self, video_path, quality='medium'):
         """Compress video - quality: low, medium, high"""
         filename = os.path.basename(video_path)
         output_filename = f"compressed_{filename}"
-        output_path = os.path.join(self.upload_folder, output_filename)
         
         crf_values = {'high': '23', 'medium': '28', 'low': '35'}
         crf = crf_values.get(quality, '28')
         
-        cmd = [
-            self.ffmpeg, '-y', '-i', video_path,
+        args = [
+            '-i', video_path,
             '-vcodec', 'libx264',
             '-crf', crf,
             '-preset', 'ultrafast',
             '-acodec', 'aac',
             '-b:a', '96k',
-            '-max_muxing_queue_size', '1024',
-            output_path
+            '-max_muxing_queue_size', '1024'
         ]
         
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=180)
-            return output_filename
-        except subprocess.TimeoutExpired:
-            raise Exception("Processing timeout - video too large")
-        except subprocess.CalledProcessError as e:
-            error_msg = e.stderr if e.stderr else str(e)
-            raise Exception(f"FFmpeg error: {error_msg[:200]}")
+        return self.render('compress', args, output_filename, 180, "Processing timeout - video too large")
     
     def convert_format(self, video_path, output_format):
         """Convert video format - mp4, avi, mkv, mov, webm"""
         filename = os.path.splitext(os.path.basename(video_path))[0]
         output_filename = f"{filename}.{output_format}"
-        output_path = os.path.join(self.upload_folder, output_filename)
         
-        cmd = [
-            self.ffmpeg, '-y', '-i', video_path,
+        args = [
+            '-i', video_path,
             '-c:v', 'libx264', '-preset', 'ultrafast',
             '-c:a', 'aac',
-            '-max_muxing_queue_size', '1024',
-            output_path
+            '-max_muxing_queue_size', '1024'
         ]
         
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=180)
-            return output_filename
-        except subprocess.TimeoutExpired:
-            raise Exception("Processing timeout - video too large")
-        except subprocess.CalledProcessError as e:
-            error_msg = e.stderr if e.stderr else str(e)
-            raise Exception(f"FFmpeg error: {error_msg[:200]}")
+        return self.render('convert', args, output_filename, 180, "Processing timeout - video too large")
     
     def rotate_video(self, video_path, rotation):
         """Rotate video - 90, 180, 270 degrees or flip"""
         filename = os.path.basename(video_path)
         output_filename = f"rotated_{filename}"
-        output_path = os.path.join(self.upload_folder, output_filename)
         
         filters = {
             '90': 'transpose=1',
@@ -141,20 +127,12 @@ class VideoTools:
         
         vf = filters.get(rotation, 'transpose=1')
         
-        cmd = [
-            self.ffmpeg, '-y', '-i', video_path,
+        args = [
+            '-i', video_path,
             '-vf', vf,
             '-c:v', 'libx264', '-preset', 'ultrafast',
             '-c:a', 'copy',
-            '-max_muxing_queue_size', '1024',
-            output_path
+            '-max_muxing_queue_size', '1024'
         ]
         
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=180)
-            return output_filename
-        except subprocess.TimeoutExpired:
-            raise Exception("Processing timeout - video too large")
-        except subprocess.CalledProcessError as e:
-            error_msg = e.stderr if e.stderr else str(e)
-            raise Exception(f"FFmpeg error: {error_msg[:200]}")
+        return self.render('rotate', args, output_filename, 180, "Processing timeout - video too large")
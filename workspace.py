@@ -0,0 +1,96 @@
+import os
+import uuid
+import errno
+import shutil
+
+# Scratch directories live under <store>/WORK_FOLDER, on the store's filesystem so commits are renames
+WORK_FOLDER = '.work'
+
+class Workspace:
+    """Private scratch directory for one job, <store>/.work/<random id>.
+    
+    A job writes only inside its workspace, so concurrent jobs never see
+    each other's files and every handler knows its output path up front.
+    commit() moves the finished file into the shared store with a rename,
+    so the store only ever holds complete files; close() deletes whatever
+    is left over, which after a failure is everything.
+
+        with Workspace('downloads') as work:
+            run_job(output=work.file('video.mp4'))
+            name = work.commit('video.mp4')
+    """
+    
+    def __init__(self, store):
+        self.store = store
+        self.path = os.path.join(store, WORK_FOLDER, uuid.uuid4().hex)
+        os.makedirs(self.path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def file(self, name):
+        """Path of name inside the workspace"""
+        return os.path.join(self.path, name)
+    
+    def files(self, extensions=None, skip=()):
+        """Workspace-relative paths of the files in it, biggest first, for backends that pick their own file names.
+        
+        Only names ending in one of extensions count (any name if None);
+        names ending in one of skip (still being written) never do.
+        """
+        found = []
+        for folder, _, names in os.walk(self.path):
+            for name in names:
+                lower = name.lower()
+                if (extensions and not lower.endswith(extensions)) or (skip and lower.endswith(skip)):
+                    continue
+                path = os.path.join(folder, name)
+                found.append((os.path.getsize(path), os.path.relpath(path, self.path)))
+        return [name for _, name in sorted(found, key=lambda f: (-f[0], f[1]))]
+    
+    def largest_file(self, extensions=None, skip=()):
+        """The biggest of files(extensions, skip), or None"""
+        found = self.files(extensions, skip)
+        return found[0] if found else None
+    
+    def commit(self, name, as_name=None):
+        """Move name from the workspace into the store (as as_name); returns the name it got there.
+        
+        Never overwrites: if another job already stored a file under that
+        name this one becomes "name (2).ext" and so on. A name that isn't in
+        the workspace but is already in the store (a handler found an
+        earlier result) is returned as is.
+        """
+        source = self.file(name)
+        as_name = as_name or os.path.basename(name)
+        if not os.path.isfile(source):
+            if os.path.isfile(os.path.join(self.store, as_name)):
+                return as_name
+            raise FileNotFoundError(f"{name} was not produced")
+        
+        base, ext = os.path.splitext(as_name)
+        for attempt in range(1, 1000):
+            candidate = as_name if attempt == 1 else f"{base} ({attempt}){ext}"
+            target = os.path.join(self.store, candidate)
+            try:
+                # link() fails instead of replacing an existing file - an atomic claim on the name
+                os.link(source, target)
+            except FileExistsError:
+                continue
+            except OSError as e:
+                if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EXDEV, errno.EMLINK):
+                    raise
+                # Filesystem without hard links: a plain rename, with a (racy) check first
+                if os.path.exists(target):
+                    continue
+                os.replace(source, target)
+                return candidate
+            os.remove(source)
+            return candidate
+        raise FileExistsError(f"No free name for {as_name} in {self.store}")
+    
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,124 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import config
+
+# Options that change from job to job and are set on a checked-out instance
+# instead of being part of its profile
+PER_CALL_OPTIONS = ('outtmpl', 'progress_hooks')
+
+class YoutubeDLPool:
+    """Warm YoutubeDL instances, reused by jobs with the same option profile.
+    
+    Building a YoutubeDL loads the extractor list, the cookie jar and the
+    HTTP handlers. Instances are keyed by every option except the per-call
+    ones (output template, progress hooks), so two jobs share an instance
+    only when headers, proxy, format policy and postprocessors all match.
+    An instance serves one job at a time; idle ones are kept up to max_idle
+    in total and dropped after idle_timeout seconds.
+    """
+    
+    def __init__(self, max_idle=None, idle_timeout=None):
+        self.max_idle = config.YTDL_POOL_SIZE if max_idle is None else max_idle
+        self.idle_timeout = idle_timeout or config.YTDL_POOL_IDLE_TIMEOUT
+        self.idle = OrderedDict()  # profile key -> [(ydl, last_used)], least recently used first
+        self.idle_count = 0
+        self.created = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+    
+    def profile_key(self, ydl_opts):
+        profile = {k: v for k, v in ydl_opts.items() if k not in PER_CALL_OPTIONS}
+        return json.dumps(profile, sort_keys=True, default=repr)
+    
+    @contextmanager
+    def checkout(self, ydl_opts):
+        """Borrow a YoutubeDL for ydl_opts for the duration of a with block"""
+        key = self.profile_key(ydl_opts)
+        ydl = self.acquire(key)
+        if ydl is None:
+            import yt_dlp  # heavy, and only needed once a job actually uses it
+            ydl = yt_dlp.YoutubeDL(ydl_opts)
+            with self.lock:
+                self.created += 1
+        else:
+            self.prepare(ydl, ydl_opts)
+        
+        try:
+            yield ydl
+        finally:
+            self.release(key, ydl)
+    
+    def prepare(self, ydl, ydl_opts):
+        """Apply the per-call options to a reused instance and clear what the last job left behind"""
+        ydl.params['outtmpl'] = ydl_opts.get('outtmpl', {})
+        ydl._parse_outtmpl()
+        ydl._progress_hooks[:] = []
+        for hook in ydl_opts.get('progress_hooks', []):
+            ydl.add_progress_hook(hook)
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+    
+    def acquire(self, key):
+        with self.lock:
+            self.evict_expired()
+            instances = self.idle.get(key)
+            if not instances:
+                return None
+            ydl, _ = instances.pop()
+            if not instances:
+                del self.idle[key]
+            self.idle_count -= 1
+            self.reused += 1
+            return ydl
+    
+    def release(self, key, ydl):
+        ydl._progress_hooks[:] = []  # don't keep the finished job's reporter alive
+        evicted = []
+        with self.lock:
+            if self.max_idle > 0:
+                self.idle.setdefault(key, []).append((ydl, time.time()))
+                self.idle.move_to_end(key)
+                self.idle_count += 1
+            else:
+                evicted.append(ydl)
+            while self.idle_count > self.max_idle:
+                oldest_key = next(iter(self.idle))
+                evicted.append(self.idle[oldest_key].pop(0)[0])
+                if not self.idle[oldest_key]:
+                    del self.idle[oldest_key]
+                self.idle_count -= 1
+        for old in evicted:
+            self.close_quietly(old)
+    
+    def evict_expired(self):
+        """Drop instances idle for longer than idle_timeout (caller holds lock)"""
+        cutoff = time.time() - self.idle_timeout
+        for key in list(self.idle):
+            instances = self.idle[key]
+            fresh = [(ydl, used) for ydl, used in instances if used >= cutoff]
+            for ydl, used in instances:
+                if used < cutoff:
+                    self.close_quietly(ydl)
+            self.idle_count -= len(instances) - len(fresh)
+            if fresh:
+                self.idle[key] = fresh
+            else:
+                del self.idle[key]
+    
+    def close_quietly(self, ydl):
+        try:
+            ydl.close()
+        except Exception as e:
+            print(f"Error closing YoutubeDL: {e}")
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'idle': self.idle_count,
+                'profiles': len(self.idle)
+            }
@@ -0,0 +1,264 @@
+import os
+import zlib
+import time
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Worth deflating; everything else (video, audio, images, archives) is already compressed and is stored
+DEFLATE_EXTENSIONS = ('.txt', '.srt', '.vtt', '.ass', '.json', '.xml', '.html', '.htm', '.csv', '.log', '.md',
+                      '.nfo', '.sqlite', '.torrent')
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+READ_SIZE = 1024 * 1024
+
+class ZipEntry:
+    """One file of a bundle and where its parts sit in the archive"""
+    
+    def __init__(self, path, name, deflate):
+        stat = os.stat(path)
+        self.path = path
+        self.name = name.encode('utf-8')
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.method = 8 if deflate else 0
+        self.dos_time, self.dos_date = dos_datetime(stat.st_mtime)
+        self.offset = None  # of the local header
+        self.crc = None
+        self.compressed_size = None if deflate else self.size
+    
+    @property
+    def zip64(self):
+        # Offset overflow is carried in the central directory only; local records only care about the size
+        return self.size >= ZIP64_LIMIT
+    
+    def local_header(self):
+        # Bit 3: CRC and sizes follow the data in a descriptor, so the file is read once while sending
+        return struct.pack('<IHHHHHIIIHH', 0x04034b50, 45 if self.zip64 else 20, 0x0808, self.method,
+                           self.dos_time, self.dos_date, 0, 0, 0, len(self.name), 0) + self.name
+    
+    def descriptor(self):
+        if self.zip64:
+            return struct.pack('<IIQQ', 0x08074b50, self.crc, self.compressed_size, self.size)
+        return struct.pack('<IIII', 0x08074b50, self.crc, self.compressed_size, self.size)
+    
+    def descriptor_size(self):
+        return 24 if self.zip64 else 16
+    
+    def central_header(self):
+        extra = b''
+        size = compressed = offset = None
+        if self.size >= ZIP64_LIMIT:
+            size = self.size
+        if self.compressed_size >= ZIP64_LIMIT:
+            compressed = self.compressed_size
+        if self.offset >= ZIP64_LIMIT:
+            offset = self.offset
+        fields = [v for v in (size, compressed, offset) if v is not None]
+        if fields:
+            extra = struct.pack('<HH', 0x0001, 8 * len(fields)) + b''.join(struct.pack('<Q', v) for v in fields)
+        return struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 45, 45 if extra else 20, 0x0808,
+                           self.method, self.dos_time, self.dos_date, self.crc,
+                           min(self.compressed_size, ZIP64_LIMIT), min(self.size, ZIP64_LIMIT),
+                           len(self.name), len(extra), 0, 0, 0, 0o100644 << 16,
+                           min(self.offset, ZIP64_LIMIT)) + self.name + extra
+
+class ZipStream:
+    """A ZIP archive of files on disk, generated while it is sent instead of built in a temp file.
+    
+    Media is stored as is, text-like files (DEFLATE_EXTENSIONS) are
+    deflated unless compress is False. ZIP64 records are added only where
+    a size, an offset or the entry count needs them.
+    
+    When every entry is stored the whole layout follows from the names and
+    sizes alone: size is known before the first byte and iter_bytes(start,
+    end) can serve any range, so Content-Length, Range requests and resumed
+    downloads work. The CRCs a range needs but doesn't cover are computed
+    from the file (and remembered in crc_cache). With deflated entries size
+    is None and only the whole stream can be sent.
+
+        bundle = ZipStream([('/downloads/a.mp4', 'a.mp4'), ...])
+        for chunk in bundle.iter_bytes(): ...
+    """
+    
+    def __init__(self, files, compress=True, crc_cache=None):
+        self.entries = [ZipEntry(path, name, compress and name.lower().endswith(DEFLATE_EXTENSIONS))
+                        for path, name in files]
+        self.crc_cache = crc_cache
+        self.deterministic = all(entry.method == 0 for entry in self.entries)
+        self.size = self.layout() if self.deterministic else None
+    
+    @property
+    def etag(self):
+        """Changes whenever a file in the bundle does, for If-Range"""
+        digest = hashlib.sha1()
+        for entry in self.entries:
+            digest.update(b'%s\0%d\0%d\0' % (entry.name, entry.size, entry.mtime_ns))
+        return digest.hexdigest()[:32]
+    
+    def layout(self):
+        """Place every part of a stored-only archive; returns the total size"""
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            offset += 30 + len(entry.name) + entry.size + entry.descriptor_size()
+        self.central_offset = offset
+        self.central_size = sum(46 + len(entry.name) + self.zip64_extra_size(entry) for entry in self.entries)
+        return offset + self.central_size + len(self.end_records(self.central_offset, self.central_size))
+    
+    def zip64_extra_size(self, entry):
+        fields = (entry.size >= ZIP64_LIMIT) * 2 + (entry.offset >= ZIP64_LIMIT)
+        return 4 + 8 * fields if fields else 0
+    
+    def end_records(self, central_offset, central_size):
+        count = len(self.entries)
+        records = b''
+        if count >= ZIP_MAX_ENTRIES or central_offset >= ZIP64_LIMIT or central_size >= ZIP64_LIMIT:
+            zip64_end = central_offset + central_size
+            records += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, (3 << 8) | 45, 45, 0, 0,
+                                   count, count, central_size, central_offset)
+            records += struct.pack('<IIQI', 0x07064b50, 0, zip64_end, 1)
+        records += struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, ZIP_MAX_ENTRIES),
+                               min(count, ZIP_MAX_ENTRIES), min(central_size, ZIP64_LIMIT),
+                               min(central_offset, ZIP64_LIMIT), 0)
+        return records
+    
+    def iter_bytes(self, start=0, end=None):
+        """The archive bytes from start up to (not including) end; ranges need a deterministic layout"""
+        if not self.deterministic:
+            if start or end is not None:
+                raise ValueError("Ranges need a bundle of stored entries only")
+            yield from self.iter_streaming()
+            return
+        end = self.size if end is None else min(end, self.size)
+        
+        for entry in self.entries:
+            data_start = entry.offset + 30 + len(entry.name)
+            descriptor_start = data_start + entry.size
+            entry_end = descriptor_start + entry.descriptor_size()
+            if entry_end <= start:
+                continue
+            if entry.offset >= end:
+                return
+            yield from clip(entry.local_header(), entry.offset, start, end)
+            
+            if start < descriptor_start and data_start < end:
+                from_byte = max(start, data_start) - data_start
+                to_byte = min(end, descriptor_start) - data_start
+                # Sent from the beginning of the file: the CRC comes for free
+                crc = 0 if from_byte == 0 else None
+                for chunk in read_file(entry.path, from_byte, to_byte):
+                    if crc is not None:
+                        crc = zlib.crc32(chunk, crc)
+                    yield chunk
+                if crc is not None and to_byte == entry.size:
+                    entry.crc = crc
+                    self.remember_crc(entry)
+            if descriptor_start < end:
+                self.ensure_crc(entry)
+                yield from clip(entry.descriptor(), descriptor_start, start, end)
+        
+        if end > self.central_offset:
+            for entry in self.entries:
+                self.ensure_crc(entry)
+            tail = b''.join(entry.central_header() for entry in self.entries)
+            tail += self.end_records(self.central_offset, self.central_size)
+            yield from clip(tail, self.central_offset, start, end)
+    
+    def iter_streaming(self):
+        """Whole archive, deflating as it goes; sizes and CRCs land in descriptors"""
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            header = entry.local_header()
+            yield header
+            offset += len(header)
+            
+            crc = 0
+            compressed = 0
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if entry.method == 8 else None
+            for chunk in read_file(entry.path, 0, entry.size):
+                crc = zlib.crc32(chunk, crc)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                    if not chunk:
+                        continue
+                compressed += len(chunk)
+                yield chunk
+            if compressor:
+                chunk = compressor.flush()
+                compressed += len(chunk)
+                yield chunk
+            entry.crc = crc
+            entry.compressed_size = compressed
+            descriptor = entry.descriptor()
+            yield descriptor
+            offset += compressed + len(descriptor)
+        
+        central = b''.join(entry.central_header() for entry in self.entries)
+        yield central + self.end_records(offset, len(central))
+    
+    def ensure_crc(self, entry):
+        if entry.crc is not None:
+            return
+        key = (entry.path, entry.size, entry.mtime_ns)
+        if self.crc_cache is not None:
+            entry.crc = self.crc_cache.get(key)
+            if entry.crc is not None:
+                return
+        crc = 0
+        for chunk in read_file(entry.path, 0, entry.size):
+            crc = zlib.crc32(chunk, crc)
+        entry.crc = crc
+        self.remember_crc(entry)
+    
+    def remember_crc(self, entry):
+        if self.crc_cache is not None:
+            self.crc_cache.put((entry.path, entry.size, entry.mtime_ns), entry.crc)
+
+class CrcCache:
+    """CRC32s of recently bundled files, keyed by (path, size, mtime_ns), so resumed ranges don't reread them"""
+    
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.crcs = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            crc = self.crcs.get(key)
+            if crc is not None:
+                self.crcs.move_to_end(key)
+            return crc
+    
+    def put(self, key, crc):
+        with self.lock:
+            self.crcs[key] = crc
+            self.crcs.move_to_end(key)
+            while len(self.crcs) > self.max_entries:
+                self.crcs.popitem(last=False)
+
+def clip(data, offset, start, end):
+    """The part of data (placed at offset in the archive) that falls inside [start, end)"""
+    lo = max(start - offset, 0)
+    hi = min(end - offset, len(data))
+    if lo < hi:
+        yield data[lo:hi]
+
+def read_file(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(READ_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"{path} shrank while it was being bundled")
+            remaining -= len(chunk)
+            yield chunk
+
+def dos_datetime(timestamp):
+    """(time, date) in MS-DOS format; ZIP can't hold dates before 1980"""
+    t = time.localtime(max(timestamp, 315532800))
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday